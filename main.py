@@ -23,7 +23,11 @@ sys.path.append(current_dir)
 # Now import from src
 from src.database import Database
 from src.anti_spoofing import AntiSpoofingDetector
-from src.geolocation import calculate_distance, get_current_location
+from src.geolocation import haversine, parse_coordinates
+from src.location_service import PROVIDER_ENV, LocationService, provider_from_spec
+from src.geofence import CITY_RADIUS_M, OFFICE_RADIUS_M, Geofence
+from src.face_encoding import encode_photo, photo_hash
+from src.gallery import FaceGallery
 
 class AttendanceSystem:
     def __init__(self):
@@ -65,9 +69,19 @@ class AttendanceSystem:
             return
         
         # Initialize face recognition variables
-        self.known_face_encodings = []
-        self.known_face_names = []
+        self.gallery = FaceGallery()
+        self.geofence = Geofence()  # Registered offices and cities
+        
+        # Position is read on a background thread, the UI only sees the cached fix
+        try:
+            self.location_service = LocationService(provider_from_spec(os.environ.get(PROVIDER_ENV))).start()
+        except Exception as e:
+            print(f"Error starting location service: {str(e)}")
+            messagebox.showerror("Error", f"Failed to start location service: {str(e)}")
+            return
+        self.gallery_poll_ms = 2000  # Check for enrollments made elsewhere
         self.current_user_id = None
+        self.current_user_name = None
         
         # Performance optimization variables
         self.frame_skip = 0
@@ -106,6 +120,7 @@ class AttendanceSystem:
         self.load_known_faces()
         self.debug_user_data()
         self.hide_loading()
+        self.window.after(self.gallery_poll_ms, self.poll_gallery)
         
         # Initialize camera with optimized settings
         try:
@@ -372,12 +387,13 @@ class AttendanceSystem:
             self.location_check_counter += 1
             if self.location_check_counter >= self.location_update_frequency:
                 self.location_check_counter = 0
-                try:
-                    current_location = get_current_location()
-                    self.location_label.config(text=f"Location: {current_location}")
-                except Exception as e:
-                    print(f"Location check error: {str(e)}")
-                    self.location_label.config(text="Location: Error checking")
+                fix = self.location_service.current()
+                if fix is None:
+                    self.location_label.config(text="Location: Waiting for fix...")
+                elif not fix.is_fresh(self.location_service.ttl):
+                    self.location_label.config(text=f"Location: {fix.location} (stale, {fix.age():.0f}s old)")
+                else:
+                    self.location_label.config(text=f"Location: {fix.location}")
             
             # Only process face recognition if liveness check passes
             if is_live:
@@ -388,19 +404,15 @@ class AttendanceSystem:
                     for (top, right, bottom, left), face_encoding in zip(
                         face_locations, face_encodings
                     ):
-                        matches = face_recognition.compare_faces(
-                            self.known_face_encodings,
-                            face_encoding,
-                            tolerance=0.6
-                        )
+                        match = self.gallery.match(face_encoding, tolerance=0.6)
                         
                         name = "Unknown"
                         self.current_user_id = None
+                        self.current_user_name = None
                         
-                        if True in matches:
-                            first_match_index = matches.index(True)
-                            name = self.known_face_names[first_match_index]
-                            self.current_user_id = first_match_index + 1
+                        if match:
+                            self.current_user_id, name, _ = match
+                            self.current_user_name = name
                             self.record_button.config(state='normal')
                             
                             # Draw green rectangle for recognized face
@@ -459,12 +471,26 @@ class AttendanceSystem:
                 messagebox.showerror("Error", "No valid face detected")
                 return
             
+            # Repeated presses are rejected before any database work
+            if self.db.is_duplicate_scan(self.current_user_id):
+                messagebox.showinfo(
+                    "Info",
+                    f"Attendance for {self.current_user_name} was just recorded"
+                )
+                return
+            
             self.show_loading("Recording attendance...")
             
             # Get and validate location
             try:
-                current_location = get_current_location()
-                print(f"Current location: {current_location}")
+                fix = self.location_service.fresh()
+                if fix is None:
+                    self.location_service.refresh_now()
+                    self.hide_loading()
+                    messagebox.showerror("Error", "Location not available yet, please try again shortly")
+                    return
+                current_location = fix.location
+                print(f"Current location: {current_location} ({fix.source}, {fix.age():.0f}s old)")
                 
                 # Get user's registered locations
                 user = self.db.get_user_by_id(self.current_user_id)
@@ -473,9 +499,19 @@ class AttendanceSystem:
                     messagebox.showerror("Error", "User data not found")
                     return
                 
+                if None in (user['home_lat'], user['home_lon'], user['office_lat'], user['office_lon']):
+                    self.hide_loading()
+                    messagebox.showerror("Error", "Registered home or office location is invalid, please contact admin")
+                    return
+                
                 print("Calculating distances...")
-                home_distance = calculate_distance(current_location, user['home_location'])
-                office_distance = calculate_distance(current_location, user['office_location'])
+                # Both registered places in one vectorized call
+                lat, lon = parse_coordinates(current_location)
+                home_distance, office_distance = haversine(
+                    lat, lon,
+                    np.array([user['home_lat'], user['office_lat']]),
+                    np.array([user['home_lon'], user['office_lon']])
+                )
                 
                 print(f"Home distance: {home_distance}m")
                 print(f"Office distance: {office_distance}m")
@@ -484,8 +520,27 @@ class AttendanceSystem:
                 mode = "WFH" if home_distance <= office_distance else "WFO"
                 print(f"Attendance mode: {mode}")
                 
+                # The check-in must be inside the geofence of the site for that mode
+                self.geofence.refresh(self.db)
+                if mode == "WFH":
+                    site_id, distance, radius_m = user['home_site_id'], home_distance, CITY_RADIUS_M
+                else:
+                    site_id, distance, radius_m = user['office_site_id'], office_distance, OFFICE_RADIUS_M
+                inside = self.geofence.contains(site_id, lat, lon)
+                if inside is None:
+                    # Users not linked to a site are checked against their
+                    # coordinates with the default radius for that kind of site
+                    inside = distance <= radius_m
+                if not inside:
+                    self.hide_loading()
+                    messagebox.showerror(
+                        "Error",
+                        f"Your location is outside the registered {mode} area"
+                    )
+                    return
+                
                 # Record attendance
-                success = self.db.record_attendance(
+                result = self.db.record_attendance(
                     user_id=self.current_user_id,
                     mode=mode,
                     status="Present",
@@ -493,11 +548,14 @@ class AttendanceSystem:
                 )
                 
                 self.hide_loading()
-                if success:
-                    messagebox.showinfo(
-                        "Success",
-                        f"Attendance recorded for {self.known_face_names[self.current_user_id-1]}"
-                    )
+                if result:
+                    if result == "check_in":
+                        message = f"Check-in recorded for {self.current_user_name}"
+                    elif result == "check_out":
+                        message = f"Check-out recorded for {self.current_user_name}"
+                    else:
+                        message = f"Attendance for {self.current_user_name} was just recorded"
+                    messagebox.showinfo("Success", message)
                     self.spoof_detector.reset()
                     self.frame_skip = 0
                 else:
@@ -514,58 +572,56 @@ class AttendanceSystem:
             messagebox.showerror("Error", "Failed to record attendance")
 
     def load_known_faces(self):
-        """Load known faces with progress display"""
+        """Load known faces from stored encodings, encoding only missing ones"""
         try:
             print("\n=== Loading Known Faces ===")
-            self.known_face_encodings = []
-            self.known_face_names = []
-            
-            users = self.db.get_users()
-            print(f"Found {len(users)} users")
-            
-            # Update loading message
-            if hasattr(self, 'loading_label'):
-                self.loading_label.config(text=f"Loading {len(users)} faces...")
-            
-            for i, user in enumerate(users, 1):
+
+            # Users without a stored encoding (new, changed photo or new encoder version)
+            missing = self.db.get_users_without_encoding()
+            print(f"{len(missing)} users need encoding")
+
+            for i, user in enumerate(missing, 1):
                 name = user['name']
                 photo_path = os.path.join("data", "user_faces", user['photo_path'])
-                print(f"\nProcessing user: {name}")
-                
+                print(f"\nEncoding user: {name}")
+
+                # Update loading message
                 if hasattr(self, 'loading_label'):
-                    self.loading_label.config(text=f"Loading face {i}/{len(users)}: {name}")
+                    self.loading_label.config(text=f"Encoding face {i}/{len(missing)}: {name}")
                     self.window.update()
-                
-                if os.path.exists(photo_path):
-                    try:
-                        # Load and resize image for faster processing
-                        face_image = face_recognition.load_image_file(photo_path)
-                        if face_image.shape[1] > 640:  # If width > 640px
-                            scale = 640 / face_image.shape[1]
-                            width = int(face_image.shape[1] * scale)
-                            height = int(face_image.shape[0] * scale)
-                            face_image = cv2.resize(face_image, (width, height))
-                        
-                        face_encodings = face_recognition.face_encodings(face_image)
-                        if face_encodings:
-                            self.known_face_encodings.append(face_encodings[0])
-                            self.known_face_names.append(name)
-                            print(f"SUCCESS: Face encoded for {name}")
-                        else:
-                            print(f"ERROR: No face found in image for {name}")
-                    except Exception as e:
-                        print(f"ERROR loading face: {str(e)}")
-                else:
+
+                if not os.path.exists(photo_path):
                     print(f"ERROR: Photo file not found: {photo_path}")
-            
-            print(f"\nLoaded {len(self.known_face_names)} faces")
-            print(f"Known names: {self.known_face_names}")
-            
+                    continue
+
+                encoding = encode_photo(photo_path)
+                if encoding is None:
+                    print(f"ERROR: No face found in image for {name}")
+                    continue
+
+                self.db.save_face_encoding(user['id'], encoding, photo_hash(photo_path))
+                print(f"SUCCESS: Face encoded for {name}")
+
+            # Whole gallery in one query
+            self.gallery.load(self.db)
+
+            print(f"\nLoaded {len(self.gallery)} faces")
+            print(f"Known names: {self.gallery.names}")
+
         except Exception as e:
             print(f"Error loading faces: {str(e)}")
             if hasattr(self, 'info_label'):
                 self.info_label.configure(text="Failed to load faces")
 
+    def poll_gallery(self):
+        """Apply users added or changed in the admin panel or another process"""
+        try:
+            if self.gallery.refresh(self.db):
+                self.info_label.configure(text=f"Face data updated ({len(self.gallery)} faces)")
+        except Exception as e:
+            print(f"Error refreshing gallery: {str(e)}")
+        self.window.after(self.gallery_poll_ms, self.poll_gallery)
+
     def debug_user_data(self):
         """Debug function for user data"""
         print("\n=== DEBUG: User Data ===")
@@ -588,9 +644,14 @@ class AttendanceSystem:
             
             user_faces_dir = os.path.join("data", "user_faces")
             if os.path.exists(user_faces_dir):
-                for file in os.listdir(user_faces_dir):
-                    if file not in valid_photos:
-                        file_path = os.path.join(user_faces_dir, file)
+                # Photos and their thumbnails
+                for folder in (user_faces_dir, os.path.join(user_faces_dir, "thumbs")):
+                    if not os.path.isdir(folder):
+                        continue
+                    for file in os.listdir(folder):
+                        file_path = os.path.join(folder, file)
+                        if file in valid_photos or os.path.isdir(file_path):
+                            continue
                         print(f"Removing unused photo: {file}")
                         try:
                             os.remove(file_path)
@@ -653,6 +714,8 @@ class AttendanceSystem:
     def __del__(self):
         """Cleanup resources"""
         try:
+            if hasattr(self, 'location_service'):
+                self.location_service.stop()
             if hasattr(self, 'camera'):
                 self.camera.release()
                 cv2.destroyAllWindows()
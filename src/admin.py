@@ -1,27 +1,25 @@
 import tkinter as tk
 from tkinter import ttk, messagebox, filedialog
-import shutil
 import os
+import threading
 from datetime import datetime
 
-# Predefined office locations with coordinates
-OFFICE_LOCATIONS = {
-    "Kantor Gubernur Sulawesi Selatan": "-5.1508,119.4321",
-    "Kantor Walikota Makassar": "-5.1531,119.4319", 
-    "Kantor DPRD Makassar": "-5.1534,119.4326",
-    "Universitas Hasanuddin": "-5.1308,119.4863",
-    "Kantor BPN Makassar": "-5.1514,119.4321",
-    "RS Wahidin Sudirohusodo": "-5.1397,119.4902"
-}
+from src.user_photos import (
+    PhotoRejected, USER_FACES_DIR, normalize_face_photo, save_user_photo, remove_user_photo
+)
+from src.face_encoding import encode_face_image, photo_hash
+from src.attendance_view import AttendanceView, resolve_filters
+from src.analytics import AttendanceAnalytics, bucket
+from src.user_list import UserListView, ROW_HEIGHT
+from src.geofence import Geofence
 
-# Predefined cities with coordinates
-CITIES = {
-    "Makassar": "-5.1477,119.4327",
-    "Jakarta": "-6.2088,106.8456",
-    "Surabaya": "-7.2575,112.7521", 
-    "Bandung": "-6.9175,107.6191",
-    "Medan": "3.5952,98.6722",
-    "Semarang": "-6.9932,110.4203"
+# Dashboard range choices, label -> days
+DASHBOARD_RANGES = {
+    "7 hari": 7,
+    "30 hari": 30,
+    "90 hari": 90,
+    "1 tahun": 365,
+    "3 tahun": 3 * 365,
 }
 
 class AdminSystem:
@@ -41,8 +39,13 @@ class AdminSystem:
         
         # Selected photo path
         self.selected_photo_path = None
+        self.selected_face_image = None  # Normalized face crop of the selected photo
         self.current_user_id = None  # For editing
         
+        # Registered offices and cities
+        self.sites = Geofence()
+        self.sites.load(self.db)
+        
         # Create notebook for tabs
         self.notebook = ttk.Notebook(self.window)
         self.notebook.pack(expand=True, fill='both', padx=10, pady=10)
@@ -50,6 +53,8 @@ class AdminSystem:
         # Create tabs
         self.create_user_management_tab()
         self.create_attendance_report_tab()
+        self.create_dashboard_tab()
+        self.create_diagnostics_tab()
         print("Admin System initialized")
         
     def center_window(self):
@@ -112,6 +117,8 @@ class AdminSystem:
             fieldbackground="white",
             rowheight=25
         )
+        # User list rows are tall enough for the face thumbnails
+        style.configure("Users.Treeview", rowheight=ROW_HEIGHT)
         style.configure(
             "Treeview.Heading",
             font=('Helvetica', 10, 'bold'),
@@ -190,7 +197,7 @@ class AdminSystem:
         self.home_city = ttk.Combobox(
             form_frame,
             width=28,
-            values=sorted(list(CITIES.keys())),
+            values=self.sites.names('city'),
             state='readonly'
         )
         self.home_city.grid(row=0, column=3, padx=5, pady=5, sticky='ew')
@@ -205,7 +212,7 @@ class AdminSystem:
         self.office_loc = ttk.Combobox(
             form_frame,
             width=28,
-            values=sorted(list(OFFICE_LOCATIONS.keys())),
+            values=self.sites.names('office'),
             state='readonly'
         )
         self.office_loc.grid(row=1, column=3, padx=5, pady=5, sticky='ew')
@@ -263,20 +270,50 @@ class AdminSystem:
             style="Danger.TButton"
         ).pack(side=tk.LEFT, padx=5)
 
+        ttk.Button(
+            action_frame,
+            text="Import CSV",
+            command=self.bulk_import_csv,
+            style="Action.TButton"
+        ).pack(side=tk.LEFT, padx=5)
+
+        ttk.Button(
+            action_frame,
+            text="Import Folder",
+            command=self.bulk_import_folder,
+            style="Action.TButton"
+        ).pack(side=tk.LEFT, padx=5)
+
+        # Name search, filters the in-memory index after a short pause
+        search_frame = ttk.Frame(list_frame)
+        search_frame.pack(fill='x', padx=10, pady=(0,5))
+        
+        self.user_search = tk.StringVar()
+        self._user_search_after_id = None
+        ttk.Label(search_frame, text="Cari Nama").pack(side=tk.LEFT)
+        ttk.Entry(search_frame, textvariable=self.user_search, width=25).pack(side=tk.LEFT, padx=(5,10))
+        self.user_search.trace_add('write', self.schedule_user_search)
+        
+        self.user_count_label = ttk.Label(search_frame, text="")
+        self.user_count_label.pack(side=tk.RIGHT)
+
         # Create treeview with container
         tree_container = ttk.Frame(list_frame)
         tree_container.pack(fill='both', expand=True, padx=10, pady=5)
         
-        # Create treeview
+        # Create treeview, the tree column holds the face thumbnail
         columns = ("ID", "Nama", "Photo Path", "Tanggal Dibuat")
         self.user_tree = ttk.Treeview(
             tree_container,
             columns=columns,
-            show='headings',
-            selectmode='browse'
+            show='tree headings',
+            selectmode='browse',
+            style="Users.Treeview"
         )
         
         # Define columns
+        self.user_tree.heading('#0', text='Foto')
+        self.user_tree.column('#0', width=ROW_HEIGHT + 20, stretch=False, anchor='center')
         self.user_tree.heading('ID', text='ID')
         self.user_tree.heading('Nama', text='Nama')
         self.user_tree.heading('Photo Path', text='Photo Path')
@@ -289,12 +326,14 @@ class AdminSystem:
         
         # Add scrollbar
         scrollbar = ttk.Scrollbar(tree_container, orient="vertical", command=self.user_tree.yview)
-        self.user_tree.configure(yscrollcommand=scrollbar.set)
         
         # Pack tree and scrollbar
         self.user_tree.pack(side='left', fill='both', expand=True)
         scrollbar.pack(side='right', fill='y')
         
+        # Rows are inserted while scrolling, edits update single rows
+        self.user_list = UserListView(self.db, self.user_tree, scrollbar, self.user_count_label)
+        
         # Load initial data
         self.load_users()
 
@@ -317,6 +356,20 @@ class AdminSystem:
             style="Header.TLabel"
         ).pack(side=tk.LEFT)
         
+        ttk.Button(
+            title_frame,
+            text="Export Parquet",
+            command=lambda: self.export_attendance('parquet'),
+            style="Primary.TButton"
+        ).pack(side=tk.RIGHT, padx=(5,0))
+        
+        ttk.Button(
+            title_frame,
+            text="Export CSV",
+            command=lambda: self.export_attendance('csv'),
+            style="Primary.TButton"
+        ).pack(side=tk.RIGHT, padx=(5,0))
+        
         ttk.Button(
             title_frame,
             text="Export ke Excel",
@@ -324,7 +377,7 @@ class AdminSystem:
             style="Primary.TButton"
         ).pack(side=tk.RIGHT)
         
-        # Filter frame (for future use)
+        # Filter frame
         filter_frame = ttk.Frame(header_frame)
         filter_frame.pack(fill='x', padx=10, pady=5)
         
@@ -334,8 +387,54 @@ class AdminSystem:
             style="Header.TLabel"
         ).pack(side=tk.LEFT, padx=(0,10))
         
-        # Placeholder for future filter controls
-        # Will add date range, user filter, etc.
+        # Every change reloads the report after a short pause
+        self.filter_name = tk.StringVar()
+        self.filter_start = tk.StringVar()
+        self.filter_end = tk.StringVar()
+        self.filter_mode = tk.StringVar(value="Semua")
+        self.filter_status = tk.StringVar(value="Semua")
+        self._filter_after_id = None
+        
+        ttk.Label(filter_frame, text="Nama").pack(side=tk.LEFT)
+        ttk.Entry(filter_frame, textvariable=self.filter_name, width=18).pack(side=tk.LEFT, padx=(5,10))
+        
+        ttk.Label(filter_frame, text="Dari").pack(side=tk.LEFT)
+        ttk.Entry(filter_frame, textvariable=self.filter_start, width=11).pack(side=tk.LEFT, padx=(5,5))
+        ttk.Label(filter_frame, text="s/d").pack(side=tk.LEFT)
+        ttk.Entry(filter_frame, textvariable=self.filter_end, width=11).pack(side=tk.LEFT, padx=(5,10))
+        
+        ttk.Label(filter_frame, text="Mode").pack(side=tk.LEFT)
+        ttk.Combobox(
+            filter_frame,
+            textvariable=self.filter_mode,
+            values=["Semua", "WFH", "WFO"],
+            state="readonly",
+            width=7
+        ).pack(side=tk.LEFT, padx=(5,10))
+        
+        ttk.Label(filter_frame, text="Status").pack(side=tk.LEFT)
+        ttk.Combobox(
+            filter_frame,
+            textvariable=self.filter_status,
+            values=["Semua", "Present", "Late"],
+            state="readonly",
+            width=9
+        ).pack(side=tk.LEFT, padx=(5,10))
+        
+        ttk.Button(
+            filter_frame,
+            text="Reset",
+            command=self.reset_attendance_filters
+        ).pack(side=tk.LEFT)
+        
+        for var in (self.filter_name, self.filter_start, self.filter_end,
+                    self.filter_mode, self.filter_status):
+            var.trace_add('write', self.schedule_attendance_filter)
+        
+        ttk.Label(
+            header_frame,
+            text="Format tanggal: YYYY-MM-DD"
+        ).pack(anchor='w', padx=10, pady=(0,5))
         
         # Main content frame
         content_frame = ttk.Frame(tab, style="Card.TFrame")
@@ -376,7 +475,6 @@ class AdminSystem:
         
         # Add scrollbar
         scrollbar = ttk.Scrollbar(tree_container, orient="vertical", command=self.attendance_tree.yview)
-        self.attendance_tree.configure(yscrollcommand=scrollbar.set)
         
         # Pack tree and scrollbar
         self.attendance_tree.pack(side='left', fill='both', expand=True)
@@ -386,13 +484,263 @@ class AdminSystem:
         summary_frame = ttk.Frame(content_frame)
         summary_frame.pack(fill='x', padx=10, pady=5)
         
-        # Will add summary statistics here
+        self.attendance_count_label = ttk.Label(summary_frame, text="")
+        self.attendance_count_label.pack(side=tk.LEFT)
+        
+        # Records are loaded page by page while scrolling
+        self.attendance_view = AttendanceView(
+            self.db,
+            self.attendance_tree,
+            scrollbar,
+            self.attendance_count_label
+        )
+        self.attendance_tree.bind('<Destroy>', lambda e: self.attendance_view.close())
         
         # Load initial data
         self.load_attendance()
 
-    def show_loading(self, message="Loading..."):
-        """Show loading overlay"""
+    def create_dashboard_tab(self):
+        """Create attendance analytics dashboard"""
+        tab = ttk.Frame(self.notebook, style="Admin.TFrame")
+        self.notebook.add(tab, text="Dashboard")
+        
+        self.analytics = AttendanceAnalytics(
+            self.db,
+            office_names={site['location']: name for name, site in self.sites.by_name('office').items()}
+        )
+        
+        # Header with range selector
+        header_frame = ttk.Frame(tab, style="Card.TFrame")
+        header_frame.pack(fill='x', padx=20, pady=10)
+        
+        title_frame = ttk.Frame(header_frame)
+        title_frame.pack(fill='x', padx=10, pady=5)
+        
+        ttk.Label(
+            title_frame,
+            text="Dashboard Kehadiran",
+            style="Header.TLabel"
+        ).pack(side=tk.LEFT)
+        
+        ttk.Button(
+            title_frame,
+            text="Refresh",
+            command=lambda: self.load_dashboard(refresh=True),
+            style="Primary.TButton"
+        ).pack(side=tk.RIGHT)
+        
+        self.dashboard_range = tk.StringVar(value="30 hari")
+        range_box = ttk.Combobox(
+            title_frame,
+            textvariable=self.dashboard_range,
+            values=list(DASHBOARD_RANGES),
+            state="readonly",
+            width=10
+        )
+        range_box.pack(side=tk.RIGHT, padx=10)
+        range_box.bind('<<ComboboxSelected>>', lambda e: self.load_dashboard())
+        
+        # Key figures
+        self.dashboard_figures = ttk.Label(header_frame, text="", font=('Helvetica', 11))
+        self.dashboard_figures.pack(anchor='w', padx=10, pady=(0,5))
+        
+        # Daily headcount chart, WFO bars stacked on WFH
+        chart_frame = ttk.Frame(tab, style="Card.TFrame")
+        chart_frame.pack(fill='both', expand=True, padx=20, pady=(0,10))
+        
+        ttk.Label(
+            chart_frame,
+            text="Jumlah hadir per hari (biru: WFO, hijau: WFH, garis: % tepat waktu)"
+        ).pack(anchor='w', padx=10, pady=(5,0))
+        
+        self.dashboard_canvas = tk.Canvas(chart_frame, height=220, background="white", highlightthickness=0)
+        self.dashboard_canvas.pack(fill='both', expand=True, padx=10, pady=5)
+        self.dashboard_canvas.bind('<Configure>', lambda e: self.draw_dashboard_chart())
+        
+        # Office occupancy
+        office_frame = ttk.Frame(tab, style="Card.TFrame")
+        office_frame.pack(fill='x', padx=20, pady=(0,10))
+        
+        columns = ("Kantor", "Pegawai", "Pernah WFO", "Rata-rata WFO/hari", "Okupansi")
+        self.office_tree = ttk.Treeview(office_frame, columns=columns, show='headings', height=6)
+        for column in columns:
+            self.office_tree.heading(column, text=column)
+            self.office_tree.column(column, width=110, anchor='center')
+        self.office_tree.column('Kantor', width=260, anchor='w')
+        self.office_tree.pack(fill='x', padx=10, pady=5)
+        
+        self.dashboard_data = None
+        self.load_dashboard()
+
+    def load_dashboard(self, refresh=False):
+        """Load dashboard figures for the selected range"""
+        try:
+            if refresh:
+                self.analytics.clear_cache()
+            days = DASHBOARD_RANGES[self.dashboard_range.get()]
+            self.dashboard_data = data = self.analytics.summary_for_last_days(days)
+            totals = data['totals']
+            
+            mean_in = totals['mean_in_minute']
+            mean_in_text = f"{int(mean_in // 60):02d}:{int(mean_in % 60):02d}" if mean_in is not None else "-"
+            self.dashboard_figures.config(text=(
+                f"Rata-rata hadir/hari: {totals['avg_headcount']:.1f}   "
+                f"Puncak: {totals['peak_headcount']}   "
+                f"WFH: {totals['wfh_ratio']:.0%}   "
+                f"Tepat waktu: {totals['on_time_ratio']:.0%}   "
+                f"Rata-rata jam masuk: {mean_in_text}"
+            ))
+            
+            self.office_tree.delete(*self.office_tree.get_children())
+            for office in data['offices']:
+                self.office_tree.insert('', 'end', values=(
+                    office['office'],
+                    office['assigned'],
+                    office['people'],
+                    f"{office['avg_daily']:.1f}",
+                    f"{office['occupancy']:.0%}"
+                ))
+            
+            self.draw_dashboard_chart()
+        except Exception as e:
+            print(f"Error loading dashboard: {str(e)}")
+            messagebox.showerror(
+                "Error",
+                f"Gagal memuat dashboard: {str(e)}",
+                parent=self.window
+            )
+
+    def draw_dashboard_chart(self):
+        """Draw stacked WFH/WFO bars and the punctuality trend line"""
+        canvas = self.dashboard_canvas
+        canvas.delete('all')
+        data = self.dashboard_data
+        if data is None or not len(data['days']):
+            return
+        
+        width = max(canvas.winfo_width(), 200)
+        height = max(canvas.winfo_height(), 100)
+        margin = 30
+        
+        # Long ranges are grouped so bars stay at least 4px wide
+        group = max(1, -(-len(data['days']) * 4 // (width - 2 * margin)))
+        wfh = bucket(data['wfh'], group)
+        wfo = bucket(data['wfo'], group)
+        trend = data['on_time_trend'][group - 1::group]
+        
+        peak = max(int((wfh + wfo).max()), 1)
+        bar_width = (width - 2 * margin) / len(wfh)
+        scale = (height - 2 * margin) / peak
+        base = height - margin
+        
+        for i, (home, office) in enumerate(zip(wfh, wfo)):
+            x0 = margin + i * bar_width
+            x1 = x0 + max(bar_width - 1, 1)
+            canvas.create_rectangle(x0, base - home * scale, x1, base, fill="#2ecc71", width=0)
+            canvas.create_rectangle(
+                x0, base - (home + office) * scale, x1, base - home * scale, fill="#3498db", width=0
+            )
+        
+        points = []
+        for i, ratio in enumerate(trend):
+            if ratio == ratio:  # Skip NaN
+                points.extend((margin + (i + 0.5) * bar_width, base - ratio * (height - 2 * margin)))
+        if len(points) >= 4:
+            canvas.create_line(*points, fill="#e67e22", width=2)
+        
+        canvas.create_line(margin, base, width - margin, base)
+        canvas.create_text(margin - 5, base - peak * scale, text=str(peak), anchor='e')
+        canvas.create_text(margin, base + 12, text=str(data['days'][0]), anchor='w')
+        canvas.create_text(width - margin, base + 12, text=str(data['days'][-1]), anchor='e')
+
+    def create_diagnostics_tab(self):
+        """Create query statistics view for diagnosing slow queries"""
+        tab = ttk.Frame(self.notebook, style="Admin.TFrame")
+        self.notebook.add(tab, text="Diagnostik")
+        
+        # Header frame
+        header_frame = ttk.Frame(tab, style="Card.TFrame")
+        header_frame.pack(fill='x', padx=20, pady=10)
+        
+        title_frame = ttk.Frame(header_frame)
+        title_frame.pack(fill='x', padx=10, pady=5)
+        
+        ttk.Label(
+            title_frame,
+            text="Statistik Query Database",
+            style="Header.TLabel"
+        ).pack(side=tk.LEFT)
+        
+        ttk.Button(
+            title_frame,
+            text="Reset",
+            command=self.reset_query_stats,
+            style="Danger.TButton"
+        ).pack(side=tk.RIGHT, padx=(5,0))
+        
+        ttk.Button(
+            title_frame,
+            text="Refresh",
+            command=self.load_query_stats,
+            style="Primary.TButton"
+        ).pack(side=tk.RIGHT)
+        
+        ttk.Label(
+            header_frame,
+            text=f"Query lebih lambat dari {self.db.query_stats.slow_query_ms:.0f} ms dicatat di slow_queries.log"
+        ).pack(anchor='w', padx=10, pady=(0,5))
+        
+        # Main content frame
+        content_frame = ttk.Frame(tab, style="Card.TFrame")
+        content_frame.pack(fill='both', expand=True, padx=20, pady=10)
+        
+        tree_container = ttk.Frame(content_frame)
+        tree_container.pack(fill='both', expand=True, padx=10, pady=5)
+        
+        columns = ("Metode", "Jumlah", "Rata-rata (ms)", "p50 (ms)", "p95 (ms)", "Maks (ms)", "Total (ms)")
+        self.stats_tree = ttk.Treeview(
+            tree_container,
+            columns=columns,
+            show='headings',
+            selectmode='browse'
+        )
+        for column in columns:
+            self.stats_tree.heading(column, text=column)
+            self.stats_tree.column(column, width=100, anchor='center')
+        self.stats_tree.column('Metode', width=200, anchor='w')
+        
+        scrollbar = ttk.Scrollbar(tree_container, orient="vertical", command=self.stats_tree.yview)
+        self.stats_tree.configure(yscrollcommand=scrollbar.set)
+        
+        self.stats_tree.pack(side='left', fill='both', expand=True)
+        scrollbar.pack(side='right', fill='y')
+        
+        # Load initial data
+        self.load_query_stats()
+
+    def load_query_stats(self):
+        """Load per-method query statistics into treeview"""
+        for item in self.stats_tree.get_children():
+            self.stats_tree.delete(item)
+        
+        for stats in self.db.get_query_stats():
+            self.stats_tree.insert('', 'end', values=(
+                stats['method'],
+                stats['count'],
+                f"{stats['avg_ms']:.2f}",
+                f"{stats['p50_ms']:g}",
+                f"{stats['p95_ms']:g}",
+                f"{stats['max_ms']:.2f}",
+                f"{stats['total_ms']:.1f}"
+            ))
+
+    def reset_query_stats(self):
+        """Clear collected query statistics"""
+        self.db.reset_query_stats()
+        self.load_query_stats()
+
+    def show_loading(self, message="Loading...", cancel_command=None):
+        """Show loading overlay, with a cancel button if cancel_command is given"""
         self.loading_frame = ttk.Frame(
             self.window,
             style="Card.TFrame"
@@ -420,6 +768,14 @@ class AdminSystem:
         self.progress.pack(pady=5)
         self.progress.start()
         
+        if cancel_command:
+            ttk.Button(
+                self.loading_frame,
+                text="Batal",
+                command=cancel_command,
+                style="Danger.TButton"
+            ).pack(pady=(5,10))
+        
         self.window.update()
 
     def hide_loading(self):
@@ -469,13 +825,19 @@ class AdminSystem:
                 self.office_loc.focus()
                 return
                 
-            # Get coordinates
-            home_coord = CITIES[home_city]
-            office_coord = OFFICE_LOCATIONS[office]
+            # Get sites and their coordinates
+            home_site = self.sites.by_name('city')[home_city]
+            office_site = self.sites.by_name('office')[office]
+            home_coord = home_site['location']
+            office_coord = office_site['location']
             
             if self.current_user_id:  # Update existing user
+                user_id = self.current_user_id
+                encoding = digest = None
                 if self.selected_photo_path:  # If new photo selected
+                    encoding = self.encode_selected_face()
                     photo_name = self.process_photo(name)
+                    digest = photo_hash(os.path.join(USER_FACES_DIR, photo_name))
                 else:
                     photo_name = None
                     
@@ -484,7 +846,11 @@ class AdminSystem:
                     name,
                     photo_name,
                     home_coord,
-                    office_coord
+                    office_coord,
+                    encoding=encoding,
+                    photo_hash=digest,
+                    home_site_id=home_site['id'],
+                    office_site_id=office_site['id']
                 )
                 
                 if success:
@@ -508,16 +874,24 @@ class AdminSystem:
                     )
                     return
                     
+                # Encode once here, running kiosks pick the user up from the database
+                encoding = self.encode_selected_face()
+                
                 # Process photo
                 photo_name = self.process_photo(name)
                 
                 # Save to database
-                if self.db.add_user(
+                user_id = self.db.add_user(
                     name=name,
                     photo_path=photo_name,
                     home_location=home_coord,
-                    office_location=office_coord
-                ):
+                    office_location=office_coord,
+                    encoding=encoding,
+                    photo_hash=photo_hash(os.path.join(USER_FACES_DIR, photo_name)),
+                    home_site_id=home_site['id'],
+                    office_site_id=office_site['id']
+                )
+                if user_id:
                     self.hide_loading()
                     messagebox.showinfo(
                         "Sukses",
@@ -528,8 +902,8 @@ class AdminSystem:
                 else:
                     raise Exception("Gagal menambahkan user")
                     
-            # Refresh user list
-            self.load_users()
+            # Update just this user's row
+            self.user_list.refresh_user(user_id)
             
         except Exception as e:
             print(f"Error submitting user: {str(e)}")
@@ -562,6 +936,16 @@ class AdminSystem:
                     )
                     return
                 
+                # Check for exactly one face right away
+                self.show_loading("Memeriksa wajah di foto...")
+                try:
+                    self.selected_face_image = normalize_face_photo(filename)
+                except PhotoRejected as e:
+                    self.hide_loading()
+                    messagebox.showerror("Error", f"Foto ditolak: {str(e)}", parent=self.window)
+                    return
+                self.hide_loading()
+                
                 self.selected_photo_path = filename
                 self.photo_entry.configure(state='normal')
                 self.photo_entry.delete(0, tk.END)
@@ -617,23 +1001,17 @@ class AdminSystem:
             
             # Clear photo selection
             self.selected_photo_path = None
+            self.selected_face_image = None
             self.photo_entry.configure(state='normal')
             self.photo_entry.delete(0, tk.END)
             self.photo_entry.configure(state='readonly')
             
-            # Set home location
-            home_coord = user['home_location']
-            for city, coord in CITIES.items():
-                if coord == home_coord:
-                    self.home_city.set(city)
-                    break
+            # Set home and office, users from before the site registry match by coordinates
+            home_site = self.sites.find(user['home_site_id'], user['home_location'], 'city')
+            self.home_city.set(home_site['name'] if home_site else '')
             
-            # Set office location
-            office_coord = user['office_location']
-            for office, coord in OFFICE_LOCATIONS.items():
-                if coord == office_coord:
-                    self.office_loc.set(office)
-                    break
+            office_site = self.sites.find(user['office_site_id'], user['office_location'], 'office')
+            self.office_loc.set(office_site['name'] if office_site else '')
                     
             self.hide_loading()
             
@@ -684,11 +1062,9 @@ class AdminSystem:
             # Show loading
             self.show_loading(f"Menghapus user {user_name}...")
                 
-            # Delete photo file
+            # Delete photo file and thumbnail
             try:
-                photo_full_path = os.path.join("data", "user_faces", photo_path)
-                if os.path.exists(photo_full_path):
-                    os.remove(photo_full_path)
+                remove_user_photo(photo_path)
             except Exception as e:
                 print(f"Error deleting photo: {str(e)}")
                 
@@ -700,7 +1076,7 @@ class AdminSystem:
                     f"User {user_name} berhasil dihapus!",
                     parent=self.window
                 )
-                self.load_users()
+                self.user_list.remove_user(user_id)
             else:
                 raise Exception("Gagal menghapus user")
                 
@@ -724,6 +1100,7 @@ class AdminSystem:
         """Clear all form fields"""
         self.name_entry.delete(0, tk.END)
         self.selected_photo_path = None
+        self.selected_face_image = None
         self.photo_entry.configure(state='normal')
         self.photo_entry.delete(0, tk.END)
         self.photo_entry.configure(state='readonly')
@@ -732,33 +1109,10 @@ class AdminSystem:
         self.name_entry.focus()
 
     def load_users(self):
-        """Load users into treeview with improved visual feedback"""
+        """Reload all users, rows are inserted into the tree while scrolling"""
         try:
             self.show_loading("Memuat daftar user...")
-            
-            # Clear existing items
-            for item in self.user_tree.get_children():
-                self.user_tree.delete(item)
-                
-            # Get users from database
-            users = self.db.get_users()
-            
-            # Insert into treeview
-            alternate = False  # For alternating row colors
-            for user in users:
-                self.user_tree.insert(
-                    '',
-                    'end',
-                    values=(
-                        user['id'],
-                        user['name'],
-                        user['photo_path'],
-                        user['created_at']
-                    ),
-                    tags=('alternate',) if alternate else ()
-                )
-                alternate = not alternate
-                
+            self.user_list.reload()
             self.hide_loading()
             
         except Exception as e:
@@ -770,174 +1124,263 @@ class AdminSystem:
                 parent=self.window
             )
 
+    def schedule_user_search(self, *args):
+        """Debounce typing in the user search box, the search itself is in memory"""
+        if self._user_search_after_id is not None:
+            self.window.after_cancel(self._user_search_after_id)
+        self._user_search_after_id = self.window.after(100, self.apply_user_search)
+
+    def apply_user_search(self):
+        self._user_search_after_id = None
+        self.user_list.search(self.user_search.get())
+
     def load_attendance(self):
-        """Load attendance records into treeview with improved visual feedback"""
+        """Load first page of attendance records, more are fetched on scroll"""
         try:
-            self.show_loading("Memuat data absensi...")
-            
-            # Clear existing items
-            for item in self.attendance_tree.get_children():
-                self.attendance_tree.delete(item)
-                
-            # Get attendance records
-            records = self.db.get_attendance()
-            
-            # Insert into treeview with alternating colors
-            alternate = False
-            for record in records:
-                # Style row based on status
-                status = record['status']
-                if status == "Present":
-                    tag = 'present'
-                elif status == "Late":
-                    tag = 'late'
-                else:
-                    tag = 'absent'
-                
-                if alternate:
-                    tag = f"{tag}_alternate"
-                
-                self.attendance_tree.insert(
-                    '',
-                    'end',
-                    values=(
-                        record['id'],
-                        record['name'],
-                        record['date'],
-                        record['time_in'],
-                        record['time_out'] or '-',
-                        record['mode'],
-                        record['status'],
-                        record['location'] or '-'
-                    ),
-                    tags=(tag,)
-                )
-                alternate = not alternate
-                
-            self.hide_loading()
-            
+            self.attendance_view.reload()
         except Exception as e:
             print(f"Error loading attendance: {str(e)}")
-            self.hide_loading()
             messagebox.showerror(
                 "Error",
                 f"Gagal memuat data absensi: {str(e)}",
                 parent=self.window
             )
 
+    def schedule_attendance_filter(self, *args):
+        """Debounce filter changes, the query runs 300ms after the last one"""
+        if self._filter_after_id is not None:
+            self.window.after_cancel(self._filter_after_id)
+        self._filter_after_id = self.window.after(300, self.apply_attendance_filters)
+
+    def apply_attendance_filters(self):
+        """Reload the report with the current filter values"""
+        self._filter_after_id = None
+        
+        filters = {'name': self.filter_name.get().strip()}
+        for key, var in (('start_date', self.filter_start), ('end_date', self.filter_end)):
+            value = var.get().strip()
+            if not value:
+                continue
+            try:
+                filters[key] = datetime.strptime(value, '%Y-%m-%d').strftime('%Y-%m-%d')
+            except ValueError:
+                # Wait until the date is typed completely
+                self.attendance_count_label.config(text=f"Tanggal tidak valid: {value}")
+                return
+        for key, var in (('mode', self.filter_mode), ('status', self.filter_status)):
+            if var.get() != "Semua":
+                filters[key] = var.get()
+        
+        self.attendance_view.reload(filters)
+
+    def reset_attendance_filters(self):
+        """Clear all filters"""
+        self.filter_name.set('')
+        self.filter_start.set('')
+        self.filter_end.set('')
+        self.filter_mode.set("Semua")
+        self.filter_status.set("Semua")
+
+    def encode_selected_face(self):
+        """Face encoding of the selected photo's normalized crop"""
+        self.loading_label.config(text="Meng-encode wajah...")
+        self.window.update()
+        
+        encoding = encode_face_image(self.selected_face_image)
+        if encoding is None:
+            raise Exception("Wajah pada foto tidak dapat di-encode")
+        return encoding
+
     def process_photo(self, name):
         """Process and save photo file with size validation"""
         try:
-            user_faces_dir = os.path.join("data", "user_faces")
-            os.makedirs(user_faces_dir, exist_ok=True)
-            
-            # Create photo filename from user name
-            base_name = name.lower().replace(' ', '_')
-            photo_ext = os.path.splitext(self.selected_photo_path)[1].lower()
-            photo_name = f"{base_name}{photo_ext}"
-            photo_path = os.path.join(user_faces_dir, photo_name)
-            
-            # Handle duplicate filenames
-            counter = 1
-            while os.path.exists(photo_path):
-                photo_name = f"{base_name}_{counter}{photo_ext}"
-                photo_path = os.path.join(user_faces_dir, photo_name)
-                counter += 1
-            
-            # Copy photo with feedback
+            # Save normalized face crop and thumbnail
             self.loading_label.config(text="Memproses foto...")
             self.window.update()
             
-            shutil.copy2(self.selected_photo_path, photo_path)
-            return photo_name
+            return save_user_photo(self.selected_face_image, name)
             
         except Exception as e:
             print(f"Error processing photo: {str(e)}")
             raise
 
-    def export_attendance(self):
-        """Export attendance records to Excel with progress feedback"""
+    def bulk_import_csv(self):
+        """Import users from a CSV file (name, home_city, office, photo)"""
+        filename = filedialog.askopenfilename(
+            title="Pilih File CSV",
+            filetypes=[("CSV files", "*.csv")],
+            parent=self.window
+        )
+        if not filename:
+            return
+
+        from src.bulk_enrollment import read_csv_rows
         try:
-            # Get file path
-            filename = filedialog.asksaveasfilename(
-                title="Export Laporan Absensi",
-                defaultextension=".xlsx",
-                filetypes=[("Excel files", "*.xlsx")],
+            rows = read_csv_rows(filename)
+        except Exception as e:
+            print(f"Error reading CSV: {str(e)}")
+            messagebox.showerror(
+                "Error",
+                f"Gagal membaca file CSV: {str(e)}",
                 parent=self.window
             )
-            
-            if not filename:
-                return
-                
-            self.show_loading("Mengexport data absensi...")
-                
+            return
+        self.run_bulk_import(rows, os.path.splitext(filename)[0] + "_report.csv")
+
+    def bulk_import_folder(self):
+        """Import one user per photo in a folder, using the selected city and office"""
+        home_city = self.home_city.get().strip()
+        office = self.office_loc.get().strip()
+        if not home_city or not office:
+            messagebox.showerror(
+                "Error",
+                "Pilih Kota (WFH) dan Kantor (WFO) untuk semua user di folder!",
+                parent=self.window
+            )
+            return
+
+        folder = filedialog.askdirectory(title="Pilih Folder Foto", parent=self.window)
+        if not folder:
+            return
+
+        from src.bulk_enrollment import read_folder_rows
+        rows = read_folder_rows(folder, home_city, office)
+        self.run_bulk_import(rows, os.path.join(folder, "import_report.csv"))
+
+    def run_bulk_import(self, rows, report_path):
+        """Run bulk import in a background thread with progress feedback"""
+        if not rows:
+            messagebox.showwarning("Peringatan", "Tidak ada data untuk diimport!", parent=self.window)
+            return
+
+        from src.bulk_enrollment import import_users, write_report
+
+        self.show_loading(f"Mengimport {len(rows)} user...")
+        state = {'stage': 'validate', 'done': 0, 'total': len(rows), 'report': None, 'error': None}
+
+        def progress(stage, done, total):
+            state.update(stage=stage, done=done, total=total)
+
+        def worker():
             try:
-                import openpyxl
+                state['report'] = import_users(
+                    self.db, rows, self.sites.by_name('city'), self.sites.by_name('office'), progress=progress
+                )
+                write_report(state['report'], report_path)
+            except Exception as e:
+                state['error'] = e
+            finally:
+                self.db.release_thread_connection()
+
+        thread = threading.Thread(target=worker, daemon=True)
+        thread.start()
+        self._poll_bulk_import(thread, state, report_path)
+
+    def _poll_bulk_import(self, thread, state, report_path):
+        """Update progress until the import thread finishes"""
+        if thread.is_alive():
+            stage = "Encoding wajah" if state['stage'] == 'encode' else "Menyimpan user"
+            if state['stage'] != 'validate':
+                self.loading_label.config(text=f"{stage} {state['done']}/{state['total']}...")
+            self.window.after(200, self._poll_bulk_import, thread, state, report_path)
+            return
+
+        self.hide_loading()
+        if state['error']:
+            print(f"Error importing users: {str(state['error'])}")
+            messagebox.showerror(
+                "Error",
+                f"Gagal import user: {str(state['error'])}",
+                parent=self.window
+            )
+            return
+
+        report = state['report']
+        succeeded = sum(1 for entry in report if entry['status'] == 'ok')
+        messagebox.showinfo(
+            "Import Selesai",
+            f"{succeeded} dari {len(report)} user berhasil diimport.\n\n" +
+            f"Laporan: {report_path}",
+            parent=self.window
+        )
+        self.load_users()
+
+    def export_attendance(self, fmt='xlsx'):
+        """Export attendance records to Excel, CSV or Parquet in a background thread"""
+        # Excel and Parquet need optional modules
+        required = {'xlsx': 'openpyxl', 'parquet': 'pyarrow'}.get(fmt)
+        if required:
+            try:
+                __import__(required)
             except ImportError:
-                self.hide_loading()
                 messagebox.showerror(
                     "Error",
-                    "Modul openpyxl belum terinstall!\n" +
-                    "Jalankan 'pip install openpyxl' di terminal.",
+                    f"Modul {required} belum terinstall!\n" +
+                    f"Jalankan 'pip install {required}' di terminal.",
                     parent=self.window
                 )
                 return
-                
-            # Get attendance records
-            records = self.db.get_attendance()
-            
-            # Create workbook and sheet
-            wb = openpyxl.Workbook()
-            ws = wb.active
-            ws.title = "Laporan Absensi"
-            
-            # Write headers with styling
-            headers = ["ID", "Nama", "Tanggal", "Jam Masuk", "Jam Keluar", "Mode", "Status", "Lokasi"]
-            for col, header in enumerate(headers, 1):
-                cell = ws.cell(row=1, column=col, value=header)
-                cell.font = openpyxl.styles.Font(bold=True)
-            
-            # Write data
-            for row, record in enumerate(records, 2):
-                self.loading_label.config(text=f"Mengexport data {row-1} dari {len(records)}...")
-                self.window.update()
-                
-                ws.cell(row=row, column=1, value=record['id'])
-                ws.cell(row=row, column=2, value=record['name'])
-                ws.cell(row=row, column=3, value=record['date'])
-                ws.cell(row=row, column=4, value=record['time_in'])
-                ws.cell(row=row, column=5, value=record['time_out'])
-                ws.cell(row=row, column=6, value=record['mode'])
-                ws.cell(row=row, column=7, value=record['status'])
-                ws.cell(row=row, column=8, value=record['location'])
-            
-            # Auto-adjust column widths
-            for column in ws.columns:
-                max_length = 0
-                column_letter = openpyxl.utils.get_column_letter(column[0].column)
-                
-                for cell in column:
-                    if cell.value:
-                        max_length = max(max_length, len(str(cell.value)))
-                
-                adjusted_width = (max_length + 2)
-                ws.column_dimensions[column_letter].width = adjusted_width
-            
-            # Save workbook
-            wb.save(filename)
-            
-            self.hide_loading()
-            messagebox.showinfo(
-                "Sukses",
-                "Laporan absensi berhasil di-export!",
-                parent=self.window
-            )
-            
-        except Exception as e:
-            print(f"Error exporting attendance: {str(e)}")
-            self.hide_loading()
+
+        from src.export import EXPORT_FORMATS, ExportCancelled
+        export, extension, description = EXPORT_FORMATS[fmt]
+
+        # Get file path
+        filename = filedialog.asksaveasfilename(
+            title="Export Laporan Absensi",
+            defaultextension=extension,
+            filetypes=[(description, f"*{extension}")],
+            parent=self.window
+        )
+        
+        if not filename:
+            return
+
+        # Export what the report currently shows
+        filters = dict(self.attendance_view.filters)
+        cancel = threading.Event()
+        state = {'done': 0, 'total': 0, 'rows': None, 'error': None, 'cancelled': False}
+
+        def progress(done, total):
+            state.update(done=done, total=total)
+
+        def worker():
+            try:
+                state['rows'] = export(self.db, filename, resolve_filters(self.db, filters), progress, cancel)
+            except ExportCancelled:
+                state['cancelled'] = True
+            except Exception as e:
+                state['error'] = e
+            finally:
+                self.db.release_thread_connection()
+
+        self.show_loading("Mengexport data absensi...", cancel_command=cancel.set)
+        thread = threading.Thread(target=worker, daemon=True)
+        thread.start()
+        self._poll_export(thread, state)
+
+    def _poll_export(self, thread, state):
+        """Update progress until the export thread finishes"""
+        if thread.is_alive():
+            if state['total']:
+                self.loading_label.config(
+                    text=f"Mengexport data {state['done']} dari {state['total']}..."
+                )
+            self.window.after(200, self._poll_export, thread, state)
+            return
+
+        self.hide_loading()
+        if state['cancelled']:
+            messagebox.showinfo("Dibatalkan", "Export dibatalkan.", parent=self.window)
+        elif state['error']:
+            print(f"Error exporting attendance: {str(state['error'])}")
             messagebox.showerror(
                 "Error", 
-                f"Gagal export laporan: {str(e)}",
+                f"Gagal export laporan: {str(state['error'])}",
+                parent=self.window
+            )
+        else:
+            messagebox.showinfo(
+                "Sukses",
+                f"Laporan absensi berhasil di-export! ({state['rows']} data)",
                 parent=self.window
             )        
\ No newline at end of file
@@ -0,0 +1,134 @@
+"""Attendance figures for the admin dashboard
+
+All figures come from SQL aggregates over the attendance_daily summary,
+so a year of data is a few hundred rows, never the raw records. NumPy
+fills days without attendance and derives ratios and rolling trends.
+Results are cached per date range. Ranges that end before today do not
+change, ranges that include today expire after a short time.
+"""
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta
+
+import numpy as np
+
+# Rolling window (days) of the punctuality trend
+TREND_DAYS = 7
+
+# Ranges that include today are recomputed after this many seconds
+LIVE_CACHE_SECONDS = 60
+
+CACHE_SIZE = 16
+
+def _today():
+    """Today on the local clock, the calendar attendance dates are stored in"""
+    return datetime.now().date()
+
+
+class AttendanceAnalytics:
+    def __init__(self, db, office_names=None):
+        self.db = db
+        # office coordinates -> office name, for readable labels
+        self.office_names = office_names or {}
+        self._cache = OrderedDict()
+
+    def summary(self, start_date, end_date):
+        """Dashboard figures for an inclusive date range, cached"""
+        key = (str(start_date), str(end_date))
+        cached = self._cache.get(key)
+        if cached is not None:
+            computed_at, result = cached
+            live = key[1] >= _today().isoformat()
+            if not live or time.monotonic() - computed_at < LIVE_CACHE_SECONDS:
+                self._cache.move_to_end(key)
+                return result
+
+        result = self._compute(*key)
+        self._cache[key] = (time.monotonic(), result)
+        self._cache.move_to_end(key)
+        while len(self._cache) > CACHE_SIZE:
+            self._cache.popitem(last=False)
+        return result
+
+    def summary_for_last_days(self, days):
+        end = _today()
+        return self.summary(end - timedelta(days=days - 1), end)
+
+    def clear_cache(self):
+        self._cache.clear()
+
+    def _compute(self, start_date, end_date):
+        days = np.arange(np.datetime64(start_date), np.datetime64(end_date) + 1)
+        headcount = np.zeros(len(days), dtype=np.int64)
+        wfh = np.zeros(len(days), dtype=np.int64)
+        wfo = np.zeros(len(days), dtype=np.int64)
+        late = np.zeros(len(days), dtype=np.int64)
+        mean_in = np.full(len(days), np.nan)
+
+        rows = self.db.get_daily_totals(start_date, end_date)
+        if rows:
+            # Place each aggregated day on the full calendar
+            index = (np.array([row['date'] for row in rows], dtype='datetime64[D]') - days[0]).astype(int)
+            headcount[index] = [row['headcount'] for row in rows]
+            wfh[index] = [row['wfh'] for row in rows]
+            wfo[index] = [row['wfo'] for row in rows]
+            late[index] = [row['late'] for row in rows]
+            mean_in[index] = [row['mean_in_minute'] for row in rows]
+
+        active = headcount > 0
+        with np.errstate(divide='ignore', invalid='ignore'):
+            wfh_ratio = np.where(active, wfh / headcount, np.nan)
+            on_time = np.where(active, 1 - late / headcount, np.nan)
+
+            # Rolling punctuality over the last TREND_DAYS calendar days
+            window = np.ones(TREND_DAYS)
+            on_time_sum = np.convolve(headcount - late, window)[:len(days)]
+            present_sum = np.convolve(headcount, window)[:len(days)]
+            on_time_trend = np.where(present_sum > 0, on_time_sum / present_sum, np.nan)
+
+        total = int(headcount.sum())
+        return {
+            'days': days,
+            'headcount': headcount,
+            'wfh': wfh,
+            'wfo': wfo,
+            'late': late,
+            'mean_in_minute': mean_in,
+            'wfh_ratio': wfh_ratio,
+            'on_time_ratio': on_time,
+            'on_time_trend': on_time_trend,
+            'totals': {
+                'check_ins': total,
+                'active_days': int(active.sum()),
+                'avg_headcount': float(headcount[active].mean()) if active.any() else 0.0,
+                'peak_headcount': int(headcount.max()) if len(days) else 0,
+                'wfh_ratio': float(wfh.sum() / total) if total else 0.0,
+                'on_time_ratio': float(1 - late.sum() / total) if total else 0.0,
+                'mean_in_minute': float(np.nanmean(mean_in)) if active.any() else None,
+            },
+            'offices': self._offices(start_date, end_date, max(int(active.sum()), 1)),
+        }
+
+    def _offices(self, start_date, end_date, active_days):
+        """Average daily WFO occupancy per office"""
+        offices = []
+        for row in self.db.get_office_totals(start_date, end_date):
+            avg_daily = row['wfo_days'] / active_days
+            offices.append({
+                'office': self.office_names.get(row['office_location'], row['office_location'] or '-'),
+                'assigned': row['assigned'],
+                'people': row['people'],
+                'avg_daily': avg_daily,
+                'occupancy': avg_daily / row['assigned'] if row['assigned'] else 0.0,
+            })
+        return sorted(offices, key=lambda office: office['avg_daily'], reverse=True)
+
+
+def bucket(values, size):
+    """Sum consecutive groups of `size` values, for charting long ranges"""
+    values = np.asarray(values)
+    if size <= 1:
+        return values
+    pad = (-len(values)) % size
+    padded = np.concatenate([values, np.zeros(pad, dtype=values.dtype)])
+    return padded.reshape(-1, size).sum(axis=1)
@@ -1,117 +1,168 @@
 import cv2
-import numpy as np
-import face_recognition
 import logging
 import time
 
+from src.liveness_cues import default_cues
+
+# An expensive cue skipped for budget this many frames in a row runs anyway,
+# so a cost estimate from one slow frame cannot starve it for good
+MAX_SKIPPED_FRAMES = 5
+
+class LivenessScheduler:
+    """Run liveness cues within a per-frame compute budget
+
+    Cheap cues run on every frame. Expensive cues only run while they can
+    still change the decision, and only when their measured cost fits in
+    what is left of the frame budget, or after MAX_SKIPPED_FRAMES frames
+    in a row without fitting.
+    """
+    def __init__(self, cues, frame_budget_ms=40.0):
+        self.cues = cues
+        self.frame_budget_ms = frame_budget_ms
+        self.cost_ms = {}          # Moving average of cue runtime
+        self.skipped = {}          # Frames skipped for budget, per cue
+        self._skipped_in_row = {}  # Consecutive skipped frames, per cue
+        self._next_expensive = 0   # Round robin between expensive cues
+
+    def _run_cue(self, cue, frame, landmarks, now):
+        start = time.perf_counter()
+        try:
+            cue.update(frame, landmarks, now)
+        except Exception as e:
+            logging.error(f"{cue.label} cue error: {str(e)}")
+        elapsed = (time.perf_counter() - start) * 1000
+        previous = self.cost_ms.get(cue.name)
+        self.cost_ms[cue.name] = elapsed if previous is None else 0.8 * previous + 0.2 * elapsed
+
+    def _needed(self, cue, landmarks, live_threshold):
+        """Expensive cue is needed while it hasn't passed and decision is open"""
+        if landmarks is None or cue.passed:
+            return False
+        return self.combined_score() < live_threshold or not self.required_passed()
+
+    def run(self, frame, landmarks, now, frame_start, live_threshold):
+        """Update cues for one frame captured at `now`
+
+        `now` is the monotonic capture time used for the evidence windows,
+        `frame_start` the perf_counter value the budget is measured from.
+        """
+        for cue in self.cues:
+            if cue.cost != "expensive":
+                self._run_cue(cue, frame, landmarks, now)
+
+        expensive = [cue for cue in self.cues if cue.cost == "expensive"]
+        for offset in range(len(expensive)):
+            cue = expensive[(self._next_expensive + offset) % len(expensive)]
+            if not self._needed(cue, landmarks, live_threshold):
+                continue
+
+            elapsed = (time.perf_counter() - frame_start) * 1000
+            estimate = self.cost_ms.get(cue.name)
+            in_row = self._skipped_in_row.get(cue.name, 0)
+            if (estimate is not None and elapsed + estimate > self.frame_budget_ms
+                    and in_row < MAX_SKIPPED_FRAMES):
+                self.skipped[cue.name] = self.skipped.get(cue.name, 0) + 1
+                self._skipped_in_row[cue.name] = in_row + 1
+                continue
+
+            self._skipped_in_row[cue.name] = 0
+            self._run_cue(cue, frame, landmarks, now)
+            self._next_expensive = (self._next_expensive + offset + 1) % len(expensive)
+
+    def combined_score(self):
+        """Weighted average of all cue scores"""
+        total_weight = sum(cue.weight for cue in self.cues)
+        if total_weight <= 0:
+            return 0.0
+        return sum(cue.weight * cue.score for cue in self.cues) / total_weight
+
+    def required_passed(self):
+        return all(cue.passed for cue in self.cues if cue.required)
+
+    def reset(self):
+        for cue in self.cues:
+            cue.reset()
+        self.skipped = {}
+        self._skipped_in_row = {}
+
+
 class AntiSpoofingDetector:
-    def __init__(self):
+    """Combines the liveness cues into a live / not live decision
+
+    Movement is required. With the default weights (movement 0.5, blink
+    0.25, texture 0.25) and live_threshold 0.64, movement plus a blink, or
+    movement plus a texture score at TextureCue's pass level (0.6), is
+    enough. Movement alone (0.5) is not.
+    """
+    def __init__(self, cues=None, frame_budget_ms=40.0, live_threshold=0.64,
+                 movement_threshold=0.15, required_movements=2, window_seconds=3.0):
         # Configure logging
         logging.basicConfig(
             level=logging.INFO,
             format='%(asctime)s - %(levelname)s - %(message)s'
         )
-        
-        # Movement detection parameters
-        self.prev_landmarks = None
-        self.movement_history = []
-        self.movement_threshold = 0.15  # Sensitive enough to detect small movements
-        self.required_movements = 2     # Only need 2 significant movements
-        self.movement_passed = False
-        
+
+        # Liveness cues: movement and blink are cheap, texture is expensive.
+        # Evidence is collected over wall-clock windows, not frame counts.
+        if cues is None:
+            cues = default_cues(movement_threshold, required_movements, window_seconds)
+        self.scheduler = LivenessScheduler(cues, frame_budget_ms)
+        self.live_threshold = live_threshold  # Combined weighted score needed
+        self.is_live = False
+
         # Performance optimization
-        self.last_check_time = time.time()
+        self.last_check_time = time.monotonic()
         self.check_interval = 0.1  # Check every 100ms
         self.last_result = None
 
-    def calculate_movement(self, landmarks1, landmarks2):
-        """Calculate movement between two sets of landmarks"""
-        if landmarks1 is None or landmarks2 is None:
-            return 0
-            
-        try:
-            # Calculate movement using nose point for simplicity
-            nose_point1 = np.mean(landmarks1['nose_bridge'], axis=0)
-            nose_point2 = np.mean(landmarks2['nose_bridge'], axis=0)
-            
-            # Calculate Euclidean distance
-            movement = np.linalg.norm(nose_point1 - nose_point2)
-            
-            # Normalize by face size
-            face_size = np.linalg.norm(
-                np.mean(landmarks1['left_eye'], axis=0) - 
-                np.mean(landmarks1['right_eye'], axis=0)
-            )
-            
-            if face_size > 0:
-                normalized_movement = movement / face_size
-                return normalized_movement
-            return 0
-            
-        except Exception as e:
-            logging.error(f"Movement calculation error: {str(e)}")
-            return 0
+    @property
+    def cues(self):
+        return self.scheduler.cues
 
-    def check_movement(self, frame):
-        """Check for natural head movement"""
-        try:
-            # Get facial landmarks
-            face_landmarks = face_recognition.face_landmarks(frame)
-            if not face_landmarks:
-                return False
-                
-            current_landmarks = face_landmarks[0]
-            
-            if self.prev_landmarks is not None:
-                # Calculate movement
-                movement = self.calculate_movement(
-                    self.prev_landmarks, 
-                    current_landmarks
-                )
-                
-                # Add to history
-                self.movement_history.append(movement)
-                
-                # Keep only recent history
-                if len(self.movement_history) > 10:
-                    self.movement_history.pop(0)
-                
-                # Check for significant movements
-                significant_movements = sum(
-                    1 for m in self.movement_history 
-                    if m > self.movement_threshold
-                )
-                
-                if significant_movements >= self.required_movements:
-                    self.movement_passed = True
-            
-            self.prev_landmarks = current_landmarks
-            return self.movement_passed
-            
-        except Exception as e:
-            logging.error(f"Movement check error: {str(e)}")
-            return False
+    def detect_landmarks(self, frame):
+        """Get facial landmarks of the first face, None if no face"""
+        import face_recognition
+
+        face_landmarks = face_recognition.face_landmarks(frame)
+        if not face_landmarks:
+            return None
+        return face_landmarks[0]
+
+    def evaluate(self, frame, landmarks, now=None, frame_start=None):
+        """Feed one frame of evidence to the cues, returns (is_live, message)"""
+        if now is None:
+            now = time.monotonic()
+        if frame_start is None:
+            frame_start = time.perf_counter()
+
+        self.scheduler.run(frame, landmarks, now, frame_start, self.live_threshold)
+
+        score = self.scheduler.combined_score()
+        self.is_live = score >= self.live_threshold and self.scheduler.required_passed()
+
+        # Create status message
+        message = " ".join(f"{cue.label}[{cue.status()}]" for cue in self.cues)
+        return self.is_live, message
 
     def check_liveness(self, frame):
-        """Check liveness with only movement detection"""
+        """Check liveness with all configured cues"""
         try:
             # Rate limiting
-            current_time = time.time()
+            current_time = time.monotonic()
             if (current_time - self.last_check_time) < self.check_interval:
                 return self.last_result or (False, "Processing...", frame)
-            
+
             self.last_check_time = current_time
-            
+
             # Create copy for visualization
             visual_frame = frame.copy()
-            
-            # Only check movement
-            movement_status = "✓" if self.check_movement(frame) else "✗"
-            is_live = self.movement_passed
-            
-            # Create status message
-            message = f"Movement[{movement_status}]"
-            
+
+            # Landmarks are shared by all cues. Detection is not part of the
+            # cue budget, it often takes about as long as the budget itself.
+            landmarks = self.detect_landmarks(frame)
+            frame_start = time.perf_counter()
+            is_live, message = self.evaluate(frame, landmarks, current_time, frame_start)
+
             # Add visualization
             cv2.putText(
                 visual_frame,
@@ -122,18 +173,17 @@ class AntiSpoofingDetector:
                 (0, 255, 0) if is_live else (0, 0, 255),
                 2
             )
-            
+
             # Store result
             self.last_result = (is_live, message, visual_frame)
             return self.last_result
-            
+
         except Exception as e:
             logging.error(f"Liveness check error: {str(e)}")
             return False, "Error", frame
 
     def reset(self):
         """Reset all checks"""
-        self.prev_landmarks = None
-        self.movement_history = []
-        self.movement_passed = False
-        self.last_result = None
\ No newline at end of file
+        self.scheduler.reset()
+        self.is_live = False
+        self.last_result = None
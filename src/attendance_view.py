@@ -0,0 +1,203 @@
+"""Lazily loaded attendance table for the admin panel
+
+Only the first page of records is inserted when the view opens. Further
+pages are fetched by keyset as the user scrolls near the bottom, so
+opening the report takes the same time however long the history is.
+Sorting and the status tag of each row come from SQL.
+
+Queries run on one background thread. Every reload bumps a generation
+number, and pages from an older generation are dropped when they arrive,
+so typing in a filter never shows stale results.
+"""
+import queue
+import threading
+
+from src.database import ATTENDANCE_PAGE_SIZE
+
+# Fetch the next page once the scrollbar passes this fraction
+PREFETCH_AT = 0.9
+
+# Treeview heading -> (query_attendance sort key, value getter)
+COLUMNS = [
+    ("ID", 'id', lambda r: r['id']),
+    ("Nama", 'name', lambda r: r['name']),
+    ("Tanggal", 'date', lambda r: r['date']),
+    ("Jam Masuk", None, lambda r: r['time_in']),
+    ("Jam Keluar", None, lambda r: r['time_out'] or '-'),
+    ("Mode", 'mode', lambda r: r['mode']),
+    ("Status", 'status', lambda r: r['status']),
+    ("Lokasi", None, lambda r: r['location'] or '-'),
+]
+
+TAG_COLORS = {
+    'present': "#ffffff",
+    'late': "#fff4e0",
+    'absent': "#fdecea",
+    'present_alternate': "#f5f6fa",
+    'late_alternate': "#fbecd0",
+    'absent_alternate': "#f9dcd8",
+}
+
+# How often (ms) the UI checks for pages from the query thread
+POLL_MS = 50
+
+def resolve_filters(db, filters):
+    """Turn view filters into query_attendance arguments
+
+    A name search becomes the list of matching user IDs.
+    """
+    filters = dict(filters)
+    name = filters.pop('name', None)
+    if name:
+        filters['user_id'] = db.find_user_ids(name)
+    return filters
+
+
+class AttendanceView:
+    """Paged attendance records in a Treeview, loaded while scrolling"""
+    def __init__(self, db, tree, scrollbar, status_label=None, page_size=ATTENDANCE_PAGE_SIZE):
+        self.db = db
+        self.tree = tree
+        self.scrollbar = scrollbar
+        self.status_label = status_label
+        self.page_size = page_size
+
+        self.filters = {}
+        self.sort = 'date'
+        self.descending = True
+        self.next_key = None
+        self.loaded = 0
+        self.loading = False
+
+        # Background query thread
+        self.generation = 0
+        self.requests = queue.Queue()
+        self.results = queue.Queue()
+        self.polling = False
+        self.worker = threading.Thread(target=self._run_queries, daemon=True)
+        self.worker.start()
+
+        self.tree.configure(yscrollcommand=self.on_scroll)
+        for heading, sort_key, _ in COLUMNS:
+            if sort_key:
+                self.tree.heading(heading, command=lambda key=sort_key: self.sort_by(key))
+        for tag, color in TAG_COLORS.items():
+            self.tree.tag_configure(tag, background=color)
+
+    def reload(self, filters=None):
+        """Clear the view and load the first page, optionally with new filters
+
+        filters may contain name, start_date, end_date, mode and status.
+        """
+        if filters is not None:
+            self.filters = {key: value for key, value in filters.items() if value}
+        self.generation += 1
+        self.tree.delete(*self.tree.get_children())
+        self.tree.yview_moveto(0)
+        self.loaded = 0
+        self.next_key = None
+        self.loading = False
+        if self.status_label is not None:
+            self.status_label.config(text="Memuat data...")
+        self.load_page(first=True)
+
+    def set_records(self, records, next_key):
+        """Append one fetched page"""
+        for record in records:
+            tag = record['tag']
+            if self.loaded % 2:
+                tag = f"{tag}_alternate"
+            self.tree.insert(
+                '',
+                'end',
+                values=tuple(value(record) for _, _, value in COLUMNS),
+                tags=(tag,)
+            )
+            self.loaded += 1
+        self.next_key = next_key
+        self.update_status()
+
+    def load_page(self, first=False):
+        """Request the next page from the query thread"""
+        if self.loading or (not first and self.next_key is None):
+            return
+        self.loading = True
+        self.requests.put((
+            self.generation,
+            dict(self.filters),
+            self.sort,
+            self.descending,
+            None if first else self.next_key
+        ))
+        if not self.polling:
+            self.polling = True
+            self.tree.after(POLL_MS, self._poll_results)
+
+    def _run_queries(self):
+        """Query thread: run page requests, skipping outdated ones"""
+        while True:
+            request = self.requests.get()
+            if request is None:
+                break
+            generation, filters, sort, descending, after = request
+            if generation != self.generation:
+                continue
+            try:
+                records, next_key = self.db.query_attendance(
+                    after=after,
+                    limit=self.page_size,
+                    sort=sort,
+                    descending=descending,
+                    **resolve_filters(self.db, filters)
+                )
+                self.results.put((generation, records, next_key))
+            except Exception as e:
+                print(f"Error loading attendance page: {str(e)}")
+                self.results.put((generation, [], None))
+        self.db.release_thread_connection()
+
+    def _poll_results(self):
+        """Insert pages that arrived from the query thread"""
+        try:
+            while True:
+                generation, records, next_key = self.results.get_nowait()
+                if generation == self.generation:
+                    self.loading = False
+                    self.set_records(records, next_key)
+        except queue.Empty:
+            pass
+
+        if self.loading:
+            self.tree.after(POLL_MS, self._poll_results)
+        else:
+            self.polling = False
+
+    def close(self):
+        """Stop the query thread"""
+        self.generation += 1
+        self.loading = False
+        self.requests.put(None)
+
+    def on_scroll(self, first, last):
+        """Scrollbar callback, fetches more rows near the bottom"""
+        self.scrollbar.set(first, last)
+        if float(last) >= PREFETCH_AT and self.next_key is not None:
+            # Defer so the insert does not run inside the scroll callback
+            self.tree.after_idle(self.load_page)
+
+    def sort_by(self, sort_key):
+        """Sort by column, clicking the same column again flips direction"""
+        if self.sort == sort_key:
+            self.descending = not self.descending
+        else:
+            self.sort = sort_key
+            self.descending = sort_key in ('date', 'id')
+        for heading, key, _ in COLUMNS:
+            arrow = (" ▼" if self.descending else " ▲") if key == self.sort else ""
+            self.tree.heading(heading, text=heading + arrow)
+        self.reload()
+
+    def update_status(self):
+        if self.status_label is not None:
+            more = "+" if self.next_key is not None else ""
+            self.status_label.config(text=f"Menampilkan {self.loaded}{more} data")
@@ -0,0 +1,252 @@
+"""Bulk user enrollment from a CSV file or a folder of photos
+
+CSV files need the columns name, home_city, office and photo. Photo paths
+are relative to the CSV file. For a folder, every image becomes one user
+named after the file, all with the same home city and office.
+
+Photos are normalized to aligned face crops, saved and encoded in a
+process pool, photos without exactly one face are rejected, users and
+their encodings are inserted in batched transactions, and every input row
+gets a line in the report. Only file names and encodings come back from
+the workers, so memory doesn't grow with the size of the import.
+
+    python -m src.bulk_enrollment people.csv
+    python -m src.bulk_enrollment --folder photos --home-city Makassar --office "Kantor Walikota Makassar"
+"""
+import argparse
+import csv
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+
+from src.face_encoding import encode_face_image, photo_hash
+from src.user_photos import (
+    PhotoRejected, USER_FACES_DIR, normalize_face_photo, save_user_photo, remove_user_photo,
+    unique_photo_name
+)
+
+PHOTO_EXTENSIONS = ('.jpg', '.jpeg', '.png')
+MAX_PHOTO_MB = 5
+INSERT_BATCH_SIZE = 100
+
+def read_csv_rows(csv_path):
+    """Read enrollment rows from CSV, photo paths resolved against the CSV folder"""
+    base_dir = os.path.dirname(os.path.abspath(csv_path))
+    rows = []
+    with open(csv_path, newline='', encoding='utf-8-sig') as f:
+        for line, record in enumerate(csv.DictReader(f), 2):
+            record = {(k or '').strip().lower(): (v or '').strip() for k, v in record.items()}
+            photo = record.get('photo', '')
+            rows.append({
+                'row': line,
+                'name': record.get('name', ''),
+                'home_city': record.get('home_city', ''),
+                'office': record.get('office', ''),
+                'photo': os.path.join(base_dir, photo) if photo else ''
+            })
+    return rows
+
+
+def read_folder_rows(folder, home_city, office):
+    """One enrollment row per photo, name taken from the filename"""
+    rows = []
+    for filename in sorted(os.listdir(folder)):
+        stem, ext = os.path.splitext(filename)
+        if ext.lower() not in PHOTO_EXTENSIONS:
+            continue
+        rows.append({
+            'row': filename,
+            'name': stem.replace('_', ' ').strip().title(),
+            'home_city': home_city,
+            'office': office,
+            'photo': os.path.join(folder, filename)
+        })
+    return rows
+
+
+def validate_rows(rows, existing_names, cities, offices):
+    """Split rows into valid rows and report entries for invalid ones"""
+    valid = []
+    report = []
+    seen = {name.lower() for name in existing_names}
+
+    for row in rows:
+        error = None
+        photo = row['photo']
+        if not row['name']:
+            error = "Nama kosong"
+        elif row['name'].lower() in seen:
+            error = "Nama sudah terdaftar"
+        elif row['home_city'] not in cities:
+            error = f"Kota tidak dikenal: {row['home_city']}"
+        elif row['office'] not in offices:
+            error = f"Kantor tidak dikenal: {row['office']}"
+        elif not photo or not os.path.exists(photo):
+            error = f"Foto tidak ditemukan: {photo}"
+        elif os.path.splitext(photo)[1].lower() not in PHOTO_EXTENSIONS:
+            error = "Format foto tidak didukung"
+        elif os.path.getsize(photo) > MAX_PHOTO_MB * 1024 * 1024:
+            error = f"Ukuran foto lebih dari {MAX_PHOTO_MB}MB"
+
+        if error:
+            report.append(_report_entry(row, 'error', error))
+        else:
+            seen.add(row['name'].lower())
+            valid.append(row)
+
+    return valid, report
+
+
+def _report_entry(row, status, message, user_id=None):
+    return {
+        'row': row['row'],
+        'name': row['name'],
+        'status': status,
+        'message': message,
+        'user_id': user_id
+    }
+
+
+def _encode_worker(photo, photo_name):
+    """Runs in a worker process: normalize, save and encode one photo
+
+    The crop is stored as `photo_name` in the user faces folder. Returns
+    (photo name, encoding, error message), nothing is saved on error.
+    """
+    try:
+        face_image = normalize_face_photo(photo)
+    except PhotoRejected as e:
+        return None, None, str(e)
+    encoding = encode_face_image(face_image)
+    if encoding is None:
+        return None, None, "Wajah tidak terdeteksi"
+    return save_user_photo(face_image, None, photo_name), encoding, None
+
+
+def _assign_photo_names(rows):
+    """Pick stored photo names up front so workers can't pick the same one"""
+    taken = set()
+    for row in rows:
+        photo_name = unique_photo_name(row['name'], ".jpg", taken)
+        taken.add(photo_name)
+        yield photo_name
+
+
+def encode_rows(rows, max_workers=None, progress=None):
+    """Normalize, save and encode photos in parallel
+
+    Returns a list of (row, photo name, encoding, error).
+    """
+    results = []
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        photos = [row['photo'] for row in rows]
+        photo_names = list(_assign_photo_names(rows))
+        chunksize = max(1, len(photos) // ((max_workers or os.cpu_count() or 1) * 4))
+        for i, (row, result) in enumerate(
+            zip(rows, executor.map(_encode_worker, photos, photo_names, chunksize=chunksize)), 1
+        ):
+            results.append((row, *result))
+            if progress:
+                progress('encode', i, len(rows))
+    return results
+
+
+def import_users(db, rows, cities, offices, max_workers=None, batch_size=INSERT_BATCH_SIZE, progress=None):
+    """Validate, encode and insert users, returns per-row report
+
+    `cities` and `offices` map site names to sites, as Geofence.by_name
+    returns them. `progress`, if given, is called as
+    progress(stage, done, total).
+    """
+    existing_names = [user['name'] for user in db.get_users()]
+    valid, report = validate_rows(rows, existing_names, cities, offices)
+
+    encoded = encode_rows(valid, max_workers, progress) if valid else []
+
+    pending = []
+    for row, photo_name, encoding, error in encoded:
+        if error:
+            report.append(_report_entry(row, 'error', error))
+            continue
+        pending.append((row, photo_name, encoding))
+
+    # Insert in batched transactions
+    for start in range(0, len(pending), batch_size):
+        batch = pending[start:start + batch_size]
+        entries = []
+        for row, photo_name, encoding in batch:
+            entries.append({
+                'name': row['name'],
+                'photo_path': photo_name,
+                'home_location': cities[row['home_city']]['location'],
+                'office_location': offices[row['office']]['location'],
+                'home_site_id': cities[row['home_city']]['id'],
+                'office_site_id': offices[row['office']]['id'],
+                'encoding': encoding,
+                'photo_hash': photo_hash(os.path.join(USER_FACES_DIR, photo_name))
+            })
+
+        results = db.add_users_bulk(entries)
+        for (row, _, _), entry, (user_id, error) in zip(batch, entries, results):
+            if error:
+                remove_user_photo(entry['photo_path'])
+                report.append(_report_entry(row, 'error', error))
+            else:
+                report.append(_report_entry(row, 'ok', "Berhasil", user_id))
+
+        if progress:
+            progress('insert', min(start + batch_size, len(pending)), len(pending))
+
+    # Report in input order
+    order = {row['row']: i for i, row in enumerate(rows)}
+    report.sort(key=lambda entry: order[entry['row']])
+    return report
+
+
+def write_report(report, path):
+    """Write per-row report as CSV"""
+    with open(path, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.DictWriter(f, fieldnames=['row', 'name', 'status', 'message', 'user_id'])
+        writer.writeheader()
+        writer.writerows(report)
+    return path
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Bulk user enrollment")
+    parser.add_argument('csv', nargs='?', help="CSV with name, home_city, office, photo")
+    parser.add_argument('--folder', help="Folder of photos, one user per photo")
+    parser.add_argument('--home-city', help="Home city for folder import")
+    parser.add_argument('--office', help="Office for folder import")
+    parser.add_argument('--workers', type=int, help="Encoding processes (default: CPU count)")
+    parser.add_argument('--report', help="Report CSV path")
+    args = parser.parse_args(argv)
+
+    from src.database import Database
+    from src.geofence import Geofence
+
+    if args.folder:
+        rows = read_folder_rows(args.folder, args.home_city, args.office)
+        report_path = args.report or os.path.join(args.folder, 'import_report.csv')
+    elif args.csv:
+        rows = read_csv_rows(args.csv)
+        report_path = args.report or os.path.splitext(args.csv)[0] + '_report.csv'
+    else:
+        parser.error("Give a CSV file or --folder")
+
+    def progress(stage, done, total):
+        print(f"{stage}: {done}/{total}", end='\r')
+
+    db = Database()
+    sites = Geofence()
+    sites.load(db)
+    report = import_users(db, rows, sites.by_name('city'), sites.by_name('office'), args.workers, progress=progress)
+    write_report(report, report_path)
+
+    succeeded = sum(1 for entry in report if entry['status'] == 'ok')
+    print(f"\nImported {succeeded}/{len(report)} users, report: {report_path}")
+    return 0 if succeeded == len(report) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
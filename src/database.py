@@ -1,142 +1,248 @@
 import sqlite3
+import json
 import os
 import logging
-import hashlib
+import threading
+import time
+from contextlib import contextmanager
 from datetime import datetime
 
+from src.migrations import apply_migrations
+from src.query_stats import QueryStats, TimedConnection, SLOW_QUERY_MS
+from src.geolocation import parse_coordinates
+from src.face_encoding import (
+    ENCODER_NAME, ENCODER_VERSION, ENCODING_DIM, encoding_to_blob, blobs_to_matrix
+)
+
+# Default page size for keyset paginated attendance queries
+ATTENDANCE_PAGE_SIZE = 200
+
+# Repeated scans of the same user within this many seconds are ignored
+DUPLICATE_SCAN_SECONDS = 60
+
+# Sort orders accepted by query_attendance: key -> [(SQL expression, row key)]
+ATTENDANCE_SORT_KEYS = {
+    'date': [('a.date', 'date'), ('a.time_in', 'time_in')],
+    'name': [('u.name', 'name')],
+    'mode': [('a.mode', 'mode')],
+    'status': [('a.status', 'status')],
+    'id': [],
+}
+
+def _coordinates(location):
+    """(lat, lon) of a "lat,lon" string, (None, None) without a location
+
+    Raises ValueError for malformed coordinates, they are never stored.
+    """
+    if location is None:
+        return None, None
+    return parse_coordinates(location)
+
+
 class Database:
-    def __init__(self):
+    """SQLite access shared by the kiosk, the admin panel and background jobs
+
+    The database runs in WAL mode so readers never block the writer. Every
+    thread reads through its own connection, while all writes go through
+    one writer connection serialized by a lock, so a long admin query or
+    export never holds up an attendance insert.
+    """
+    def __init__(self, db_path=None, slow_query_ms=SLOW_QUERY_MS):
         # Setup logging
         logging.basicConfig(
             filename='database.log',
             level=logging.INFO,
             format='%(asctime)s - %(levelname)s - %(message)s'
         )
-        
+
         print("Initializing database...")
-        
+
         # Ensure data directory exists
         os.makedirs('data', exist_ok=True)
-        
-        try:
-            db_path = os.path.join('data', 'attendance.db')
-            db_exists = os.path.exists(db_path)
-            print(f"Database exists: {db_exists}")
-            
-            self.conn = sqlite3.connect(db_path)
-            self.conn.row_factory = sqlite3.Row
+
+        try:
+            self.db_path = db_path or os.path.join('data', 'attendance.db')
+            self.archive_dir = os.path.join(os.path.dirname(self.db_path), 'archive')
+            print(f"Database exists: {os.path.exists(self.db_path)}")
+
+            # Timing of every statement, per Database method
+            self.query_stats = QueryStats(slow_query_ms)
+
+            # Per-thread read connections
+            self._local = threading.local()
+            self._read_connections = []
+            self._connections_lock = threading.Lock()
+
+            # Single writer connection, shared by all threads under the lock
+            self._write_lock = threading.RLock()
+            self._writer_archives = {}
+            self.conn = self._connect(check_same_thread=False)
+            self.conn.execute_untimed("PRAGMA journal_mode=WAL")
             self._cursor = self.conn.cursor()
-            
-            # Only create tables if database doesn't exist
-            if not db_exists:
-                print("New database, creating tables...")
-                self.create_tables()
-            else:
-                print("Using existing database...")
-                # Check if admin_users table exists, create if not
-                self._cursor.execute("SELECT name FROM sqlite_master WHERE type='table' AND name='admin_users'")
-                if not self._cursor.fetchone():
-                    self._create_admin_table()
-            
+
+            # Users that scanned today, user_id -> monotonic time of last scan.
+            # Own lock so the kiosk never waits behind a long write transaction.
+            self._attendees_lock = threading.Lock()
+            self._attendees_date = None
+            self._attendees_today = {}
+
+            # Create or upgrade schema to the latest version
+            self.migrate()
+
             print("Database initialization complete")
         except Exception as e:
             print(f"Error initializing database: {str(e)}")
             raise
 
-    def _create_admin_table(self):
-        """Create admin_users table and default admin account"""
-        try:
-            print("Creating admin_users table...")
-            self._cursor.execute('''
-                CREATE TABLE IF NOT EXISTS admin_users (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    username TEXT NOT NULL UNIQUE,
-                    password TEXT NOT NULL,
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                )
-            ''')
-            
-            # Create default admin account
-            default_password = hashlib.sha256('admin123'.encode()).hexdigest()
-            self._cursor.execute("""
-                INSERT INTO admin_users (username, password)
-                VALUES (?, ?)
-            """, ('admin', default_password))
-            
-            self.conn.commit()
-            print("Admin table and default account created")
-        except Exception as e:
-            print(f"Error creating admin table: {str(e)}")
-            raise
+    def _connect(self, check_same_thread=True):
+        """Open a connection with the tuned pragmas"""
+        conn = sqlite3.connect(
+            self.db_path,
+            timeout=5.0,
+            isolation_level=None,  # Transactions are managed explicitly
+            check_same_thread=check_same_thread,
+            factory=TimedConnection
+        )
+        conn.query_stats = self.query_stats
+        conn.row_factory = sqlite3.Row
+        conn.execute_untimed("PRAGMA synchronous=NORMAL")  # Safe with WAL, far fewer fsyncs
+        conn.execute_untimed("PRAGMA cache_size=-16000")   # 16MB page cache
+        conn.execute_untimed("PRAGMA temp_store=MEMORY")
+        conn.execute_untimed("PRAGMA busy_timeout=5000")
+        return conn
+
+    def _reader(self):
+        """Get the read-only connection of the calling thread"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = self._connect()
+            conn.execute_untimed("PRAGMA query_only=ON")
+            self._local.conn = conn
+            with self._connections_lock:
+                self._read_connections.append(conn)
+        return conn
+
+    def release_thread_connection(self):
+        """Close the calling thread's read connection, for worker threads"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None:
+            self._local.conn = None
+            self._local.archives = None
+            with self._connections_lock:
+                if conn in self._read_connections:
+                    self._read_connections.remove(conn)
+            conn.close()
+
+    @contextmanager
+    def _transaction(self):
+        """Serialized write transaction on the writer connection
+
+        Nested use joins the outer transaction.
+        """
+        with self._write_lock:
+            if self.conn.in_transaction:
+                yield self._cursor
+                return
+
+            self._cursor.execute("BEGIN IMMEDIATE")
+            try:
+                yield self._cursor
+                self._cursor.execute("COMMIT")
+            except Exception:
+                self.conn.rollback()
+                raise
 
     def cursor(self):
-        """Get database cursor"""
-        return self._cursor
-
-    def create_tables(self):
-        """Create necessary tables if they don't exist"""
-        try:
-            # Create users table
-            print("Creating users table...")
-            self._cursor.execute('''
-                CREATE TABLE IF NOT EXISTS users (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    name TEXT NOT NULL UNIQUE,
-                    photo_path TEXT NOT NULL,
-                    home_location TEXT,
-                    office_location TEXT,
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                )
-            ''')
-            
-            # Create attendance table
-            print("Creating attendance table...")
-            self._cursor.execute('''
-                CREATE TABLE IF NOT EXISTS attendance (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    user_id INTEGER NOT NULL,
-                    date DATE DEFAULT CURRENT_DATE,
-                    time_in TIME DEFAULT CURRENT_TIME,
-                    time_out TIME,
-                    mode TEXT NOT NULL,
-                    status TEXT NOT NULL,
-                    location TEXT,
-                    FOREIGN KEY (user_id) REFERENCES users(id)
-                )
-            ''')
-            
-            # Create admin table and account
-            self._create_admin_table()
-            
-            self.conn.commit()
-            print("All tables created successfully")
-            
+        """Get read-only database cursor for the calling thread"""
+        return self._reader().cursor()
+
+    def get_query_stats(self):
+        """Per-method query counts and latencies, for the diagnostics view"""
+        return self.query_stats.snapshot()
+
+    def reset_query_stats(self):
+        self.query_stats.reset()
+
+    def migrate(self):
+        """Apply pending schema migrations"""
+        try:
+            applied = apply_migrations(self)
+            if applied:
+                print(f"Applied migrations: {applied}")
+                # Archive files are outside the migrated database
+                self.upgrade_archives()
+            else:
+                print("Database schema is up to date")
         except Exception as e:
-            print(f"Error creating tables: {str(e)}")
+            print(f"Error migrating database: {str(e)}")
             raise
 
-    def add_user(self, name, photo_path, home_location, office_location):
-        """Add new user"""
+    def add_user(self, name, photo_path, home_location, office_location, encoding=None, photo_hash=None,
+                 home_site_id=None, office_site_id=None):
+        """Add new user, with their face encoding if given, returns the new user ID"""
         try:
             print(f"Adding new user: {name}")
-            self._cursor.execute("""
-                INSERT INTO users (name, photo_path, home_location, office_location)
-                VALUES (?, ?, ?, ?)
-            """, (name, photo_path, home_location, office_location))
-            self.conn.commit()
+            with self._transaction() as cursor:
+                cursor.execute("""
+                    INSERT INTO users (name, photo_path, home_location, office_location,
+                                       home_site_id, office_site_id,
+                                       home_lat, home_lon, office_lat, office_lon)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                """, (name, photo_path, home_location, office_location, home_site_id, office_site_id,
+                      *_coordinates(home_location), *_coordinates(office_location)))
+                user_id = cursor.lastrowid
+                if encoding is not None:
+                    self._insert_face_encoding(cursor, user_id, encoding, photo_hash)
             print("User added successfully")
-            return True
+            return user_id
         except Exception as e:
             print(f"Error adding user: {str(e)}")
-            self.conn.rollback()
             return False
 
+    def add_users_bulk(self, entries):
+        """Add many users with their face encodings in one transaction
+
+        Each entry is a dict with name, photo_path, home_location,
+        office_location, encoding and photo_hash, and optionally
+        home_site_id and office_site_id. Rows are isolated with
+        savepoints so one bad row doesn't fail the batch. Returns a list
+        of (user_id, error) in entry order.
+        """
+        results = []
+        try:
+            print(f"Adding {len(entries)} users in one batch")
+            with self._transaction() as cursor:
+                for entry in entries:
+                    cursor.execute("SAVEPOINT bulk_user")
+                    try:
+                        cursor.execute("""
+                            INSERT INTO users (name, photo_path, home_location, office_location,
+                                               home_site_id, office_site_id,
+                                               home_lat, home_lon, office_lat, office_lon)
+                            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                        """, (entry['name'], entry['photo_path'],
+                              entry['home_location'], entry['office_location'],
+                              entry.get('home_site_id'), entry.get('office_site_id'),
+                              *_coordinates(entry['home_location']), *_coordinates(entry['office_location'])))
+                        user_id = cursor.lastrowid
+                        self._insert_face_encoding(cursor, user_id, entry['encoding'], entry['photo_hash'])
+                        cursor.execute("RELEASE bulk_user")
+                        results.append((user_id, None))
+                    except (sqlite3.Error, ValueError) as e:
+                        cursor.execute("ROLLBACK TO bulk_user")
+                        cursor.execute("RELEASE bulk_user")
+                        results.append((None, str(e)))
+            print(f"Batch done: {sum(1 for user_id, _ in results if user_id)} users added")
+            return results
+        except Exception as e:
+            print(f"Error adding users in bulk: {str(e)}")
+            return [(None, str(e))] * len(entries)
+
     def get_users(self):
         """Get all users"""
         try:
             print("Fetching all users")
-            self._cursor.execute("SELECT * FROM users")
-            users = self._cursor.fetchall()
+            users = self._reader().execute("SELECT * FROM users").fetchall()
             print(f"Found {len(users)} users")
             return users
         except Exception as e:
@@ -147,10 +253,9 @@ class Database:
         """Get user by ID"""
         try:
             print(f"Fetching user with ID: {user_id}")
-            self._cursor.execute("""
+            user = self._reader().execute("""
                 SELECT * FROM users WHERE id = ?
-            """, (user_id,))
-            user = self._cursor.fetchone()
+            """, (user_id,)).fetchone()
             if user:
                 print(f"Found user: {user['name']}")
             else:
@@ -160,109 +265,921 @@ class Database:
             print(f"Error getting user by ID: {str(e)}")
             return None
 
-    def update_user(self, user_id, name, photo_path=None, home_location=None, office_location=None):
-        """Update user data"""
+    def find_user_ids(self, name_query):
+        """IDs of users whose name contains the text, case insensitive"""
+        try:
+            pattern = name_query.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+            rows = self._reader().execute("""
+                SELECT id FROM users WHERE name LIKE ? ESCAPE '\\'
+            """, (f"%{pattern}%",)).fetchall()
+            return [row['id'] for row in rows]
+        except Exception as e:
+            print(f"Error searching users: {str(e)}")
+            return []
+
+    def update_user(self, user_id, name, photo_path=None, home_location=None, office_location=None,
+                    encoding=None, photo_hash=None, home_site_id=None, office_site_id=None):
+        """Update user data, a new photo should come with its encoding"""
         try:
             print(f"Updating user ID {user_id}")
-            if photo_path:
-                self._cursor.execute("""
-                    UPDATE users 
-                    SET name = ?, photo_path = ?, home_location = ?, office_location = ?
-                    WHERE id = ?
-                """, (name, photo_path, home_location, office_location, user_id))
-            else:
-                self._cursor.execute("""
-                    UPDATE users 
-                    SET name = ?, home_location = ?, office_location = ?
-                    WHERE id = ?
-                """, (name, home_location, office_location, user_id))
-            
-            self.conn.commit()
+            coordinates = (*_coordinates(home_location), *_coordinates(office_location))
+            with self._transaction() as cursor:
+                if photo_path:
+                    cursor.execute("""
+                        UPDATE users
+                        SET name = ?, photo_path = ?, home_location = ?, office_location = ?,
+                            home_site_id = ?, office_site_id = ?,
+                            home_lat = ?, home_lon = ?, office_lat = ?, office_lon = ?
+                        WHERE id = ?
+                    """, (name, photo_path, home_location, office_location,
+                          home_site_id, office_site_id, *coordinates, user_id))
+
+                    # Stored encodings belong to the old photo
+                    cursor.execute("""
+                        DELETE FROM face_encodings WHERE user_id = ?
+                    """, (user_id,))
+                    if encoding is not None:
+                        self._insert_face_encoding(cursor, user_id, encoding, photo_hash)
+                else:
+                    cursor.execute("""
+                        UPDATE users
+                        SET name = ?, home_location = ?, office_location = ?,
+                            home_site_id = ?, office_site_id = ?,
+                            home_lat = ?, home_lon = ?, office_lat = ?, office_lon = ?
+                        WHERE id = ?
+                    """, (name, home_location, office_location, home_site_id, office_site_id,
+                          *coordinates, user_id))
+
             print(f"User {user_id} updated successfully")
             return True
-            
+
         except Exception as e:
             print(f"Error updating user: {str(e)}")
-            self.conn.rollback()
             return False
 
     def delete_user(self, user_id):
         """Delete user and their attendance records"""
         try:
             print(f"Deleting user ID {user_id} and their attendance records")
-            
-            # Delete attendance records first (due to foreign key constraint)
-            self._cursor.execute("""
-                DELETE FROM attendance WHERE user_id = ?
-            """, (user_id,))
-            
-            # Delete user
-            self._cursor.execute("""
-                DELETE FROM users WHERE id = ?
-            """, (user_id,))
-            
-            self.conn.commit()
+
+            with self._transaction() as cursor:
+                # Delete attendance records and encodings first (due to foreign key constraint)
+                cursor.execute("""
+                    DELETE FROM attendance WHERE user_id = ?
+                """, (user_id,))
+                cursor.execute("""
+                    DELETE FROM face_encodings WHERE user_id = ?
+                """, (user_id,))
+                cursor.execute("""
+                    DELETE FROM attendance_daily WHERE user_id = ?
+                """, (user_id,))
+
+                # Delete user
+                cursor.execute("""
+                    DELETE FROM users WHERE id = ?
+                """, (user_id,))
+
             print(f"User {user_id} and their records deleted successfully")
             return True
-            
+
         except Exception as e:
             print(f"Error deleting user: {str(e)}")
-            self.conn.rollback()
             return False
 
+    def get_sites(self, kind=None):
+        """Get registered sites, optionally only offices or cities"""
+        try:
+            if kind:
+                return self._reader().execute(
+                    "SELECT * FROM sites WHERE kind = ? ORDER BY name", (kind,)
+                ).fetchall()
+            return self._reader().execute("SELECT * FROM sites ORDER BY kind, name").fetchall()
+        except Exception as e:
+            print(f"Error getting sites: {str(e)}")
+            return []
+
+    def add_site(self, kind, name, lat, lon, radius_m=None, polygon=None):
+        """Register an office or city, returns the new site ID
+
+        The geofence is a radius in meters around (lat, lon) or a polygon
+        of (lat, lon) points, which takes precedence when given.
+        """
+        from src.geofence import bounding_box, parse_polygon
+
+        try:
+            print(f"Adding {kind} site: {name}")
+            points = parse_polygon(polygon)
+            box = bounding_box(lat, lon, radius_m, points)
+            with self._transaction() as cursor:
+                cursor.execute("""
+                    INSERT INTO sites (kind, name, lat, lon, radius_m, polygon,
+                                       min_lat, max_lat, min_lon, max_lon)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                """, (kind, name, lat, lon, radius_m, json.dumps(points) if points else None, *box))
+                return cursor.lastrowid
+        except Exception as e:
+            print(f"Error adding site: {str(e)}")
+            return None
+
+    def update_site(self, site_id, lat=None, lon=None, radius_m=None, polygon=None):
+        """Move a site or change its geofence, linked users follow a move"""
+        from src.geofence import bounding_box, parse_polygon, site_location
+
+        try:
+            with self._transaction() as cursor:
+                site = cursor.execute("SELECT * FROM sites WHERE id = ?", (site_id,)).fetchone()
+                if site is None:
+                    print(f"Site {site_id} not found")
+                    return False
+                lat = site['lat'] if lat is None else lat
+                lon = site['lon'] if lon is None else lon
+                radius_m = site['radius_m'] if radius_m is None else radius_m
+                points = parse_polygon(site['polygon'] if polygon is None else polygon)
+                box = bounding_box(lat, lon, radius_m, points)
+                cursor.execute("""
+                    UPDATE sites
+                    SET lat = ?, lon = ?, radius_m = ?, polygon = ?,
+                        min_lat = ?, max_lat = ?, min_lon = ?, max_lon = ?
+                    WHERE id = ?
+                """, (lat, lon, radius_m, json.dumps(points) if points else None, *box, site_id))
+
+                # Users keep a copy of their sites' coordinates
+                location = site_location(lat, lon)
+                for prefix in ('home', 'office'):
+                    cursor.execute(f"""
+                        UPDATE users SET {prefix}_location = ?, {prefix}_lat = ?, {prefix}_lon = ?
+                        WHERE {prefix}_site_id = ?
+                    """, (location, lat, lon, site_id))
+            print(f"Site {site_id} updated")
+            return True
+        except Exception as e:
+            print(f"Error updating site: {str(e)}")
+            return False
+
+    def _insert_face_encoding(self, cursor, user_id, encoding, photo_hash,
+                              encoder=ENCODER_NAME, encoder_version=ENCODER_VERSION):
+        cursor.execute("""
+            INSERT OR REPLACE INTO face_encodings
+                (user_id, encoder, encoder_version, photo_hash, dim, encoding, updated_at)
+            VALUES (?, ?, ?, ?, ?, ?, CURRENT_TIMESTAMP)
+        """, (user_id, encoder, encoder_version, photo_hash,
+              len(encoding), encoding_to_blob(encoding)))
+
+    def save_face_encoding(self, user_id, encoding, photo_hash,
+                           encoder=ENCODER_NAME, encoder_version=ENCODER_VERSION):
+        """Store or replace a user's face encoding"""
+        try:
+            with self._transaction() as cursor:
+                self._insert_face_encoding(cursor, user_id, encoding, photo_hash, encoder, encoder_version)
+            return True
+        except Exception as e:
+            print(f"Error saving face encoding: {str(e)}")
+            return False
+
+    def load_face_encodings(self, encoder=ENCODER_NAME, encoder_version=ENCODER_VERSION, user_ids=None):
+        """Load all encodings of one encoder version in a single query
+
+        Returns (user_ids, names, matrix) where matrix is an (N, 128)
+        float32 array whose rows line up with user_ids and names. Pass
+        user_ids to load only those users.
+        """
+        try:
+            params = [encoder, encoder_version, ENCODING_DIM]
+            user_filter = ""
+            if user_ids is not None:
+                user_ids = list(user_ids)
+                user_filter = f"AND f.user_id IN ({','.join('?' * len(user_ids))})" if user_ids else "AND 0"
+                params.extend(user_ids)
+            rows = self._reader().execute(f"""
+                SELECT f.user_id, u.name, f.encoding
+                FROM face_encodings f
+                JOIN users u ON f.user_id = u.id
+                WHERE f.encoder = ? AND f.encoder_version = ? AND f.dim = ?
+                {user_filter}
+                ORDER BY f.user_id
+            """, params).fetchall()
+            user_ids = [row['user_id'] for row in rows]
+            names = [row['name'] for row in rows]
+            matrix = blobs_to_matrix([row['encoding'] for row in rows])
+            print(f"Loaded {len(user_ids)} stored face encodings")
+            return user_ids, names, matrix
+        except Exception as e:
+            print(f"Error loading face encodings: {str(e)}")
+            return [], [], blobs_to_matrix([])
+
+    def gallery_version(self):
+        """Sequence number of the latest face gallery change, 0 if none"""
+        try:
+            row = self._reader().execute("SELECT MAX(seq) FROM gallery_changes").fetchone()
+            return row[0] or 0
+        except Exception as e:
+            print(f"Error getting gallery version: {str(e)}")
+            return 0
+
+    def get_gallery_changes(self, since_seq):
+        """Users whose face or name changed after since_seq
+
+        Returns (latest_seq, user_ids). Rows are written by triggers on
+        users and face_encodings, so every write path is covered.
+        """
+        try:
+            rows = self._reader().execute("""
+                SELECT user_id, MAX(seq) AS seq FROM gallery_changes
+                WHERE seq > ?
+                GROUP BY user_id
+            """, (since_seq,)).fetchall()
+            latest = max((row['seq'] for row in rows), default=since_seq)
+            return latest, [row['user_id'] for row in rows]
+        except Exception as e:
+            print(f"Error getting gallery changes: {str(e)}")
+            return since_seq, []
+
+    def get_users_without_encoding(self, encoder=ENCODER_NAME, encoder_version=ENCODER_VERSION):
+        """Get users that have no encoding for the given encoder version"""
+        try:
+            return self._reader().execute("""
+                SELECT u.* FROM users u
+                WHERE NOT EXISTS (
+                    SELECT 1 FROM face_encodings f
+                    WHERE f.user_id = u.id AND f.encoder = ? AND f.encoder_version = ?
+                )
+            """, (encoder, encoder_version)).fetchall()
+        except Exception as e:
+            print(f"Error getting users without encoding: {str(e)}")
+            return []
+
+    def _local_now(self):
+        """Kiosk wall clock, attendance dates and times are local time
+
+        SQLite's CURRENT_DATE and CURRENT_TIME are UTC, so an early check-in
+        at UTC+8 would land on the previous day. They are not used for
+        attendance rows.
+        """
+        return datetime.now()
+
+    def _today(self):
+        """Current local date as stored in attendance rows"""
+        return self._local_now().strftime('%Y-%m-%d')
+
+    def is_duplicate_scan(self, user_id, now=None):
+        """Check in memory whether user scanned within DUPLICATE_SCAN_SECONDS"""
+        if now is None:
+            now = time.monotonic()
+        with self._attendees_lock:
+            # Today's attendees, reset when the date changes
+            today = self._today()
+            if self._attendees_date != today:
+                self._attendees_date = today
+                self._attendees_today = {}
+
+            last_scan = self._attendees_today.get(user_id)
+            return last_scan is not None and now - last_scan < DUPLICATE_SCAN_SECONDS
+
     def record_attendance(self, user_id, mode, status, location=None):
-        """Record attendance"""
+        """Record check-in, or check-out if the user already checked in today
+
+        There is one attendance row per user per day: the first scan
+        inserts it, later scans update time_out and scan_count, which the
+        daily summary's event_count mirrors. Scans within
+        DUPLICATE_SCAN_SECONDS of the previous one are rejected from
+        memory without touching SQLite. Returns "check_in", "check_out",
+        "duplicate", or False on error.
+        """
         try:
             print(f"Recording attendance for user_id: {user_id}")
-            self._cursor.execute("""
-                INSERT INTO attendance (user_id, mode, status, location)
-                VALUES (?, ?, ?, ?)
-            """, (user_id, mode, status, location))
-            self.conn.commit()
-            print("Attendance recorded successfully")
-            return True
+            now = time.monotonic()
+            lat, lon = _coordinates(location)
+
+            with self._write_lock:
+                if self.is_duplicate_scan(user_id, now):
+                    print("Duplicate scan ignored")
+                    return "duplicate"
+
+                # Date and times from one local reading
+                scanned = self._local_now()
+                today = scanned.strftime('%Y-%m-%d')
+                clock = scanned.strftime('%H:%M:%S')
+                with self._transaction() as cursor:
+                    cursor.execute("""
+                        INSERT INTO attendance (user_id, date, time_in, mode, status, location, lat, lon)
+                        VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                        ON CONFLICT(user_id, date) DO UPDATE SET
+                            time_out = excluded.time_in,
+                            scan_count = scan_count + 1
+                    """, (user_id, today, clock, mode, status, location, lat, lon))
+
+                    cursor.execute("""
+                        SELECT id, time_out FROM attendance
+                        WHERE user_id = ? AND date = ?
+                    """, (user_id, today))
+                    row = cursor.fetchone()
+                    action = "check_in" if row['time_out'] is None else "check_out"
+
+                    # Keep daily summary in the same transaction
+                    cursor.execute("""
+                        INSERT INTO attendance_daily
+                            (user_id, date, first_in, last_out, mode, status, event_count)
+                        SELECT user_id, date, time_in, time_out, mode, status, scan_count
+                        FROM attendance WHERE id = ?
+                        ON CONFLICT(user_id, date) DO UPDATE SET
+                            first_in = MIN(first_in, excluded.first_in),
+                            last_out = COALESCE(excluded.last_out, last_out),
+                            event_count = excluded.event_count
+                    """, (row['id'],))
+
+                with self._attendees_lock:
+                    if self._attendees_date != today:
+                        self._attendees_date = today
+                        self._attendees_today = {}
+                    self._attendees_today[user_id] = now
+
+            print(f"Attendance recorded successfully ({action})")
+            return action
         except Exception as e:
             print(f"Error recording attendance: {str(e)}")
-            self.conn.rollback()
             return False
 
     def get_attendance(self):
-        """Get all attendance records"""
+        """Get all attendance records, including archived months
+
+        Loads the full history into memory, prefer query_attendance or
+        iter_attendance for anything that can grow.
+        """
         try:
             print("Fetching all attendance records")
-            self._cursor.execute("""
-                SELECT a.*, u.name 
-                FROM attendance a 
-                JOIN users u ON a.user_id = u.id
-                ORDER BY a.date DESC, a.time_in DESC
-            """)
-            records = self._cursor.fetchall()
+            records = list(self.iter_attendance())
             print(f"Found {len(records)} attendance records")
             return records
         except Exception as e:
             print(f"Error getting attendance: {str(e)}")
             return []
 
+    def _attendance_filters(self, start_date=None, end_date=None, user_id=None, mode=None, status=None,
+                            bbox=None):
+        """Build WHERE clauses and parameters for attendance queries
+
+        user_id can be a single ID or a list of IDs. bbox is (min_lat,
+        max_lat, min_lon, max_lon) of the check-in position.
+        """
+        clauses = []
+        params = []
+        if start_date:
+            clauses.append("a.date >= ?")
+            params.append(str(start_date))
+        if end_date:
+            clauses.append("a.date <= ?")
+            params.append(str(end_date))
+        if user_id is not None:
+            if isinstance(user_id, (list, tuple, set)):
+                user_ids = list(user_id)
+                if not user_ids:
+                    clauses.append("0")  # Empty list matches nothing
+                else:
+                    clauses.append(f"a.user_id IN ({','.join('?' * len(user_ids))})")
+                    params.extend(user_ids)
+            else:
+                clauses.append("a.user_id = ?")
+                params.append(user_id)
+        if mode:
+            clauses.append("a.mode = ?")
+            params.append(mode)
+        if status:
+            clauses.append("a.status = ?")
+            params.append(status)
+        if bbox is not None:
+            clauses.append("a.lat BETWEEN ? AND ? AND a.lon BETWEEN ? AND ?")
+            params.extend(bbox)
+        return clauses, params
+
+    def _archive_path(self, month):
+        return os.path.join(self.archive_dir, f"attendance_{month.replace('-', '_')}.db")
+
+    def _archived_months(self, conn, start_date=None, end_date=None):
+        """Archived months overlapping the date range, newest first"""
+        clauses = []
+        params = []
+        if start_date:
+            clauses.append("month >= substr(?, 1, 7)")
+            params.append(str(start_date))
+        if end_date:
+            clauses.append("month <= substr(?, 1, 7)")
+            params.append(str(end_date))
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        return [
+            row['month'] for row in conn.execute(
+                f"SELECT month FROM attendance_archives {where} ORDER BY month DESC", params
+            )
+        ]
+
+    def _attached_archives(self, conn):
+        """Attached archive schemas of a connection and how many users each has"""
+        if conn is self.conn:
+            return self._writer_archives
+        attached = getattr(self._local, 'archives', None)
+        if attached is None:
+            attached = self._local.archives = {}
+        return attached
+
+    @contextmanager
+    def _open_source(self, conn, source):
+        """Schema name of an attendance source while the block runs
+
+        'main' is the hot database. A month archive is attached for the
+        block and detached after it, so any number of archives can be read
+        one after another (SQLite allows only 10 attached at once). Nested
+        use of the same archive shares one attachment. Not allowed inside
+        a write transaction, like ATTACH itself.
+        """
+        if source == 'main':
+            yield 'main'
+            return
+
+        attached = self._attached_archives(conn)
+        schema = f"archive_{source.replace('-', '_')}"
+        if not attached.get(schema):
+            conn.execute(f"ATTACH DATABASE ? AS {schema}", (self._archive_path(source),))
+        attached[schema] = attached.get(schema, 0) + 1
+        try:
+            yield schema
+        finally:
+            attached[schema] -= 1
+            if not attached[schema]:
+                del attached[schema]
+                conn.execute(f"DETACH DATABASE {schema}")
+
+    def _attendance_sources(self, conn, start_date=None, end_date=None):
+        """Sources holding attendance for the date range, newest first
+
+        'main' followed by the archived months. The hot database holds the
+        newest months and every archive holds one older month, so reading
+        the sources in this order keeps the overall newest-first ordering
+        without a UNION. Open each one with _open_source while reading it.
+        """
+        return ['main'] + self._archived_months(conn, start_date, end_date)
+
+    def _table_columns(self, conn, schema, table='attendance'):
+        return [row['name'] for row in conn.execute(f"PRAGMA {schema}.table_info({table})")]
+
+    def _attendance_columns(self, conn, schema):
+        """SELECT list for one source, NULL for columns an older archive lacks"""
+        if schema == 'main':
+            return "a.*"
+        available = set(self._table_columns(conn, schema))
+        return ", ".join(
+            f"a.{column}" if column in available else f"NULL AS {column}"
+            for column in self._table_columns(conn, 'main')
+        )
+
+    def query_attendance(self, start_date=None, end_date=None, user_id=None, mode=None,
+                         status=None, after=None, limit=ATTENDANCE_PAGE_SIZE,
+                         sort='date', descending=True, bbox=None):
+        """Get one page of filtered, sorted attendance records
+
+        Pages by keyset on the sort columns plus id: pass the `next_key`
+        returned for the previous page as `after`. Returns (records,
+        next_key), where next_key is None on the last page. `sort` is one
+        of ATTENDANCE_SORT_KEYS. Each record also has a `tag` column for
+        row styling. Archived months are attached only when the date range
+        reaches them.
+        """
+        try:
+            sort_columns = ATTENDANCE_SORT_KEYS[sort]
+            direction = "DESC" if descending else "ASC"
+            key_exprs = [expr for expr, _ in sort_columns] + ["a.id"]
+
+            conn = self._reader()
+            clauses, params = self._attendance_filters(start_date, end_date, user_id, mode, status, bbox)
+            if after is not None:
+                placeholders = ", ".join("?" * len(key_exprs))
+                clauses.append(f"({', '.join(key_exprs)}) {'<' if descending else '>'} ({placeholders})")
+                params.extend(after)
+            where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+            order_by = ", ".join(f"{expr} {direction}" for expr in key_exprs)
+
+            sources = self._attendance_sources(conn, start_date, end_date)
+            if sort == 'date' and not descending:
+                sources.reverse()
+
+            records = []
+            for source in sources:
+                remaining = limit - len(records)
+                if sort == 'date' and remaining <= 0:
+                    # Sources hold disjoint months, so date order is source order
+                    break
+                with self._open_source(conn, source) as schema:
+                    records.extend(conn.execute(f"""
+                        SELECT {self._attendance_columns(conn, schema)}, u.name,
+                               CASE a.status WHEN 'Present' THEN 'present'
+                                             WHEN 'Late' THEN 'late'
+                                             ELSE 'absent' END AS tag
+                        FROM {schema}.attendance a
+                        JOIN main.users u ON a.user_id = u.id
+                        {where}
+                        ORDER BY {order_by}
+                        LIMIT ?
+                    """, params + [limit if sort != 'date' else remaining]).fetchall())
+
+            if sort != 'date' and len(sources) > 1:
+                # Each source is sorted, merge and keep the first page
+                records.sort(
+                    key=lambda row: tuple(row[key] for _, key in sort_columns) + (row['id'],),
+                    reverse=descending
+                )
+                records = records[:limit]
+
+            next_key = None
+            if len(records) == limit:
+                last = records[-1]
+                next_key = tuple(last[key] for _, key in sort_columns) + (last['id'],)
+            return records, next_key
+        except Exception as e:
+            print(f"Error querying attendance: {str(e)}")
+            return [], None
+
+    def iter_attendance(self, start_date=None, end_date=None, user_id=None, mode=None,
+                        status=None, batch_size=500, bbox=None):
+        """Stream filtered attendance records, newest first, for exports
+
+        Records include the coordinates of the user's home and office.
+        Rows are fetched from the cursor in batches so memory use does not
+        depend on the size of the history.
+        """
+        conn = self._reader()
+        clauses, params = self._attendance_filters(start_date, end_date, user_id, mode, status, bbox)
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+
+        for source in self._attendance_sources(conn, start_date, end_date):
+            with self._open_source(conn, source) as schema:
+                cursor = conn.execute(f"""
+                    SELECT {self._attendance_columns(conn, schema)}, u.name,
+                           u.home_lat, u.home_lon, u.office_lat, u.office_lon
+                    FROM {schema}.attendance a
+                    JOIN main.users u ON a.user_id = u.id
+                    {where}
+                    ORDER BY a.date DESC, a.time_in DESC, a.id DESC
+                """, params)
+                try:
+                    while True:
+                        rows = cursor.fetchmany(batch_size)
+                        if not rows:
+                            break
+                        yield from rows
+                finally:
+                    # An open statement would keep the archive from detaching
+                    cursor.close()
+
+    def count_attendance(self, start_date=None, end_date=None, user_id=None, mode=None, status=None,
+                         bbox=None):
+        """Count filtered attendance records"""
+        try:
+            conn = self._reader()
+            clauses, params = self._attendance_filters(start_date, end_date, user_id, mode, status, bbox)
+            where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+            total = 0
+            for source in self._attendance_sources(conn, start_date, end_date):
+                with self._open_source(conn, source) as schema:
+                    total += conn.execute(
+                        f"SELECT COUNT(*) FROM {schema}.attendance a {where}", params
+                    ).fetchone()[0]
+            return total
+        except Exception as e:
+            print(f"Error counting attendance: {str(e)}")
+            return 0
+
+    def attendance_export_stats(self, start_date=None, end_date=None, user_id=None, mode=None, status=None,
+                                bbox=None):
+        """Row count and longest value of each report column, in one scan
+
+        Used to size export columns without a second pass over the data.
+        Returns {'count': n, 'widths': {column: max length}}.
+        """
+        columns = ['id', 'name', 'date', 'time_in', 'time_out', 'mode', 'status', 'location']
+        try:
+            conn = self._reader()
+            clauses, params = self._attendance_filters(start_date, end_date, user_id, mode, status, bbox)
+            where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+            lengths = ", ".join(
+                f"MAX(LENGTH({'u' if column == 'name' else 'a'}.{column}))" for column in columns
+            )
+
+            count = 0
+            widths = dict.fromkeys(columns, 0)
+            for source in self._attendance_sources(conn, start_date, end_date):
+                with self._open_source(conn, source) as schema:
+                    row = conn.execute(f"""
+                        SELECT COUNT(*), {lengths}
+                        FROM {schema}.attendance a
+                        JOIN main.users u ON a.user_id = u.id
+                        {where}
+                    """, params).fetchone()
+                count += row[0]
+                for column, length in zip(columns, row[1:]):
+                    widths[column] = max(widths[column], length or 0)
+            return {'count': count, 'widths': widths}
+        except Exception as e:
+            print(f"Error getting export stats: {str(e)}")
+            return {'count': 0, 'widths': {}}
+
+    def archive_closed_months(self, keep_months=3):
+        """Move closed months out of the hot database into archive files
+
+        Months older than the last `keep_months` (current month included)
+        are copied into data/archive/attendance_YYYY_MM.db, deleted from
+        the hot table and recorded in attendance_archives. Re-running after
+        an interruption finishes the move. Returns archived months.
+        """
+        try:
+            today = self._local_now().date()
+            year, month = today.year, today.month - (keep_months - 1)
+            while month < 1:
+                year, month = year - 1, month + 12
+            cutoff = f"{year:04d}-{month:02d}-01"
+
+            months = [
+                row[0] for row in self._reader().execute("""
+                    SELECT DISTINCT substr(date, 1, 7) FROM attendance
+                    WHERE date < ? ORDER BY 1
+                """, (cutoff,))
+            ]
+            if not months:
+                print("No closed months to archive")
+                return []
+
+            os.makedirs(self.archive_dir, exist_ok=True)
+            for month in months:
+                start = f"{month}-01"
+                year, mon = map(int, month.split('-'))
+                end = f"{year + mon // 12:04d}-{mon % 12 + 1:02d}-01"
+                print(f"Archiving attendance for {month}...")
+
+                with self._write_lock:
+                    # ATTACH is not allowed inside a transaction
+                    self.conn.execute("ATTACH DATABASE ? AS archive_target", (self._archive_path(month),))
+                    try:
+                        with self._transaction() as cursor:
+                            cursor.execute("""
+                                CREATE TABLE IF NOT EXISTS archive_target.attendance AS
+                                SELECT * FROM main.attendance WHERE 0
+                            """)
+                            cursor.execute("""
+                                CREATE UNIQUE INDEX IF NOT EXISTS archive_target.idx_archive_id
+                                ON attendance(id)
+                            """)
+                            cursor.execute("""
+                                CREATE INDEX IF NOT EXISTS archive_target.idx_archive_date_time
+                                ON attendance(date, time_in)
+                            """)
+
+                            self._upgrade_archive_columns(cursor, 'archive_target')
+                            columns = ", ".join(self._table_columns(self.conn, 'main'))
+                            cursor.execute(f"""
+                                INSERT OR IGNORE INTO archive_target.attendance ({columns})
+                                SELECT {columns} FROM main.attendance
+                                WHERE date >= ? AND date < ?
+                            """, (start, end))
+                            cursor.execute("""
+                                DELETE FROM main.attendance WHERE date >= ? AND date < ?
+                            """, (start, end))
+
+                            cursor.execute("SELECT COUNT(*) FROM archive_target.attendance")
+                            row_count = cursor.fetchone()[0]
+                            cursor.execute("""
+                                INSERT OR REPLACE INTO attendance_archives (month, path, row_count)
+                                VALUES (?, ?, ?)
+                            """, (month, os.path.basename(self._archive_path(month)), row_count))
+                    finally:
+                        self.conn.execute("DETACH DATABASE archive_target")
+
+                logging.info(f"Archived attendance for {month} ({row_count} rows)")
+                print(f"Archived {row_count} rows for {month}")
+            return months
+        except Exception as e:
+            print(f"Error archiving attendance: {str(e)}")
+            return []
+
+    def _upgrade_archive_columns(self, cursor, schema):
+        """Add attendance columns an archive predates, returns the added ones
+
+        New coordinate columns are filled from the archived location text,
+        and scan counts from the daily summary.
+        """
+        archive_columns = set(self._table_columns(self.conn, schema))
+        main_columns = self._table_columns(self.conn, 'main')
+        types = {row['name']: row['type'] for row in self.conn.execute("PRAGMA main.table_info(attendance)")}
+        added = [column for column in main_columns if column not in archive_columns]
+        for column in added:
+            cursor.execute(f"ALTER TABLE {schema}.attendance ADD COLUMN {column} {types[column]}")
+
+        if 'lat' in added or 'lon' in added:
+            cursor.execute(f"SELECT DISTINCT location FROM {schema}.attendance WHERE location IS NOT NULL")
+            for (location,) in cursor.fetchall():
+                try:
+                    lat, lon = parse_coordinates(location)
+                except ValueError:
+                    logging.warning(f"Unparseable archived location left without coordinates: {location!r}")
+                    continue
+                cursor.execute(f"UPDATE {schema}.attendance SET lat = ?, lon = ? WHERE location = ?",
+                               (lat, lon, location))
+
+        if 'scan_count' in added:
+            cursor.execute(f"""
+                UPDATE {schema}.attendance SET scan_count = MAX(
+                    1 + (time_out IS NOT NULL),
+                    COALESCE((SELECT event_count FROM main.attendance_daily d
+                              WHERE d.user_id = attendance.user_id AND d.date = attendance.date), 0)
+                )
+            """)
+        return added
+
+    def upgrade_archives(self):
+        """Bring every archive file up to the current attendance columns
+
+        Returns the number of archives that were changed.
+        """
+        try:
+            months = [row['month'] for row in self.conn.execute("SELECT month FROM attendance_archives")]
+            upgraded = 0
+            for month in months:
+                if not os.path.isfile(self._archive_path(month)):
+                    logging.warning(f"Archive for {month} is missing: {self._archive_path(month)}")
+                    continue
+                with self._write_lock:
+                    self.conn.execute("ATTACH DATABASE ? AS archive_target", (self._archive_path(month),))
+                    try:
+                        with self._transaction() as cursor:
+                            added = self._upgrade_archive_columns(cursor, 'archive_target')
+                    finally:
+                        self.conn.execute("DETACH DATABASE archive_target")
+                if added:
+                    upgraded += 1
+                    print(f"Upgraded archive {month}: added {', '.join(added)}")
+            return upgraded
+        except Exception as e:
+            print(f"Error upgrading archives: {str(e)}")
+            return 0
+
+    def rebuild_daily_summary(self, start_date=None, end_date=None):
+        """Recompute attendance_daily from raw attendance, for backfills
+
+        Without dates the whole summary is rebuilt. Archived months in the
+        range are read from their archive files.
+        """
+        try:
+            clauses, params = self._attendance_filters(start_date, end_date)
+
+            print(f"Rebuilding daily summary {start_date or 'start'} - {end_date or 'end'}")
+            with self._write_lock:
+                rebuilt = 0
+                for source in self._attendance_sources(self.conn, start_date, end_date):
+                    # Archives are attached outside the transaction, so each
+                    # source is rebuilt in its own. A month only ever lives in
+                    # one source, so its summary is never half rebuilt.
+                    if source == 'main':
+                        month_clause = "substr(a.date, 1, 7) NOT IN (SELECT month FROM attendance_archives)"
+                        month_params = []
+                    else:
+                        month_clause = "substr(a.date, 1, 7) = ?"
+                        month_params = [source]
+                    source_where = f"WHERE {' AND '.join(clauses + [month_clause])}"
+                    with self._open_source(self.conn, source) as schema, self._transaction() as cursor:
+                        cursor.execute(f"DELETE FROM attendance_daily AS a {source_where}",
+                                       params + month_params)
+                        # Mode and status come from the first check-in of the day
+                        cursor.execute(f"""
+                            INSERT INTO attendance_daily
+                                (user_id, date, first_in, last_out, mode, status, event_count)
+                            SELECT user_id, date, time_in, last_out, mode, status, event_count
+                            FROM (
+                                SELECT a.user_id, a.date, a.time_in, a.mode, a.status,
+                                       ROW_NUMBER() OVER (PARTITION BY a.user_id, a.date
+                                                          ORDER BY a.time_in, a.id) AS rn,
+                                       SUM(a.scan_count) OVER day AS event_count,
+                                       CASE WHEN COUNT(*) OVER day > 1 OR MAX(a.time_out) OVER day IS NOT NULL
+                                            THEN MAX(COALESCE(a.time_out, a.time_in)) OVER day END AS last_out
+                                FROM {schema}.attendance a
+                                {source_where}
+                                WINDOW day AS (PARTITION BY a.user_id, a.date)
+                            )
+                            WHERE rn = 1
+                        """, params + month_params)
+                        rebuilt += cursor.rowcount
+            print(f"Rebuilt {rebuilt} daily summary rows")
+            return rebuilt
+        except Exception as e:
+            print(f"Error rebuilding daily summary: {str(e)}")
+            return 0
+
+    def get_daily_summary(self, start_date=None, end_date=None, user_id=None):
+        """First check-in, last check-out, mode and status per user per day"""
+        try:
+            clauses, params = self._attendance_filters(start_date, end_date, user_id)
+            where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+            return self._reader().execute(f"""
+                SELECT a.*, u.name
+                FROM attendance_daily a
+                JOIN users u ON a.user_id = u.id
+                {where}
+                ORDER BY a.date DESC, u.name
+            """, params).fetchall()
+        except Exception as e:
+            print(f"Error getting daily summary: {str(e)}")
+            return []
+
+    def get_monthly_summary(self, month):
+        """Per user totals for one month ('YYYY-MM') from the daily summary"""
+        try:
+            return self._reader().execute("""
+                SELECT u.id AS user_id, u.name,
+                       COUNT(*) AS days_present,
+                       SUM(a.mode = 'WFH') AS wfh_days,
+                       SUM(a.mode = 'WFO') AS wfo_days,
+                       SUM(a.status = 'Late') AS late_days,
+                       MIN(a.first_in) AS earliest_in,
+                       MAX(a.last_out) AS latest_out
+                FROM attendance_daily a
+                JOIN users u ON a.user_id = u.id
+                WHERE a.date >= ? AND a.date < date(?, '+1 month')
+                GROUP BY u.id
+                ORDER BY u.name
+            """, (f"{month}-01", f"{month}-01")).fetchall()
+        except Exception as e:
+            print(f"Error getting monthly summary: {str(e)}")
+            return []
+
+    def get_daily_totals(self, start_date, end_date):
+        """Per day headcount, WFH/WFO split, late count and mean check-in minute
+
+        Aggregated from the daily summary over its date index, one row per
+        day that has attendance.
+        """
+        try:
+            return self._reader().execute("""
+                SELECT date,
+                       COUNT(*) AS headcount,
+                       SUM(mode = 'WFH') AS wfh,
+                       SUM(mode = 'WFO') AS wfo,
+                       SUM(status = 'Late') AS late,
+                       AVG(CAST(substr(first_in, 1, 2) AS INTEGER) * 60
+                           + CAST(substr(first_in, 4, 2) AS INTEGER)) AS mean_in_minute
+                FROM attendance_daily
+                WHERE date >= ? AND date <= ?
+                GROUP BY date
+                ORDER BY date
+            """, (str(start_date), str(end_date))).fetchall()
+        except Exception as e:
+            print(f"Error getting daily totals: {str(e)}")
+            return []
+
+    def get_office_totals(self, start_date, end_date):
+        """Per office WFO check-ins in the range and number of assigned users"""
+        try:
+            return self._reader().execute("""
+                SELECT u.office_location,
+                       COUNT(DISTINCT u.id) AS assigned,
+                       COUNT(a.user_id) AS wfo_days,
+                       COUNT(DISTINCT a.user_id) AS people
+                FROM users u
+                LEFT JOIN attendance_daily a
+                  ON a.user_id = u.id AND a.mode = 'WFO' AND a.date >= ? AND a.date <= ?
+                GROUP BY u.office_location
+                ORDER BY u.office_location
+            """, (str(start_date), str(end_date))).fetchall()
+        except Exception as e:
+            print(f"Error getting office totals: {str(e)}")
+            return []
+
     def verify_admin_credentials(self, username, password):
         """Verify admin login credentials"""
         try:
             print(f"Verifying credentials for username: {username}")
-            self._cursor.execute("""
-                SELECT id FROM admin_users 
+            result = self._reader().execute("""
+                SELECT id FROM admin_users
                 WHERE username = ? AND password = ?
-            """, (username, password))
-            result = self._cursor.fetchone() is not None
+            """, (username, password)).fetchone() is not None
             print(f"Credentials verification result: {result}")
             return result
         except Exception as e:
             print(f"Error verifying admin credentials: {str(e)}")
             return False
 
+    def close(self):
+        """Close writer and all per-thread read connections"""
+        with self._connections_lock:
+            connections, self._read_connections = self._read_connections, []
+        for conn in connections:
+            try:
+                conn.close()
+            except Exception:
+                # Connection belongs to another thread that may be gone
+                pass
+        with self._write_lock:
+            self.conn.close()
+
     def __del__(self):
         """Close database connection"""
         try:
             if hasattr(self, 'conn'):
-                self.conn.close()
+                self.close()
                 print("Database connection closed")
         except Exception as e:
             print(f"Error closing database: {str(e)}")
\ No newline at end of file
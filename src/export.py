@@ -0,0 +1,253 @@
+"""Streaming attendance exports
+
+Records are streamed from a database cursor straight into the output
+file, so memory use does not grow with the size of the report. Exports
+report progress through an optional callback and stop early when the
+`cancel` event is set, leaving no partial file behind.
+
+Excel is the formatted report for people. CSV and Parquet carry the raw
+columns for analytics tools, Parquet needs pyarrow.
+
+    python -m src.export attendance.parquet --start 2024-01-01 --end 2024-12-31
+"""
+import argparse
+import csv
+import logging
+import os
+import sys
+import time
+
+# Report columns: (header, record key)
+EXPORT_COLUMNS = [
+    ("ID", 'id'),
+    ("Nama", 'name'),
+    ("Tanggal", 'date'),
+    ("Jam Masuk", 'time_in'),
+    ("Jam Keluar", 'time_out'),
+    ("Mode", 'mode'),
+    ("Status", 'status'),
+    ("Lokasi", 'location'),
+]
+
+# Raw columns for CSV and Parquet: (column, Arrow type name)
+ANALYTICS_COLUMNS = [
+    ('id', 'int64'),
+    ('user_id', 'int64'),
+    ('name', 'string'),
+    ('date', 'date32'),
+    ('time_in', 'string'),
+    ('time_out', 'string'),
+    ('mode', 'string'),
+    ('status', 'string'),
+    ('location', 'string'),
+    ('lat', 'float64'),
+    ('lon', 'float64'),
+]
+
+# Rows per Parquet row group, also the number of rows held in memory
+ROW_GROUP_SIZE = 50000
+
+# Progress callbacks are called at most this often (seconds)
+PROGRESS_INTERVAL = 0.25
+
+# Cancel flag is checked every this many rows
+CHECK_EVERY = 500
+
+MAX_COLUMN_WIDTH = 60
+
+class ExportCancelled(Exception):
+    """Raised when an export is cancelled before it finished"""
+
+
+class _Progress:
+    """Throttled progress reporting and cancel checks"""
+    def __init__(self, total, progress=None, cancel=None):
+        self.total = total
+        self.progress = progress
+        self.cancel = cancel
+        self.done = 0
+        self.last_report = 0.0
+
+    def step(self):
+        self.done += 1
+        if self.done % CHECK_EVERY:
+            return
+        if self.cancel is not None and self.cancel.is_set():
+            raise ExportCancelled()
+        now = time.monotonic()
+        if self.progress and now - self.last_report >= PROGRESS_INTERVAL:
+            self.last_report = now
+            self.progress(self.done, self.total)
+
+    def finish(self):
+        if self.cancel is not None and self.cancel.is_set():
+            raise ExportCancelled()
+        if self.progress:
+            self.progress(self.done, self.total)
+
+
+def _write_atomic(path, write):
+    """Write to a temporary file and move it into place when complete"""
+    temp_path = f"{path}.part"
+    try:
+        write(temp_path)
+        os.replace(temp_path, path)
+    finally:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+
+
+def export_excel(db, path, filters=None, progress=None, cancel=None):
+    """Stream attendance records into an .xlsx file, returns rows written
+
+    `progress`, if given, is called as progress(done, total). Raises
+    ExportCancelled if `cancel` (a threading.Event) is set.
+    """
+    # Only needed for Excel exports
+    import openpyxl
+    from openpyxl.cell import WriteOnlyCell
+    from openpyxl.styles import Font
+    from openpyxl.utils import get_column_letter
+
+    filters = filters or {}
+    stats = db.attendance_export_stats(**filters)
+    tracker = _Progress(stats['count'], progress, cancel)
+
+    def write(temp_path):
+        wb = openpyxl.Workbook(write_only=True)
+        ws = wb.create_sheet("Laporan Absensi")
+
+        # Column widths must be set before the first row in write-only mode
+        for i, (header, key) in enumerate(EXPORT_COLUMNS, 1):
+            width = max(len(header), stats['widths'].get(key, 0)) + 2
+            ws.column_dimensions[get_column_letter(i)].width = min(width, MAX_COLUMN_WIDTH)
+
+        header_row = []
+        for header, _ in EXPORT_COLUMNS:
+            cell = WriteOnlyCell(ws, value=header)
+            cell.font = Font(bold=True)
+            header_row.append(cell)
+        ws.append(header_row)
+
+        records = db.iter_attendance(**filters)
+        try:
+            for record in records:
+                ws.append([record[key] for _, key in EXPORT_COLUMNS])
+                tracker.step()
+            tracker.finish()
+        except ExportCancelled:
+            # Finish the sheet's temporary file, the workbook is never saved
+            ws.close()
+            raise
+        finally:
+            records.close()
+        wb.save(temp_path)
+
+    _write_atomic(path, write)
+    logging.info(f"Exported {tracker.done} attendance records to {path}")
+    return tracker.done
+
+
+def export_csv(db, path, filters=None, progress=None, cancel=None):
+    """Stream attendance records into a CSV file, returns rows written"""
+    filters = filters or {}
+    tracker = _Progress(db.count_attendance(**filters), progress, cancel)
+    columns = [column for column, _ in ANALYTICS_COLUMNS]
+
+    def write(temp_path):
+        records = db.iter_attendance(**filters)
+        try:
+            with open(temp_path, 'w', newline='', encoding='utf-8') as f:
+                writer = csv.writer(f)
+                writer.writerow(columns)
+                for record in records:
+                    writer.writerow([record[column] for column in columns])
+                    tracker.step()
+            tracker.finish()
+        finally:
+            records.close()
+
+    _write_atomic(path, write)
+    logging.info(f"Exported {tracker.done} attendance records to {path}")
+    return tracker.done
+
+
+def export_parquet(db, path, filters=None, progress=None, cancel=None, row_group_size=ROW_GROUP_SIZE):
+    """Stream attendance records into a Parquet file, one row group per chunk"""
+    # Optional dependency, only needed for Parquet exports
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    filters = filters or {}
+    tracker = _Progress(db.count_attendance(**filters), progress, cancel)
+    schema = pa.schema([(column, getattr(pa, type_name)()) for column, type_name in ANALYTICS_COLUMNS])
+
+    def to_table(rows):
+        arrays = []
+        for field, values in zip(schema, zip(*rows)):
+            if field.type == pa.date32():
+                # Dates are stored as ISO text
+                arrays.append(pa.array(values, type=pa.string()).cast(field.type))
+            else:
+                arrays.append(pa.array(values, type=field.type))
+        return pa.Table.from_arrays(arrays, schema=schema)
+
+    def write(temp_path):
+        records = db.iter_attendance(**filters)
+        writer = pq.ParquetWriter(temp_path, schema)
+        try:
+            chunk = []
+            for record in records:
+                chunk.append(tuple(record[column] for column in schema.names))
+                tracker.step()
+                if len(chunk) >= row_group_size:
+                    writer.write_table(to_table(chunk))
+                    chunk = []
+            if chunk:
+                writer.write_table(to_table(chunk))
+            tracker.finish()
+        finally:
+            writer.close()
+            records.close()
+
+    _write_atomic(path, write)
+    logging.info(f"Exported {tracker.done} attendance records to {path}")
+    return tracker.done
+
+
+# Export format -> (writer, file extension, description)
+EXPORT_FORMATS = {
+    'xlsx': (export_excel, ".xlsx", "Excel files"),
+    'csv': (export_csv, ".csv", "CSV files"),
+    'parquet': (export_parquet, ".parquet", "Parquet files"),
+}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Export attendance records")
+    parser.add_argument('output', help="Output file, format taken from the extension")
+    parser.add_argument('--start', help="First date (YYYY-MM-DD)")
+    parser.add_argument('--end', help="Last date (YYYY-MM-DD)")
+    parser.add_argument('--user-id', type=int, action='append', help="Only this user, can be repeated")
+    args = parser.parse_args(argv)
+
+    extension = os.path.splitext(args.output)[1].lower().lstrip('.')
+    if extension not in EXPORT_FORMATS:
+        parser.error(f"Unsupported format: {extension} (use {', '.join(EXPORT_FORMATS)})")
+
+    from src.database import Database
+
+    filters = {'start_date': args.start, 'end_date': args.end, 'user_id': args.user_id}
+    filters = {key: value for key, value in filters.items() if value}
+
+    def progress(done, total):
+        print(f"Exported {done}/{total}", end='\r')
+
+    export = EXPORT_FORMATS[extension][0]
+    rows = export(Database(), args.output, filters, progress)
+    print(f"\nWrote {rows} records to {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
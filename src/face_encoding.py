@@ -0,0 +1,65 @@
+import hashlib
+import logging
+import numpy as np
+
+# Identifies the model and preprocessing that produced stored encodings.
+# Bump ENCODER_VERSION whenever either changes so old encodings are
+# re-derived instead of being compared against incompatible ones.
+ENCODER_NAME = "dlib_resnet"
+ENCODER_VERSION = "1"
+ENCODING_DIM = 128
+ENCODING_DTYPE = np.float32
+
+# Photos wider than this are downscaled before encoding
+MAX_ENCODE_WIDTH = 640
+
+def encoding_to_blob(encoding):
+    """Pack encoding into a compact float32 BLOB (512 bytes)"""
+    return np.asarray(encoding, dtype=ENCODING_DTYPE).tobytes()
+
+
+def blobs_to_matrix(blobs, dim=ENCODING_DIM):
+    """Unpack a list of BLOBs into an (N, dim) float32 matrix in one pass"""
+    if not blobs:
+        return np.empty((0, dim), dtype=ENCODING_DTYPE)
+    return np.frombuffer(b"".join(blobs), dtype=ENCODING_DTYPE).reshape(-1, dim)
+
+
+def photo_hash(path):
+    """SHA-256 of the photo file, used to detect changed photos"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 16), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def encode_face_image(image):
+    """Encode the first face in an RGB image array, returns float32 encoding or None"""
+    import face_recognition
+
+    face_encodings = face_recognition.face_encodings(image)
+    if not face_encodings:
+        return None
+    return np.asarray(face_encodings[0], dtype=ENCODING_DTYPE)
+
+
+def encode_photo(path):
+    """Encode the first face in a photo, returns float32 encoding or None"""
+    # Heavy imports, only needed when actually encoding
+    import cv2
+    import face_recognition
+
+    try:
+        # Load and resize image for faster processing
+        face_image = face_recognition.load_image_file(path)
+        if face_image.shape[1] > MAX_ENCODE_WIDTH:
+            scale = MAX_ENCODE_WIDTH / face_image.shape[1]
+            width = int(face_image.shape[1] * scale)
+            height = int(face_image.shape[0] * scale)
+            face_image = cv2.resize(face_image, (width, height))
+
+        return encode_face_image(face_image)
+    except Exception as e:
+        logging.error(f"Error encoding photo {path}: {str(e)}")
+        return None
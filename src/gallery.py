@@ -0,0 +1,100 @@
+"""In-memory face gallery for the kiosk
+
+Holds every known encoding in one (N, 128) float32 matrix, so a match
+is a single vectorized distance computation. The gallery follows the
+gallery_changes log in the database: refresh() reloads only the users
+that changed since the last version it saw, so enrollments made in the
+admin panel or another process show up within one poll.
+"""
+import numpy as np
+
+from src.face_encoding import ENCODING_DIM, ENCODING_DTYPE
+
+# Same threshold face_recognition.compare_faces uses by default
+MATCH_TOLERANCE = 0.6
+
+class FaceGallery:
+    def __init__(self):
+        self.user_ids = []
+        self.names = []
+        self.matrix = np.empty((0, ENCODING_DIM), dtype=ENCODING_DTYPE)
+        self.version = 0
+
+    def __len__(self):
+        return len(self.user_ids)
+
+    def load(self, db):
+        """Load the whole gallery"""
+        # Read the version first so changes made during the load are replayed
+        version = db.gallery_version()
+        self.user_ids, self.names, self.matrix = db.load_face_encodings()
+        self.version = version
+        return len(self.user_ids)
+
+    def refresh(self, db):
+        """Apply changes made since the last load or refresh
+
+        Returns the number of users that changed.
+        """
+        if db.gallery_version() == self.version:
+            return 0
+
+        version, changed = db.get_gallery_changes(self.version)
+        if not changed:
+            self.version = version
+            return 0
+
+        user_ids, names, matrix = db.load_face_encodings(user_ids=changed)
+        self.remove(changed)
+        self.upsert(user_ids, names, matrix)
+        self.version = version
+        print(f"Gallery updated: {len(changed)} users changed, {len(self)} faces")
+        return len(changed)
+
+    def upsert(self, user_ids, names, encodings):
+        """Add or replace entries"""
+        if not len(user_ids):
+            return
+        self.remove(user_ids)
+        self.user_ids = self.user_ids + list(user_ids)
+        self.names = self.names + list(names)
+        self.matrix = np.vstack([self.matrix, np.asarray(encodings, dtype=ENCODING_DTYPE)])
+
+    def remove(self, user_ids):
+        """Drop entries of the given users, if present"""
+        drop = set(user_ids)
+        keep = [i for i, user_id in enumerate(self.user_ids) if user_id not in drop]
+        if len(keep) == len(self.user_ids):
+            return
+        self.user_ids = [self.user_ids[i] for i in keep]
+        self.names = [self.names[i] for i in keep]
+        self.matrix = self.matrix[keep]
+
+    def match(self, encoding, tolerance=MATCH_TOLERANCE):
+        """Closest known face within tolerance, returns (user_id, name, distance) or None"""
+        if not len(self.user_ids):
+            return None
+        distances = np.linalg.norm(self.matrix - np.asarray(encoding, dtype=ENCODING_DTYPE), axis=1)
+        best = int(np.argmin(distances))
+        if distances[best] > tolerance:
+            return None
+        return self.user_ids[best], self.names[best], float(distances[best])
+
+    def match_many(self, encodings, tolerance=MATCH_TOLERANCE):
+        """match() for a batch of encodings in one matrix product
+
+        Returns a list with (user_id, name, distance) or None per encoding.
+        """
+        encodings = np.asarray(encodings, dtype=ENCODING_DTYPE).reshape(-1, ENCODING_DIM)
+        if not len(self.user_ids) or not len(encodings):
+            return [None] * len(encodings)
+        # |a - b|^2 = |a|^2 - 2 a.b + |b|^2 for all pairs at once
+        squared = (np.einsum('ij,ij->i', encodings, encodings)[:, None]
+                   - 2 * encodings @ self.matrix.T
+                   + np.einsum('ij,ij->i', self.matrix, self.matrix)[None, :])
+        best = np.argmin(squared, axis=1)
+        distances = np.sqrt(np.maximum(squared[np.arange(len(encodings)), best], 0))
+        return [
+            (self.user_ids[b], self.names[b], float(d)) if d <= tolerance else None
+            for b, d in zip(best.tolist(), distances.tolist())
+        ]
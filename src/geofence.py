@@ -0,0 +1,146 @@
+"""In-memory geofences of registered sites
+
+Sites (offices and cities) live in the sites table with a center, a
+radius or a polygon, and a precomputed bounding box. Geofence loads them
+once into NumPy arrays: a check-in is first tested against every bounding
+box in one array comparison, and only the sites whose box contains the
+point get the exact radius or polygon test.
+"""
+import json
+import math
+import time
+
+import numpy as np
+
+from src.geolocation import METERS_PER_DEGREE, haversine
+
+# Default geofence radius of new sites, in meters
+OFFICE_RADIUS_M = 1000.0
+CITY_RADIUS_M = 30000.0
+
+# Kiosks reload the sites after this many seconds
+SITE_RELOAD_SECONDS = 300
+
+SITE_KINDS = ('office', 'city')
+
+def site_location(lat, lon):
+    """Coordinate string stored in users rows, "lat,lon\""""
+    return f"{float(lat)},{float(lon)}"
+
+
+def parse_polygon(polygon):
+    """Polygon from JSON text or a sequence, as a list of (lat, lon)"""
+    if polygon is None:
+        return None
+    if isinstance(polygon, str):
+        polygon = json.loads(polygon)
+    points = [(float(lat), float(lon)) for lat, lon in polygon]
+    if len(points) < 3:
+        raise ValueError("A polygon needs at least 3 points")
+    return points
+
+
+def bounding_box(lat, lon, radius_m=None, polygon=None):
+    """(min_lat, max_lat, min_lon, max_lon) around a radius or polygon"""
+    points = parse_polygon(polygon)
+    if points:
+        lats, lons = zip(*points)
+        return min(lats), max(lats), min(lons), max(lons)
+    if radius_m is None:
+        raise ValueError("A site needs a radius or a polygon")
+    dlat = radius_m / METERS_PER_DEGREE
+    # Longitude degrees shrink away from the equator
+    cos_lat = max(math.cos(math.radians(min(abs(lat) + dlat, 90.0))), 1e-6)
+    dlon = min(radius_m / (METERS_PER_DEGREE * cos_lat), 180.0)
+    return lat - dlat, lat + dlat, lon - dlon, lon + dlon
+
+
+def point_in_polygon(lat, lon, polygon):
+    """Ray casting test, points are (lat, lon)"""
+    inside = False
+    j = len(polygon) - 1
+    for i in range(len(polygon)):
+        lat_i, lon_i = polygon[i]
+        lat_j, lon_j = polygon[j]
+        if (lat_i > lat) != (lat_j > lat):
+            crossing = lon_i + (lat - lat_i) * (lon_j - lon_i) / (lat_j - lat_i)
+            if lon < crossing:
+                inside = not inside
+        j = i
+    return inside
+
+
+class Geofence:
+    def __init__(self):
+        self.sites = {}  # site ID -> site dict
+        self.ids = np.empty(0, dtype=np.int64)
+        self.boxes = np.empty((0, 4))
+        self.loaded_at = None
+
+    def __len__(self):
+        return len(self.sites)
+
+    def load(self, db):
+        """Load all sites from the database"""
+        self.sites = {}
+        for row in db.get_sites():
+            site = dict(row)
+            site['polygon'] = parse_polygon(site['polygon'])
+            site['location'] = site_location(site['lat'], site['lon'])
+            self.sites[site['id']] = site
+        self.ids = np.array(list(self.sites), dtype=np.int64)
+        self.boxes = np.array(
+            [[s['min_lat'], s['max_lat'], s['min_lon'], s['max_lon']] for s in self.sites.values()],
+            dtype=float
+        ).reshape(-1, 4)
+        self.loaded_at = time.monotonic()
+        print(f"Loaded {len(self.sites)} sites")
+        return len(self.sites)
+
+    def refresh(self, db, max_age=SITE_RELOAD_SECONDS):
+        """Reload when the sites were loaded more than max_age seconds ago"""
+        if self.loaded_at is None or time.monotonic() - self.loaded_at > max_age:
+            self.load(db)
+
+    def contains(self, site_id, lat, lon):
+        """Whether a point is inside a site, None for unknown sites"""
+        site = self.sites.get(site_id)
+        if site is None:
+            return None
+        if not (site['min_lat'] <= lat <= site['max_lat'] and site['min_lon'] <= lon <= site['max_lon']):
+            return False
+        return self._exact(site, lat, lon)
+
+    def containing(self, lat, lon, kind=None):
+        """Sites containing a point, closest center first"""
+        inside = ((self.boxes[:, 0] <= lat) & (lat <= self.boxes[:, 1]) &
+                  (self.boxes[:, 2] <= lon) & (lon <= self.boxes[:, 3]))
+        found = [
+            self.sites[site_id] for site_id in self.ids[inside].tolist()
+            if (kind is None or self.sites[site_id]['kind'] == kind)
+            and self._exact(self.sites[site_id], lat, lon)
+        ]
+        return sorted(found, key=lambda site: float(haversine(lat, lon, site['lat'], site['lon'])))
+
+    def _exact(self, site, lat, lon):
+        if site['polygon']:
+            return point_in_polygon(lat, lon, site['polygon'])
+        return float(haversine(lat, lon, site['lat'], site['lon'])) <= site['radius_m']
+
+    def by_name(self, kind):
+        """Sites of one kind keyed by name"""
+        return {site['name']: site for site in self.sites.values() if site['kind'] == kind}
+
+    def names(self, kind):
+        """Names of the sites of one kind, sorted"""
+        return sorted(self.by_name(kind))
+
+    def find(self, site_id=None, location=None, kind=None):
+        """Site by ID, or by its coordinate string for users not linked to a site"""
+        if site_id is not None and site_id in self.sites:
+            return self.sites[site_id]
+        if location:
+            for site in self.sites.values():
+                if site['location'] == location and (kind is None or site['kind'] == kind):
+                    return site
+        return None
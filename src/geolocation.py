@@ -1,7 +1,8 @@
-import requests
 import math
 import logging
-from typing import Tuple, Optional
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
 
 # Setup logging
 logging.basicConfig(
@@ -10,9 +11,18 @@ logging.basicConfig(
     format='%(asctime)s - %(levelname)s - %(message)s'
 )
 
+# Earth radius in meters
+EARTH_RADIUS_M = 6371000.0
+
+# Meters per degree of latitude
+METERS_PER_DEGREE = math.pi * EARTH_RADIUS_M / 180
+
+# Grid cell size of SiteIndex, in degrees (about 5.5 km)
+GRID_CELL_DEGREES = 0.05
+
 def get_current_location() -> str:
     """
-    Get current location using IP-based geolocation
+    Default kiosk location, used by the static location provider
     Returns: str - "latitude,longitude"
     """
     try:
@@ -25,49 +35,155 @@ def get_current_location() -> str:
         return "-5.1486,119.4319"
 
 def parse_coordinates(location: str) -> Tuple[float, float]:
-    """Parse location string into coordinates"""
+    """Parse "lat,lon" into coordinates, raises ValueError if malformed or out of range"""
     try:
         lat, lon = map(float, location.split(','))
-        return lat, lon
-    except Exception as e:
-        logging.error(f"Error parsing coordinates: {str(e)}")
-        # Return default coordinates
-        return (-5.1486, 119.4319)
+    except (AttributeError, ValueError):
+        raise ValueError(f"Invalid coordinates: {location!r}")
+    if not (-90.0 <= lat <= 90.0 and -180.0 <= lon <= 180.0):
+        raise ValueError(f"Coordinates out of range: {location!r}")
+    return lat, lon
 
-def calculate_distance(location1: str, location2: str) -> float:
-    """Calculate distance between two locations"""
-    try:
-        lat1, lon1 = parse_coordinates(location1)
-        lat2, lon2 = parse_coordinates(location2)
-        
-        # Convert to radians
-        lat1, lon1, lat2, lon2 = map(math.radians, [lat1, lon1, lat2, lon2])
-        
-        # Haversine formula
-        dlat = lat2 - lat1
-        dlon = lon2 - lon1
-        a = (math.sin(dlat/2)**2 + 
-             math.cos(lat1) * math.cos(lat2) * math.sin(dlon/2)**2)
-        c = 2 * math.asin(math.sqrt(a))
-        
-        # Earth radius in meters
-        r = 6371000
-        distance = c * r
-        
-        logging.info(f"Distance calculated: {distance:.2f}m")
-        return distance
-        
-    except Exception as e:
-        logging.error(f"Error calculating distance: {str(e)}")
-        return 0.0
+def haversine(lat1, lon1, lat2, lon2) -> np.ndarray:
+    """Great-circle distance in meters, NumPy broadcasting applies
 
-def is_within_radius(current: str, target: str, radius: float = 1000.0) -> bool:
-    """Check if current location is within radius of target"""
-    try:
-        # Temporary: Always return True for testing
-        logging.info(f"Location check bypassed for testing")
-        return True
-        
-    except Exception as e:
-        logging.error(f"Error checking radius: {str(e)}")
-        return True  # Allow on error for testing
\ No newline at end of file
+    Pass one point and arrays of sites for distances from the point to
+    every site, or equal-length arrays for pairwise distances.
+    """
+    lat1, lon1, lat2, lon2 = (np.radians(np.asarray(v, dtype=float)) for v in (lat1, lon1, lat2, lon2))
+    a = (np.sin((lat2 - lat1) / 2) ** 2 +
+         np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2)
+    return 2 * EARTH_RADIUS_M * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+
+def classify_modes(lats, lons, home_lats, home_lons, office_lats, office_lons) -> np.ndarray:
+    """WFH or WFO for each check-in, whichever registered place is closer
+
+    All arguments are equal-length arrays (or scalars), the whole batch
+    is classified in one array operation. Ties count as WFH, like the
+    kiosk always did.
+    """
+    home = haversine(lats, lons, home_lats, home_lons)
+    office = haversine(lats, lons, office_lats, office_lons)
+    return np.where(home <= office, "WFH", "WFO")
+
+
+class SiteIndex:
+    """Nearest-site lookup over a uniform latitude/longitude grid
+
+    Sites are bucketed into GRID_CELL_DEGREES cells. A query searches
+    rings of cells around its own cell and stops once no unsearched cell
+    can hold a closer site, so it only measures nearby sites. When the
+    sites are too sparse for that to pay off it measures all of them.
+    Longitudes do not wrap at ±180°, no site of this system is near it.
+    """
+    def __init__(self, names: Sequence[str], lats: Sequence[float], lons: Sequence[float],
+                 cell_degrees: float = GRID_CELL_DEGREES):
+        self.cell_degrees = cell_degrees
+        self.names: List[str] = list(names)
+        self.lats = np.asarray(lats, dtype=float)
+        self.lons = np.asarray(lons, dtype=float)
+        valid = ~(np.isnan(self.lats) | np.isnan(self.lons))
+        if not valid.all():
+            logging.warning(f"Skipping {int((~valid).sum())} sites with invalid coordinates")
+            self.names = [name for name, ok in zip(self.names, valid) if ok]
+            self.lats, self.lons = self.lats[valid], self.lons[valid]
+
+        self.cells: Dict[Tuple[int, int], List[int]] = {}
+        for i, cell in enumerate(zip(*self._cell(self.lats, self.lons))):
+            self.cells.setdefault(cell, []).append(i)
+        if self.cells:
+            rows, cols = zip(*self.cells)
+            self._extent = (min(rows), max(rows), min(cols), max(cols))
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    def _cell(self, lat, lon):
+        return (np.floor(np.asarray(lat) / self.cell_degrees).astype(int),
+                np.floor(np.asarray(lon) / self.cell_degrees).astype(int))
+
+    def _ring(self, row: int, col: int, r: int) -> List[int]:
+        """Sites in the cells exactly r cells away from (row, col)"""
+        if r == 0:
+            return self.cells.get((row, col), [])
+        found = []
+        for dr in range(-r, r + 1):
+            step = 1 if abs(dr) == r else 2 * r
+            for dc in range(-r, r + 1, step):
+                found.extend(self.cells.get((row + dr, col + dc), []))
+        return found
+
+    def nearest(self, lat: float, lon: float, k: int = 1) -> List[Tuple[str, float]]:
+        """The k closest sites to a point, as (name, meters), closest first"""
+        if not self.names:
+            return []
+        k = min(k, len(self.names))
+        row, col = (int(v) for v in self._cell(lat, lon))
+        min_row, max_row, min_col, max_col = self._extent
+        # Rings past this one contain no sites
+        last_ring = max(abs(row - min_row), abs(row - max_row), abs(col - min_col), abs(col - max_col))
+
+        candidates: List[int] = []
+        for r in range(last_ring + 1):
+            if (2 * r + 1) ** 2 > 4 * len(self.cells):
+                # Rings cost more than measuring every site
+                candidates = list(range(len(self.names)))
+                break
+            candidates.extend(self._ring(row, col, r))
+            if len(candidates) < k:
+                continue
+            distances = haversine(lat, lon, self.lats[candidates], self.lons[candidates])
+            kth = np.partition(distances, k - 1)[k - 1]
+            # Closest any site in an unsearched ring can be, longitude
+            # degrees shrink toward the poles
+            widest = min(abs(lat) + (r + 1) * self.cell_degrees, 90.0)
+            reach = r * self.cell_degrees * METERS_PER_DEGREE * math.cos(math.radians(widest))
+            if kth <= reach:
+                break
+
+        distances = haversine(lat, lon, self.lats[candidates], self.lons[candidates])
+        order = np.argsort(distances)[:k]
+        return [(self.names[candidates[i]], float(distances[i])) for i in order]
+
+    def within(self, lat: float, lon: float, radius_m: float) -> List[Tuple[str, float]]:
+        """Sites within radius_m of a point, closest first"""
+        if not self.names:
+            return []
+        # Cells that can hold a site within the radius
+        lat_cells = int(math.ceil(radius_m / METERS_PER_DEGREE / self.cell_degrees))
+        widest = min(abs(lat) + radius_m / METERS_PER_DEGREE, 89.9)
+        lon_cells = int(math.ceil(radius_m / (METERS_PER_DEGREE * math.cos(math.radians(widest))) / self.cell_degrees))
+        row, col = (int(v) for v in self._cell(lat, lon))
+        candidates = [
+            i
+            for dr in range(-lat_cells, lat_cells + 1)
+            for dc in range(-lon_cells, lon_cells + 1)
+            for i in self.cells.get((row + dr, col + dc), [])
+        ]
+        distances = haversine(lat, lon, self.lats[candidates], self.lons[candidates])
+        order = np.argsort(distances)
+        return [(self.names[candidates[i]], float(distances[i])) for i in order if distances[i] <= radius_m]
+
+    def nearest_many(self, lats: Sequence[float], lons: Sequence[float], chunk_size: int = 4096) -> Tuple[List[Optional[str]], np.ndarray]:
+        """Closest site to each of many points, returns (names, meters)
+
+        Points are processed in chunks as one (points x sites) distance
+        matrix each. Points with NaN coordinates get None and NaN.
+        """
+        lats = np.asarray(lats, dtype=float)
+        lons = np.asarray(lons, dtype=float)
+        names: List[Optional[str]] = [None] * len(lats)
+        meters = np.full(len(lats), np.nan)
+        if not self.names:
+            return names, meters
+        for start in range(0, len(lats), chunk_size):
+            lat = lats[start:start + chunk_size, None]
+            lon = lons[start:start + chunk_size, None]
+            distances = haversine(lat, lon, self.lats[None, :], self.lons[None, :])
+            valid = ~np.isnan(distances).any(axis=1)
+            best = np.argmin(np.where(np.isnan(distances), np.inf, distances), axis=1)
+            for offset in np.flatnonzero(valid):
+                names[start + offset] = self.names[best[offset]]
+                meters[start + offset] = distances[offset, best[offset]]
+        return names, meters
@@ -0,0 +1,309 @@
+import cv2
+import numpy as np
+import logging
+import math
+from collections import deque
+
+class LivenessCue:
+    """Base class for a single liveness cue.
+
+    A cue receives the current frame, the facial landmarks of the first
+    detected face and a monotonic timestamp, and keeps its own evidence
+    between frames. Evidence is kept over wall-clock windows so the cue
+    behaves the same regardless of frame rate. `cost` tells the scheduler
+    whether the cue is cheap enough to run every frame or should only run
+    when there is budget left.
+    """
+    name = "cue"
+    label = "Cue"
+    cost = "cheap"
+    weight = 1.0
+    required = False
+
+    def __init__(self):
+        self.score = 0.0
+        self.passed = False
+        self.evaluated = False
+
+    def update(self, frame, landmarks, now):
+        """Update cue with a new frame at time `now`, returns score between 0 and 1"""
+        raise NotImplementedError
+
+    def reset(self):
+        """Forget all collected evidence"""
+        self.score = 0.0
+        self.passed = False
+        self.evaluated = False
+
+    def status(self):
+        """Short status symbol for the liveness message"""
+        if self.passed:
+            return "✓"
+        if not self.evaluated:
+            return "…"
+        return "✗"
+
+
+class MovementCue(LivenessCue):
+    """Natural head movement measured on the nose bridge"""
+    name = "movement"
+    label = "Movement"
+    cost = "cheap"
+    weight = 0.5
+    required = True
+
+    def __init__(self, movement_threshold=0.15, required_movements=2,
+                 window_seconds=3.0, sample_interval=0.2, max_gap=1.0):
+        super().__init__()
+        self.movement_threshold = movement_threshold  # Face widths per sample_interval
+        self.required_movements = required_movements  # Only need 2 significant movements
+        self.window_seconds = window_seconds  # Movements must happen within this window
+        self.sample_interval = sample_interval  # Minimum time between compared landmarks
+        self.max_gap = max_gap  # Longer gaps (face lost, stalled camera) restart sampling
+        self.prev_landmarks = None
+        self.prev_time = None
+        self.movement_history = deque()  # (timestamp, normalized movement)
+
+    def calculate_movement(self, landmarks1, landmarks2):
+        """Calculate movement between two sets of landmarks"""
+        if landmarks1 is None or landmarks2 is None:
+            return 0
+
+        try:
+            # Calculate movement using nose point for simplicity
+            nose_point1 = np.mean(landmarks1['nose_bridge'], axis=0)
+            nose_point2 = np.mean(landmarks2['nose_bridge'], axis=0)
+
+            # Calculate Euclidean distance
+            movement = np.linalg.norm(nose_point1 - nose_point2)
+
+            # Normalize by face size
+            face_size = np.linalg.norm(
+                np.mean(landmarks1['left_eye'], axis=0) -
+                np.mean(landmarks1['right_eye'], axis=0)
+            )
+
+            if face_size > 0:
+                normalized_movement = movement / face_size
+                return normalized_movement
+            return 0
+
+        except Exception as e:
+            logging.error(f"Movement calculation error: {str(e)}")
+            return 0
+
+    def update(self, frame, landmarks, now):
+        """Check for natural head movement within the time window"""
+        if landmarks is None:
+            return self.score
+
+        if self.prev_landmarks is None or now - self.prev_time > self.max_gap:
+            self.prev_landmarks = landmarks
+            self.prev_time = now
+            return self.score
+
+        elapsed = now - self.prev_time
+        if elapsed < self.sample_interval:
+            # Too close to the reference sample, wait for more motion
+            return self.score
+
+        # Scale to movement per sample_interval so 3 fps and 30 fps compare
+        movement = self.calculate_movement(self.prev_landmarks, landmarks)
+        movement *= self.sample_interval / elapsed
+        self.movement_history.append((now, movement))
+
+        # Keep only samples inside the window
+        while self.movement_history and now - self.movement_history[0][0] > self.window_seconds:
+            self.movement_history.popleft()
+
+        # Check for significant movements
+        significant_movements = sum(
+            1 for _, m in self.movement_history
+            if m > self.movement_threshold
+        )
+        self.score = max(self.score, min(1.0, significant_movements / self.required_movements))
+        if significant_movements >= self.required_movements:
+            self.passed = True
+        self.evaluated = True
+
+        self.prev_landmarks = landmarks
+        self.prev_time = now
+        return self.score
+
+    def reset(self):
+        super().reset()
+        self.prev_landmarks = None
+        self.prev_time = None
+        self.movement_history = deque()
+
+
+class BlinkCue(LivenessCue):
+    """Eye blink detection using the eye aspect ratio (EAR)"""
+    name = "blink"
+    label = "Blink"
+    cost = "cheap"
+    weight = 0.25
+
+    def __init__(self, closed_threshold=0.21, open_threshold=0.25, required_blinks=1,
+                 window_seconds=5.0, max_closed_seconds=1.0):
+        super().__init__()
+        self.closed_threshold = closed_threshold
+        self.open_threshold = open_threshold  # Hysteresis so noise doesn't count as blinks
+        self.required_blinks = required_blinks
+        self.window_seconds = window_seconds
+        self.max_closed_seconds = max_closed_seconds  # Longer closures are not blinks
+        self.closed_since = None
+        self.blink_times = deque()
+        self.last_ear = None
+
+    @staticmethod
+    def eye_aspect_ratio(eye):
+        """EAR = (|p2-p6| + |p3-p5|) / (2 * |p1-p4|) for the 6 eye landmarks"""
+        eye = np.asarray(eye, dtype=np.float64)
+        if eye.shape[0] != 6:
+            return None
+        vertical = np.linalg.norm(eye[1] - eye[5]) + np.linalg.norm(eye[2] - eye[4])
+        horizontal = np.linalg.norm(eye[0] - eye[3])
+        if horizontal <= 0:
+            return None
+        return vertical / (2.0 * horizontal)
+
+    def update(self, frame, landmarks, now):
+        """Count closed -> open transitions of both eyes within the window"""
+        if landmarks is None:
+            return self.score
+
+        try:
+            left = self.eye_aspect_ratio(landmarks['left_eye'])
+            right = self.eye_aspect_ratio(landmarks['right_eye'])
+        except KeyError:
+            return self.score
+        if left is None or right is None:
+            return self.score
+
+        ear = (left + right) / 2.0
+        self.last_ear = ear
+        self.evaluated = True
+
+        if ear < self.closed_threshold:
+            if self.closed_since is None:
+                self.closed_since = now
+        elif self.closed_since is not None and ear > self.open_threshold:
+            if now - self.closed_since <= self.max_closed_seconds:
+                self.blink_times.append(now)
+            self.closed_since = None
+
+        while self.blink_times and now - self.blink_times[0] > self.window_seconds:
+            self.blink_times.popleft()
+
+        self.score = max(self.score, min(1.0, len(self.blink_times) / self.required_blinks))
+        if len(self.blink_times) >= self.required_blinks:
+            self.passed = True
+        return self.score
+
+    def reset(self):
+        super().reset()
+        self.closed_since = None
+        self.blink_times = deque()
+        self.last_ear = None
+
+
+class TextureCue(LivenessCue):
+    """Texture and frequency analysis of the face crop
+
+    Printed photos and screens re-captured by the camera lose fine skin
+    detail (low Laplacian variance), and screens add moiré patterns that
+    show up as excess energy in the high frequencies of the spectrum.
+    """
+    name = "texture"
+    label = "Texture"
+    cost = "expensive"
+    weight = 0.25
+
+    def __init__(self, crop_size=96, min_sharpness=30.0, good_sharpness=120.0,
+                 max_high_freq_ratio=0.35, pass_threshold=0.6, min_samples=3,
+                 smoothing_seconds=0.5):
+        super().__init__()
+        self.crop_size = crop_size
+        self.min_sharpness = min_sharpness
+        self.good_sharpness = good_sharpness
+        self.max_high_freq_ratio = max_high_freq_ratio
+        self.pass_threshold = pass_threshold
+        self.min_samples = min_samples
+        self.smoothing_seconds = smoothing_seconds  # Time constant of the score average
+        self.samples = 0
+        self.last_sample_time = None
+
+        # Precompute high frequency mask for the fixed crop size
+        center = crop_size / 2.0
+        yy, xx = np.mgrid[:crop_size, :crop_size]
+        radius = np.sqrt((yy - center) ** 2 + (xx - center) ** 2)
+        self.high_freq_mask = radius > (crop_size / 4.0)
+
+    def face_crop(self, frame, landmarks):
+        """Crop face bounding box from all landmark points"""
+        points = np.concatenate([np.asarray(p) for p in landmarks.values()])
+        left, top = np.maximum(points.min(axis=0).astype(int), 0)
+        right, bottom = points.max(axis=0).astype(int)
+        crop = frame[top:bottom, left:right]
+        if crop.size == 0:
+            return None
+        return crop
+
+    def analyze(self, crop):
+        """Return (sharpness, high frequency ratio) for a face crop"""
+        gray = cv2.cvtColor(crop, cv2.COLOR_BGR2GRAY) if crop.ndim == 3 else crop
+        gray = cv2.resize(gray, (self.crop_size, self.crop_size))
+        sharpness = cv2.Laplacian(gray, cv2.CV_64F).var()
+
+        spectrum = np.abs(np.fft.fftshift(np.fft.fft2(gray.astype(np.float32))))
+        total = spectrum.sum()
+        high_freq_ratio = spectrum[self.high_freq_mask].sum() / total if total > 0 else 0.0
+        return sharpness, high_freq_ratio
+
+    def update(self, frame, landmarks, now):
+        """Score face crop, smoothed over time"""
+        if frame is None or landmarks is None:
+            return self.score
+
+        try:
+            crop = self.face_crop(frame, landmarks)
+            if crop is None:
+                return self.score
+            sharpness, high_freq_ratio = self.analyze(crop)
+        except Exception as e:
+            logging.error(f"Texture analysis error: {str(e)}")
+            return self.score
+
+        frame_score = np.clip(
+            (sharpness - self.min_sharpness) / (self.good_sharpness - self.min_sharpness),
+            0.0, 1.0
+        )
+        if high_freq_ratio > self.max_high_freq_ratio:
+            frame_score = 0.0  # Moiré / screen pattern
+
+        # Time based exponential moving average, first sample taken as is
+        if self.last_sample_time is None:
+            alpha = 1.0
+        else:
+            alpha = 1.0 - math.exp(-(now - self.last_sample_time) / self.smoothing_seconds)
+        self.samples += 1
+        self.last_sample_time = now
+        self.score = (1 - alpha) * self.score + alpha * float(frame_score)
+        self.evaluated = True
+        self.passed = self.samples >= self.min_samples and self.score >= self.pass_threshold
+        return self.score
+
+    def reset(self):
+        super().reset()
+        self.samples = 0
+        self.last_sample_time = None
+
+
+def default_cues(movement_threshold=0.15, required_movements=2, window_seconds=3.0):
+    """Default cue set used by AntiSpoofingDetector"""
+    return [
+        MovementCue(movement_threshold, required_movements, window_seconds),
+        BlinkCue(window_seconds=max(window_seconds, 5.0)),
+        TextureCue(),
+    ]
@@ -0,0 +1,321 @@
+"""Record and replay liveness sessions for offline tuning and benchmarks
+
+Recordings are JSON lines files: a header line with the label ("real" or
+"spoof") followed by one line per frame with its timestamp, the
+landmarks of the first face (or null) and how long detecting them took.
+With --frames the raw clip is also saved next to it so the expensive
+texture cue can be replayed.
+
+    python -m src.liveness_replay record --label real --out recordings
+    python -m src.liveness_replay replay recordings --movement-threshold 0.2
+    python -m src.liveness_replay sweep recordings
+"""
+import argparse
+import itertools
+import json
+import logging
+import os
+import sys
+import time
+from datetime import datetime
+
+import numpy as np
+
+from src.anti_spoofing import AntiSpoofingDetector
+
+LABELS = ("real", "spoof")
+
+class LivenessRecorder:
+    """Collect per-frame landmark streams (and optionally raw frames)"""
+    def __init__(self, output_dir, label, save_frames=False, fps=15):
+        if label not in LABELS:
+            raise ValueError(f"Label must be one of {LABELS}")
+        os.makedirs(output_dir, exist_ok=True)
+
+        stamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+        self.path = os.path.join(output_dir, f"{label}_{stamp}.jsonl")
+        self.clip_path = os.path.join(output_dir, f"{label}_{stamp}.avi") if save_frames else None
+        self.label = label
+        self.fps = fps
+        self.start_time = None
+        self.frames = []
+        self._writer = None
+
+    def record(self, frame, landmarks, timestamp=None, landmark_ms=None):
+        """Add one frame, timestamp defaults to now"""
+        if timestamp is None:
+            timestamp = time.monotonic()
+        if self.start_time is None:
+            self.start_time = timestamp
+
+        entry = {
+            't': round(timestamp - self.start_time, 4),
+            'landmarks': landmarks
+        }
+        if landmark_ms is not None:
+            entry['landmark_ms'] = round(landmark_ms, 2)
+        self.frames.append(entry)
+
+        if self.clip_path and frame is not None:
+            if self._writer is None:
+                import cv2
+                height, width = frame.shape[:2]
+                self._writer = cv2.VideoWriter(
+                    self.clip_path,
+                    cv2.VideoWriter_fourcc(*'MJPG'),
+                    self.fps,
+                    (width, height)
+                )
+            self._writer.write(frame)
+
+    def save(self):
+        """Write recording to disk, returns path"""
+        if self._writer is not None:
+            self._writer.release()
+
+        header = {
+            'label': self.label,
+            'created': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+            'frames': len(self.frames),
+            'clip': os.path.basename(self.clip_path) if self.clip_path else None
+        }
+        with open(self.path, 'w') as f:
+            f.write(json.dumps(header) + "\n")
+            for entry in self.frames:
+                f.write(json.dumps(entry) + "\n")
+        print(f"Saved {len(self.frames)} frames to {self.path}")
+        return self.path
+
+
+def load_recording(path):
+    """Load a recording, returns dict with label, frames and clip path"""
+    with open(path) as f:
+        header = json.loads(f.readline())
+        frames = [json.loads(line) for line in f if line.strip()]
+
+    clip = header.get('clip')
+    if clip:
+        clip = os.path.join(os.path.dirname(path), clip)
+        if not os.path.exists(clip):
+            logging.warning(f"Clip {clip} missing, replaying landmarks only")
+            clip = None
+
+    return {
+        'path': path,
+        'label': header['label'],
+        'frames': frames,
+        'clip': clip
+    }
+
+
+def find_recordings(paths):
+    """Expand files and directories into a sorted list of .jsonl recordings"""
+    found = []
+    for path in paths:
+        if os.path.isdir(path):
+            found.extend(
+                os.path.join(path, name) for name in os.listdir(path)
+                if name.endswith('.jsonl')
+            )
+        else:
+            found.append(path)
+    return sorted(found)
+
+
+def _clip_frames(clip_path):
+    import cv2
+    capture = cv2.VideoCapture(clip_path)
+    try:
+        while True:
+            ret, frame = capture.read()
+            if not ret:
+                break
+            yield frame
+    finally:
+        capture.release()
+
+
+def replay(recording, stop_on_pass=True, **detector_kwargs):
+    """Push a recording through a fresh detector as fast as possible
+
+    Recorded timestamps drive the detector's time windows, and frames
+    closer than the detector's check_interval are dropped as the kiosk
+    drops them. As in check_liveness, the cue budget starts after
+    landmark detection. The reported per-frame cost adds the recorded
+    detection time (recordings made before it was recorded count it as
+    zero). Cue cost is measured on this machine, so budget skips can
+    differ from the kiosk if it is much faster or slower.
+    """
+    detector = AntiSpoofingDetector(**detector_kwargs)
+    frames = _clip_frames(recording['clip']) if recording['clip'] else itertools.repeat(None)
+
+    time_to_pass = None
+    frame_ms = []
+    last_check = None
+    for entry, frame in zip(recording['frames'], frames):
+        if last_check is not None and entry['t'] - last_check < detector.check_interval:
+            continue
+        last_check = entry['t']
+
+        start = time.perf_counter()
+        is_live, _ = detector.evaluate(frame, entry['landmarks'], now=entry['t'], frame_start=start)
+        frame_ms.append(entry.get('landmark_ms', 0.0) + (time.perf_counter() - start) * 1000)
+
+        if is_live and time_to_pass is None:
+            time_to_pass = entry['t']
+            if stop_on_pass:
+                break
+
+    return {
+        'path': recording['path'],
+        'label': recording['label'],
+        'passed': time_to_pass is not None,
+        'time_to_pass': time_to_pass,
+        'frame_ms': frame_ms
+    }
+
+
+def benchmark(recordings, **detector_kwargs):
+    """Replay all recordings and summarize accuracy, time-to-pass and cost"""
+    results = [replay(recording, **detector_kwargs) for recording in recordings]
+
+    correct = sum(
+        1 for r in results
+        if r['passed'] == (r['label'] == 'real')
+    )
+    real = [r for r in results if r['label'] == 'real']
+    spoof = [r for r in results if r['label'] == 'spoof']
+    pass_times = [r['time_to_pass'] for r in real if r['passed']]
+    frame_ms = np.array([ms for r in results for ms in r['frame_ms']] or [0.0])
+
+    return {
+        'recordings': len(results),
+        'accuracy': correct / len(results) if results else 0.0,
+        'false_reject_rate': sum(1 for r in real if not r['passed']) / len(real) if real else 0.0,
+        'false_accept_rate': sum(1 for r in spoof if r['passed']) / len(spoof) if spoof else 0.0,
+        'mean_time_to_pass': float(np.mean(pass_times)) if pass_times else None,
+        'frame_ms_p50': float(np.percentile(frame_ms, 50)),
+        'frame_ms_p95': float(np.percentile(frame_ms, 95)),
+        'results': results
+    }
+
+
+def print_summary(summary, params=None):
+    if params:
+        print("Params: " + ", ".join(f"{k}={v}" for k, v in params.items()))
+    print(f"Recordings: {summary['recordings']}")
+    print(f"Accuracy: {summary['accuracy']:.1%}")
+    print(f"False reject rate: {summary['false_reject_rate']:.1%}")
+    print(f"False accept rate: {summary['false_accept_rate']:.1%}")
+    if summary['mean_time_to_pass'] is not None:
+        print(f"Mean time to pass: {summary['mean_time_to_pass']:.2f}s")
+    print(f"Per-frame cost: p50 {summary['frame_ms_p50']:.2f}ms, p95 {summary['frame_ms_p95']:.2f}ms")
+
+
+def record_from_camera(args):
+    """Record a labelled session from the webcam"""
+    import cv2
+    import face_recognition
+
+    camera = cv2.VideoCapture(args.camera)
+    if not camera.isOpened():
+        print(f"Could not open camera {args.camera}")
+        return 1
+
+    recorder = LivenessRecorder(args.out, args.label, save_frames=args.frames)
+    print(f"Recording {args.label} session for {args.seconds}s...")
+    end_time = time.monotonic() + args.seconds
+    try:
+        while time.monotonic() < end_time:
+            ret, frame = camera.read()
+            if not ret:
+                break
+            timestamp = time.monotonic()
+            detect_start = time.perf_counter()
+            face_landmarks = face_recognition.face_landmarks(frame)
+            landmark_ms = (time.perf_counter() - detect_start) * 1000
+            landmarks = face_landmarks[0] if face_landmarks else None
+            recorder.record(frame, landmarks, timestamp, landmark_ms)
+    finally:
+        camera.release()
+
+    recorder.save()
+    return 0
+
+
+def _detector_kwargs(args):
+    return {
+        'movement_threshold': args.movement_threshold,
+        'required_movements': args.required_movements,
+        'window_seconds': args.window_seconds,
+        'frame_budget_ms': args.frame_budget_ms
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Liveness recording and replay")
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    rec = sub.add_parser('record', help="Record a labelled session from the webcam")
+    rec.add_argument('--label', choices=LABELS, required=True)
+    rec.add_argument('--out', default=os.path.join('data', 'liveness_recordings'))
+    rec.add_argument('--seconds', type=float, default=10.0)
+    rec.add_argument('--camera', type=int, default=0)
+    rec.add_argument('--frames', action='store_true', help="Also save the raw clip")
+
+    for name in ('replay', 'sweep'):
+        p = sub.add_parser(name)
+        p.add_argument('paths', nargs='+', help="Recording files or directories")
+        p.add_argument('--movement-threshold', type=float, default=0.15)
+        p.add_argument('--required-movements', type=int, default=2)
+        p.add_argument('--window-seconds', type=float, default=3.0)
+        p.add_argument('--frame-budget-ms', type=float, default=40.0)
+        p.add_argument('--min-accuracy', type=float, help="Fail if accuracy is lower")
+        p.add_argument('--max-frame-ms', type=float, help="Fail if p95 frame cost is higher")
+        p.add_argument('--verbose', action='store_true')
+
+    args = parser.parse_args(argv)
+
+    if args.command == 'record':
+        return record_from_camera(args)
+
+    recordings = [load_recording(path) for path in find_recordings(args.paths)]
+    if not recordings:
+        print("No recordings found")
+        return 1
+
+    if args.command == 'sweep':
+        # Grid search over movement threshold and count, best accuracy first
+        runs = []
+        for threshold in np.arange(0.05, 0.35, 0.05):
+            for required in (1, 2, 3, 4):
+                kwargs = dict(_detector_kwargs(args), movement_threshold=round(float(threshold), 2),
+                              required_movements=required)
+                runs.append((kwargs, benchmark(recordings, **kwargs)))
+        runs.sort(key=lambda run: (-run[1]['accuracy'], run[1]['mean_time_to_pass'] or float('inf')))
+        for kwargs, summary in runs[:5]:
+            print_summary(summary, kwargs)
+            print()
+        return 0
+
+    kwargs = _detector_kwargs(args)
+    summary = benchmark(recordings, **kwargs)
+    if args.verbose:
+        for r in summary['results']:
+            result = f"passed at {r['time_to_pass']:.2f}s" if r['passed'] else "rejected"
+            print(f"{r['path']} [{r['label']}]: {result}")
+    print_summary(summary, kwargs)
+
+    # Regression gates
+    failed = False
+    if args.min_accuracy is not None and summary['accuracy'] < args.min_accuracy:
+        print(f"FAIL: accuracy below {args.min_accuracy:.1%}")
+        failed = True
+    if args.max_frame_ms is not None and summary['frame_ms_p95'] > args.max_frame_ms:
+        print(f"FAIL: p95 frame cost above {args.max_frame_ms:.2f}ms")
+        failed = True
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,139 @@
+"""Location audit of recorded attendance
+
+Recomputes the WFH/WFO decision of every check-in from its stored
+coordinates and the user's registered places, and reports records whose
+stored mode disagrees or that have no coordinates. Records are streamed
+in chunks and each chunk is classified as one array operation.
+
+    python -m src.location_audit audit.csv --start 2024-01-01 --end 2024-12-31
+    python -m src.location_audit audit.csv --site "Kantor Pusat"
+"""
+import argparse
+import csv
+import sys
+
+import numpy as np
+
+from src.geofence import Geofence
+from src.geolocation import SiteIndex, classify_modes, haversine
+
+# Records classified per array operation
+AUDIT_CHUNK = 5000
+
+AUDIT_COLUMNS = [
+    'id', 'user_id', 'name', 'date', 'time_in', 'location', 'mode', 'expected_mode',
+    'home_m', 'office_m', 'nearest_site', 'nearest_m', 'issue',
+]
+
+def _chunks(records, size):
+    chunk = []
+    for record in records:
+        chunk.append(record)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def _column(chunk, key):
+    """One column of a chunk as a float array, NULL becomes NaN"""
+    return np.array([record[key] for record in chunk], dtype=float)
+
+
+def audit_attendance(db, filters=None, chunk_size=AUDIT_CHUNK, sites=None):
+    """Yield audit rows for records that need attention
+
+    A record needs attention when it has no coordinates (issue
+    'no_location'), or when the recomputed mode differs from the
+    stored one (issue 'mode_mismatch'). `sites` is the SiteIndex used for
+    the nearest registered site, all registered sites by default.
+    """
+    if sites is None:
+        registry = Geofence()
+        registry.load(db)
+        sites = SiteIndex(
+            [site['name'] for site in registry.sites.values()],
+            [site['lat'] for site in registry.sites.values()],
+            [site['lon'] for site in registry.sites.values()],
+        )
+
+    records = db.iter_attendance(**(filters or {}))
+    try:
+        for chunk in _chunks(records, chunk_size):
+            lats, lons = _column(chunk, 'lat'), _column(chunk, 'lon')
+            home_lats, home_lons = _column(chunk, 'home_lat'), _column(chunk, 'home_lon')
+            office_lats, office_lons = _column(chunk, 'office_lat'), _column(chunk, 'office_lon')
+
+            home_m = haversine(lats, lons, home_lats, home_lons)
+            office_m = haversine(lats, lons, office_lats, office_lons)
+            expected = classify_modes(lats, lons, home_lats, home_lons, office_lats, office_lons)
+            stored = np.array([r['mode'] for r in chunk], dtype=object)
+
+            no_location = np.isnan(lats) | np.isnan(lons)
+            mismatch = ~no_location & ~np.isnan(home_m) & ~np.isnan(office_m) & (expected != stored)
+            flagged = np.flatnonzero(no_location | mismatch)
+            if not len(flagged):
+                continue
+
+            nearest, nearest_m = sites.nearest_many(lats[flagged], lons[flagged])
+            for j, i in enumerate(flagged):
+                record = chunk[i]
+                yield {
+                    'id': record['id'],
+                    'user_id': record['user_id'],
+                    'name': record['name'],
+                    'date': record['date'],
+                    'time_in': record['time_in'],
+                    'location': record['location'],
+                    'mode': record['mode'],
+                    'expected_mode': None if no_location[i] else str(expected[i]),
+                    'home_m': None if np.isnan(home_m[i]) else round(float(home_m[i]), 1),
+                    'office_m': None if np.isnan(office_m[i]) else round(float(office_m[i]), 1),
+                    'nearest_site': nearest[j],
+                    'nearest_m': None if np.isnan(nearest_m[j]) else round(float(nearest_m[j]), 1),
+                    'issue': 'no_location' if no_location[i] else 'mode_mismatch',
+                }
+    finally:
+        records.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Audit attendance locations")
+    parser.add_argument('output', help="Report CSV path")
+    parser.add_argument('--start', help="First date (YYYY-MM-DD)")
+    parser.add_argument('--end', help="Last date (YYYY-MM-DD)")
+    parser.add_argument('--user-id', type=int, action='append', help="Only this user, can be repeated")
+    parser.add_argument('--site', help="Only check-ins inside the bounding box of this site")
+    args = parser.parse_args(argv)
+
+    from src.database import Database
+
+    db = Database()
+    filters = {'start_date': args.start, 'end_date': args.end, 'user_id': args.user_id}
+    filters = {key: value for key, value in filters.items() if value}
+    if args.site:
+        registry = Geofence()
+        registry.load(db)
+        site = next((s for s in registry.sites.values() if s['name'] == args.site), None)
+        if site is None:
+            print(f"Unknown site: {args.site}")
+            return 1
+        filters['bbox'] = (site['min_lat'], site['max_lat'], site['min_lon'], site['max_lon'])
+
+    issues = {'no_location': 0, 'mode_mismatch': 0}
+    with open(args.output, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.DictWriter(f, fieldnames=AUDIT_COLUMNS)
+        writer.writeheader()
+        for row in audit_attendance(db, filters):
+            writer.writerow(row)
+            issues[row['issue']] += 1
+
+    print(f"Mode mismatches: {issues['mode_mismatch']}")
+    print(f"Records without location: {issues['no_location']}")
+    print(f"Report: {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
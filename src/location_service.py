@@ -0,0 +1,248 @@
+"""Background location service for the kiosk
+
+A provider reads the kiosk's position: a fixed location from config, a
+serial NMEA GPS receiver, or a stub for tests. LocationService calls it
+on its own thread and keeps the last fix in memory with its timestamp,
+so the Tk thread only ever reads the cached value and never waits on a
+serial port or network.
+
+The provider is chosen with ATTENDANCE_LOCATION_PROVIDER:
+
+    static                  fixed default location
+    static:-5.1486,119.4319 fixed location
+    nmea:/dev/ttyUSB0       GPS receiver, optional :baudrate (needs pyserial)
+    stub                    scripted locations for tests
+"""
+import logging
+import threading
+import time
+
+from src.geolocation import get_current_location, parse_coordinates
+
+# Seconds between provider reads, and before a retry after a failed read
+REFRESH_SECONDS = 10
+RETRY_SECONDS = 2
+
+# Fixes older than this are not used for check-ins
+FIX_TTL_SECONDS = 120
+
+# NMEA receivers default to this baud rate
+NMEA_BAUDRATE = 4800
+
+# A GPS read gives up after this many seconds without a valid sentence
+NMEA_READ_TIMEOUT = 3.0
+
+PROVIDER_ENV = 'ATTENDANCE_LOCATION_PROVIDER'
+
+def _validate(location):
+    """Raise ValueError unless location is a valid "lat,lon" string"""
+    parse_coordinates(location)
+    return location
+
+
+class LocationFix:
+    """One position reading"""
+    def __init__(self, location, source, timestamp=None):
+        self.location = location  # "lat,lon"
+        self.source = source
+        self.timestamp = time.time() if timestamp is None else timestamp
+        self._monotonic = time.monotonic()
+
+    def age(self):
+        """Seconds since the fix was read"""
+        return time.monotonic() - self._monotonic
+
+    def is_fresh(self, ttl=FIX_TTL_SECONDS):
+        return self.age() <= ttl
+
+
+class StaticProvider:
+    """Fixed location, for kiosks that do not move"""
+    name = 'static'
+
+    def __init__(self, location=None):
+        # Reject malformed config early
+        self.location = _validate(location or get_current_location())
+
+    def read(self):
+        return self.location
+
+    def close(self):
+        pass
+
+
+class StubProvider:
+    """Scripted locations for tests, None entries simulate a lost fix"""
+    name = 'stub'
+
+    def __init__(self, locations=None, delay=0.0):
+        self.locations = list(locations or [get_current_location()])
+        self.delay = delay
+        self.reads = 0
+
+    def read(self):
+        if self.delay:
+            time.sleep(self.delay)
+        location = self.locations[min(self.reads, len(self.locations) - 1)]
+        self.reads += 1
+        if location is None:
+            raise IOError("No fix")
+        return location
+
+    def close(self):
+        pass
+
+
+def _nmea_degrees(value, hemisphere):
+    """ddmm.mmmm (or dddmm.mmmm) and N/S/E/W to signed degrees"""
+    point = value.index('.') if '.' in value else len(value)
+    degrees = float(value[:point - 2]) + float(value[point - 2:]) / 60
+    return -degrees if hemisphere in ('S', 'W') else degrees
+
+
+def parse_nmea(sentence):
+    """Location from a GGA or RMC sentence, None if it holds no valid fix"""
+    sentence = sentence.strip()
+    if not sentence.startswith('$'):
+        return None
+    if '*' in sentence:
+        body, checksum = sentence[1:].split('*', 1)
+        calculated = 0
+        for char in body:
+            calculated ^= ord(char)
+        try:
+            if calculated != int(checksum[:2], 16):
+                return None
+        except ValueError:
+            return None
+    else:
+        body = sentence[1:]
+
+    fields = body.split(',')
+    kind = fields[0][-3:]
+    try:
+        if kind == 'GGA' and len(fields) > 6 and fields[6] not in ('', '0'):
+            lat, lat_hemi, lon, lon_hemi = fields[2:6]
+        elif kind == 'RMC' and len(fields) > 6 and fields[2] == 'A':
+            lat, lat_hemi, lon, lon_hemi = fields[3:7]
+        else:
+            return None
+        return f"{_nmea_degrees(lat, lat_hemi):.6f},{_nmea_degrees(lon, lon_hemi):.6f}"
+    except (ValueError, IndexError):
+        return None
+
+
+class NmeaSerialProvider:
+    """GPS receiver that writes NMEA sentences to a serial port"""
+    name = 'nmea'
+
+    def __init__(self, port, baudrate=NMEA_BAUDRATE, read_timeout=NMEA_READ_TIMEOUT):
+        self.port = port
+        self.baudrate = baudrate
+        self.read_timeout = read_timeout
+        self._serial = None
+
+    def _open(self):
+        if self._serial is None:
+            # Optional dependency, only needed with a GPS receiver
+            import serial
+            self._serial = serial.Serial(self.port, self.baudrate, timeout=1.0)
+        return self._serial
+
+    def read(self):
+        port = self._open()
+        deadline = time.monotonic() + self.read_timeout
+        try:
+            while time.monotonic() < deadline:
+                line = port.readline().decode('ascii', errors='ignore')
+                location = parse_nmea(line)
+                if location:
+                    return location
+        except Exception:
+            # Reopen on the next read, the receiver may have been unplugged
+            self.close()
+            raise
+        raise IOError(f"No GPS fix from {self.port} within {self.read_timeout}s")
+
+    def close(self):
+        if self._serial is not None:
+            try:
+                self._serial.close()
+            finally:
+                self._serial = None
+
+
+def provider_from_spec(spec=None):
+    """Build a provider from a "kind[:argument]" string, see module docstring"""
+    kind, _, argument = (spec or 'static').partition(':')
+    if kind == 'static':
+        return StaticProvider(argument or None)
+    if kind == 'stub':
+        return StubProvider([argument] if argument else None)
+    if kind == 'nmea':
+        port, _, baudrate = argument.partition(':')
+        if not port:
+            raise ValueError("nmea provider needs a serial port, e.g. nmea:/dev/ttyUSB0")
+        return NmeaSerialProvider(port, int(baudrate) if baudrate else NMEA_BAUDRATE)
+    raise ValueError(f"Unknown location provider: {kind}")
+
+
+class LocationService:
+    """Reads a provider on a background thread and caches the last fix"""
+    def __init__(self, provider, refresh_seconds=REFRESH_SECONDS, retry_seconds=RETRY_SECONDS,
+                 ttl=FIX_TTL_SECONDS):
+        self.provider = provider
+        self.refresh_seconds = refresh_seconds
+        self.retry_seconds = retry_seconds
+        self.ttl = ttl
+        self.last_error = None
+        self._fix = None
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._wake = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="location-service", daemon=True)
+            self._thread.start()
+            print(f"Location service started ({self.provider.name})")
+        return self
+
+    def stop(self, timeout=NMEA_READ_TIMEOUT + 1):
+        self._stop.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+        self.provider.close()
+
+    def refresh_now(self):
+        """Ask the thread for a new reading without waiting for it"""
+        self._wake.set()
+
+    def current(self):
+        """Last fix, or None before the first reading"""
+        with self._lock:
+            return self._fix
+
+    def fresh(self):
+        """Last fix if it is within the TTL, else None"""
+        fix = self.current()
+        return fix if fix is not None and fix.is_fresh(self.ttl) else None
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                location = _validate(self.provider.read())
+                with self._lock:
+                    self._fix = LocationFix(location, self.provider.name)
+                self.last_error = None
+                wait = self.refresh_seconds
+            except Exception as e:
+                if str(e) != self.last_error:
+                    logging.warning(f"Location provider {self.provider.name} failed: {str(e)}")
+                self.last_error = str(e)
+                wait = self.retry_seconds
+            self._wake.wait(wait)
+            self._wake.clear()
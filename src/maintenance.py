@@ -0,0 +1,77 @@
+"""Database maintenance commands
+
+    python -m src.maintenance rebuild-summary [--start YYYY-MM-DD] [--end YYYY-MM-DD]
+    python -m src.maintenance archive [--keep-months 3]
+    python -m src.maintenance upgrade-archives
+    python -m src.maintenance list-sites
+    python -m src.maintenance add-site --kind office --name NAME --lat LAT --lon LON [--radius M | --polygon JSON]
+    python -m src.maintenance update-site ID [--lat LAT] [--lon LON] [--radius M] [--polygon JSON]
+"""
+import argparse
+import sys
+
+from src.database import Database
+from src.geofence import CITY_RADIUS_M, OFFICE_RADIUS_M, SITE_KINDS
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Attendance database maintenance")
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    rebuild = sub.add_parser('rebuild-summary', help="Recompute the daily attendance summary")
+    rebuild.add_argument('--start', help="First date to rebuild (YYYY-MM-DD)")
+    rebuild.add_argument('--end', help="Last date to rebuild (YYYY-MM-DD)")
+
+    archive = sub.add_parser('archive', help="Move closed months into monthly archive files")
+    archive.add_argument('--keep-months', type=int, default=3,
+                         help="Months kept in the main database, current month included")
+
+    sub.add_parser('upgrade-archives', help="Add new attendance columns to the archive files")
+
+    sub.add_parser('list-sites', help="Show registered offices and cities")
+
+    add_site = sub.add_parser('add-site', help="Register an office or city")
+    add_site.add_argument('--kind', choices=SITE_KINDS, required=True)
+    add_site.add_argument('--name', required=True)
+    add_site.add_argument('--lat', type=float, required=True)
+    add_site.add_argument('--lon', type=float, required=True)
+    add_site.add_argument('--radius', type=float, help="Geofence radius in meters (default by kind)")
+    add_site.add_argument('--polygon', help="Geofence polygon as JSON [[lat, lon], ...]")
+
+    update_site = sub.add_parser('update-site', help="Move a site or change its geofence")
+    update_site.add_argument('id', type=int)
+    update_site.add_argument('--lat', type=float)
+    update_site.add_argument('--lon', type=float)
+    update_site.add_argument('--radius', type=float, help="Geofence radius in meters")
+    update_site.add_argument('--polygon', help="Geofence polygon as JSON [[lat, lon], ...]")
+
+    args = parser.parse_args(argv)
+    db = Database()
+
+    if args.command == 'rebuild-summary':
+        db.rebuild_daily_summary(args.start, args.end)
+    elif args.command == 'archive':
+        if args.keep_months < 1:
+            parser.error("--keep-months must be at least 1")
+        db.archive_closed_months(args.keep_months)
+    elif args.command == 'upgrade-archives':
+        print(f"Upgraded {db.upgrade_archives()} archives")
+    elif args.command == 'list-sites':
+        for site in db.get_sites():
+            fence = "polygon" if site['polygon'] else f"{site['radius_m']:.0f} m"
+            print(f"{site['id']:>4}  {site['kind']:<6}  {site['name']:<36}  {site['lat']},{site['lon']}  {fence}")
+    elif args.command == 'add-site':
+        radius = args.radius
+        if radius is None and not args.polygon:
+            radius = OFFICE_RADIUS_M if args.kind == 'office' else CITY_RADIUS_M
+        site_id = db.add_site(args.kind, args.name, args.lat, args.lon, radius, args.polygon)
+        if site_id is None:
+            return 1
+        print(f"Added site {site_id}")
+    elif args.command == 'update-site':
+        if not db.update_site(args.id, args.lat, args.lon, args.radius, args.polygon):
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,451 @@
+"""Versioned schema migrations
+
+The schema version is stored in SQLite's PRAGMA user_version. Each
+migration runs in its own write transaction together with the version
+bump, so an interrupted upgrade leaves the database at the last fully
+applied version. To change the schema, append a new (version,
+description, function) entry to MIGRATIONS - never edit an applied one.
+
+    python -m src.migrations          # show version and apply pending
+"""
+import hashlib
+import logging
+from datetime import datetime, timezone
+
+def _initial_schema(cursor):
+    """Base tables, also matches databases created before migrations existed"""
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS users (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            name TEXT NOT NULL UNIQUE,
+            photo_path TEXT NOT NULL,
+            home_location TEXT,
+            office_location TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS attendance (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER NOT NULL,
+            date DATE DEFAULT CURRENT_DATE,
+            time_in TIME DEFAULT CURRENT_TIME,
+            time_out TIME,
+            mode TEXT NOT NULL,
+            status TEXT NOT NULL,
+            location TEXT,
+            FOREIGN KEY (user_id) REFERENCES users(id)
+        )
+    ''')
+
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS admin_users (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            username TEXT NOT NULL UNIQUE,
+            password TEXT NOT NULL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+
+    # Create default admin account if there is none yet
+    cursor.execute("SELECT COUNT(*) FROM admin_users")
+    if cursor.fetchone()[0] == 0:
+        default_password = hashlib.sha256('admin123'.encode()).hexdigest()
+        cursor.execute("""
+            INSERT INTO admin_users (username, password)
+            VALUES (?, ?)
+        """, ('admin', default_password))
+
+
+def _attendance_indexes(cursor):
+    """Indexes for per-user lookups, dedupe and date ordered reports"""
+    # (user_id, date) also serves lookups on user_id alone
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS idx_attendance_user_date
+        ON attendance(user_id, date)
+    """)
+    # Matches ORDER BY date DESC, time_in DESC so reports avoid a sort
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS idx_attendance_date_time
+        ON attendance(date, time_in)
+    """)
+
+
+def _face_encodings(cursor):
+    """Stored face encodings, one per user and encoder version"""
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS face_encodings (
+            user_id INTEGER NOT NULL,
+            encoder TEXT NOT NULL,
+            encoder_version TEXT NOT NULL,
+            photo_hash TEXT NOT NULL,
+            dim INTEGER NOT NULL,
+            encoding BLOB NOT NULL,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (user_id, encoder, encoder_version),
+            FOREIGN KEY (user_id) REFERENCES users(id)
+        )
+    ''')
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS idx_face_encodings_encoder
+        ON face_encodings(encoder, encoder_version)
+    """)
+
+
+def _attendance_daily(cursor):
+    """Per user per day summary, backfilled from existing attendance"""
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS attendance_daily (
+            user_id INTEGER NOT NULL,
+            date DATE NOT NULL,
+            first_in TIME,
+            last_out TIME,
+            mode TEXT,
+            status TEXT,
+            event_count INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (user_id, date)
+        ) WITHOUT ROWID
+    ''')
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS idx_attendance_daily_date
+        ON attendance_daily(date)
+    """)
+    # Mode and status come from the first check-in of the day. Until
+    # migration 5 every scan was its own row, so COUNT(*) counts scans.
+    cursor.execute("""
+        INSERT OR REPLACE INTO attendance_daily
+            (user_id, date, first_in, last_out, mode, status, event_count)
+        SELECT user_id, date, time_in, last_out, mode, status, event_count
+        FROM (
+            SELECT user_id, date, time_in, mode, status,
+                   ROW_NUMBER() OVER (PARTITION BY user_id, date ORDER BY time_in, id) AS rn,
+                   COUNT(*) OVER day AS event_count,
+                   CASE WHEN COUNT(*) OVER day > 1 OR MAX(time_out) OVER day IS NOT NULL
+                        THEN MAX(COALESCE(time_out, time_in)) OVER day END AS last_out
+            FROM attendance
+            WINDOW day AS (PARTITION BY user_id, date)
+        )
+        WHERE rn = 1
+    """)
+
+
+def _one_attendance_per_day(cursor):
+    """Collapse repeated scans into one check-in/check-out row per user per day"""
+    # Keep the first check-in of each day
+    cursor.execute("""
+        CREATE TEMP TABLE attendance_keep AS
+        SELECT id FROM (
+            SELECT id, ROW_NUMBER() OVER (PARTITION BY user_id, date ORDER BY time_in, id) AS rn
+            FROM attendance
+        )
+        WHERE rn = 1
+    """)
+    # Latest scan of the day becomes the check-out
+    cursor.execute("""
+        UPDATE attendance SET time_out = (
+            SELECT MAX(COALESCE(b.time_out, b.time_in)) FROM attendance b
+            WHERE b.user_id = attendance.user_id AND b.date = attendance.date
+        )
+        WHERE id IN (SELECT id FROM attendance_keep)
+          AND (SELECT COUNT(*) FROM attendance b
+               WHERE b.user_id = attendance.user_id AND b.date = attendance.date) > 1
+    """)
+    cursor.execute("DELETE FROM attendance WHERE id NOT IN (SELECT id FROM attendance_keep)")
+    cursor.execute("DROP TABLE attendance_keep")
+
+    # Unique index replaces the plain (user_id, date) index
+    cursor.execute("DROP INDEX IF EXISTS idx_attendance_user_date")
+    cursor.execute("""
+        CREATE UNIQUE INDEX IF NOT EXISTS idx_attendance_user_day
+        ON attendance(user_id, date)
+    """)
+
+
+def _attendance_archives(cursor):
+    """Catalog of monthly archive files holding closed months"""
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS attendance_archives (
+            month TEXT PRIMARY KEY,
+            path TEXT NOT NULL,
+            row_count INTEGER NOT NULL,
+            archived_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+
+
+def _gallery_changes(cursor):
+    """Change log of face gallery entries, polled by running kiosks"""
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS gallery_changes (
+            seq INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER NOT NULL,
+            changed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    # Triggers log every write path: admin form, bulk import, kiosk encoding
+    for event, row in (("INSERT", "NEW"), ("UPDATE", "NEW"), ("DELETE", "OLD")):
+        cursor.execute(f"""
+            CREATE TRIGGER IF NOT EXISTS face_encodings_{event.lower()}_log
+            AFTER {event} ON face_encodings
+            BEGIN
+                INSERT INTO gallery_changes (user_id) VALUES ({row}.user_id);
+            END
+        """)
+    cursor.execute("""
+        CREATE TRIGGER IF NOT EXISTS users_name_log
+        AFTER UPDATE OF name ON users
+        BEGIN
+            INSERT INTO gallery_changes (user_id) VALUES (NEW.id);
+        END
+    """)
+    cursor.execute("""
+        CREATE TRIGGER IF NOT EXISTS users_delete_log
+        AFTER DELETE ON users
+        BEGIN
+            INSERT INTO gallery_changes (user_id) VALUES (OLD.id);
+        END
+    """)
+
+
+def _attendance_daily_covering_index(cursor):
+    """Dashboard aggregates read only the index, not the summary rows"""
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS idx_attendance_daily_date_mode
+        ON attendance_daily(date, mode, status, first_in)
+    """)
+    # The covering index also serves plain date lookups
+    cursor.execute("DROP INDEX IF EXISTS idx_attendance_daily_date")
+
+
+# Sites that were hardcoded in the admin panel, seeded by migration 9
+SEED_OFFICES = {
+    "Kantor Gubernur Sulawesi Selatan": (-5.1508, 119.4321),
+    "Kantor Walikota Makassar": (-5.1531, 119.4319),
+    "Kantor DPRD Makassar": (-5.1534, 119.4326),
+    "Universitas Hasanuddin": (-5.1308, 119.4863),
+    "Kantor BPN Makassar": (-5.1514, 119.4321),
+    "RS Wahidin Sudirohusodo": (-5.1397, 119.4902),
+}
+SEED_CITIES = {
+    "Makassar": (-5.1477, 119.4327),
+    "Jakarta": (-6.2088, 106.8456),
+    "Surabaya": (-7.2575, 112.7521),
+    "Bandung": (-6.9175, 107.6191),
+    "Medan": (3.5952, 98.6722),
+    "Semarang": (-6.9932, 110.4203),
+}
+
+
+def _sites(cursor):
+    """Registry of offices and cities with geofences, users link to it"""
+    from src.geofence import CITY_RADIUS_M, OFFICE_RADIUS_M, bounding_box, site_location
+
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS sites (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            kind TEXT NOT NULL CHECK (kind IN ('office', 'city')),
+            name TEXT NOT NULL,
+            lat REAL NOT NULL,
+            lon REAL NOT NULL,
+            radius_m REAL,
+            polygon TEXT,
+            min_lat REAL NOT NULL,
+            max_lat REAL NOT NULL,
+            min_lon REAL NOT NULL,
+            max_lon REAL NOT NULL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            UNIQUE (kind, name)
+        )
+    ''')
+    cursor.execute("ALTER TABLE users ADD COLUMN home_site_id INTEGER REFERENCES sites(id)")
+    cursor.execute("ALTER TABLE users ADD COLUMN office_site_id INTEGER REFERENCES sites(id)")
+
+    for kind, seeds, radius_m, column, location_column in (
+        ('office', SEED_OFFICES, OFFICE_RADIUS_M, 'office_site_id', 'office_location'),
+        ('city', SEED_CITIES, CITY_RADIUS_M, 'home_site_id', 'home_location'),
+    ):
+        for name, (lat, lon) in seeds.items():
+            cursor.execute("""
+                INSERT OR IGNORE INTO sites
+                    (kind, name, lat, lon, radius_m, min_lat, max_lat, min_lon, max_lon)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+            """, (kind, name, lat, lon, radius_m, *bounding_box(lat, lon, radius_m)))
+            # Link users whose stored coordinates are this site's
+            cursor.execute(f"""
+                UPDATE users SET {column} = (SELECT id FROM sites WHERE kind = ? AND name = ?)
+                WHERE {location_column} = ?
+            """, (kind, name, site_location(lat, lon)))
+
+
+def _numeric_coordinates(cursor):
+    """REAL latitude/longitude next to the "lat,lon" text columns
+
+    Text that does not parse stays in place but gets NULL coordinates,
+    and is counted in the log so it can be fixed by hand.
+    """
+    from src.geolocation import parse_coordinates
+
+    for column in ('home_lat', 'home_lon', 'office_lat', 'office_lon'):
+        cursor.execute(f"ALTER TABLE users ADD COLUMN {column} REAL")
+    for column in ('lat', 'lon'):
+        cursor.execute(f"ALTER TABLE attendance ADD COLUMN {column} REAL")
+
+    # Parse each distinct text once
+    cursor.execute("CREATE TEMP TABLE parsed_locations (location TEXT PRIMARY KEY, lat REAL, lon REAL)")
+    texts = set()
+    for query in ("SELECT DISTINCT home_location FROM users",
+                  "SELECT DISTINCT office_location FROM users",
+                  "SELECT DISTINCT location FROM attendance"):
+        texts.update(row[0] for row in cursor.execute(query).fetchall() if row[0])
+    invalid = []
+    for text in texts:
+        try:
+            cursor.execute("INSERT INTO parsed_locations VALUES (?, ?, ?)", (text, *parse_coordinates(text)))
+        except ValueError:
+            invalid.append(text)
+
+    for prefix in ('home', 'office'):
+        cursor.execute(f"""
+            UPDATE users SET
+                {prefix}_lat = (SELECT lat FROM parsed_locations p WHERE p.location = users.{prefix}_location),
+                {prefix}_lon = (SELECT lon FROM parsed_locations p WHERE p.location = users.{prefix}_location)
+        """)
+    cursor.execute("""
+        UPDATE attendance SET
+            lat = (SELECT lat FROM parsed_locations p WHERE p.location = attendance.location),
+            lon = (SELECT lon FROM parsed_locations p WHERE p.location = attendance.location)
+        WHERE location IS NOT NULL
+    """)
+    cursor.execute("DROP TABLE parsed_locations")
+
+    # Bounding-box queries on check-in positions
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_attendance_lat_lon ON attendance(lat, lon)")
+
+    if invalid:
+        logging.warning(f"{len(invalid)} location values could not be parsed, left without coordinates: {invalid[:10]}")
+        print(f"Warning: {len(invalid)} location values could not be parsed, see database.log")
+
+
+def _local_attendance_times(cursor):
+    """Scan count per attendance row, and attendance moved to local time
+
+    Rows used to take SQLite's CURRENT_DATE/CURRENT_TIME defaults, which
+    are UTC. Both scans of each row are moved to the local clock and
+    regrouped into one row per user per local day, and the summary of the
+    hot months is rebuilt from them. Archive files are left as they are
+    and flagged with times_utc in the catalog.
+    """
+    cursor.execute("ALTER TABLE attendance ADD COLUMN scan_count INTEGER NOT NULL DEFAULT 1")
+    # The summary counted every scan, a row with a check-out has at least two
+    cursor.execute("""
+        UPDATE attendance SET scan_count = MAX(
+            1 + (time_out IS NOT NULL),
+            COALESCE((SELECT event_count FROM attendance_daily d
+                      WHERE d.user_id = attendance.user_id AND d.date = attendance.date), 0)
+        )
+    """)
+    cursor.execute("ALTER TABLE attendance_archives ADD COLUMN times_utc INTEGER NOT NULL DEFAULT 0")
+    cursor.execute("UPDATE attendance_archives SET times_utc = 1")
+
+    def local(date, clock):
+        utc = datetime.strptime(f"{date} {clock[:8]}", "%Y-%m-%d %H:%M:%S").replace(tzinfo=timezone.utc)
+        return utc.astimezone().replace(tzinfo=None)
+
+    columns = [row[1] for row in cursor.execute("PRAGMA table_info(attendance)").fetchall()]
+    rows = [dict(zip(columns, row)) for row in cursor.execute("SELECT * FROM attendance ORDER BY id").fetchall()]
+
+    # Scans per (user, local day), the check-in carries one scan and the
+    # check-out the rest
+    days = {}
+    for row in rows:
+        scans = [(local(row['date'], row['time_in']), 1 if row['time_out'] else row['scan_count'])]
+        if row['time_out']:
+            scans.append((local(row['date'], row['time_out']), row['scan_count'] - 1))
+        for scanned, count in scans:
+            days.setdefault((row['user_id'], scanned.date()), []).append((scanned, row['id'], count, row))
+
+    cursor.execute("DELETE FROM attendance")
+    placeholders = ", ".join("?" * len(columns))
+    used_ids = set()
+    for (user_id, day), scans in days.items():
+        scans.sort(key=lambda scan: (scan[0], scan[1]))
+        first, row_id, _, source = scans[0]
+        # A row split over two days keeps its id on the first one
+        new = dict(source, id=None if row_id in used_ids else row_id)
+        used_ids.add(row_id)
+        new.update(
+            date=day.isoformat(),
+            time_in=first.strftime('%H:%M:%S'),
+            time_out=scans[-1][0].strftime('%H:%M:%S') if len(scans) > 1 else None,
+            scan_count=sum(count for _, _, count, _ in scans)
+        )
+        cursor.execute(f"INSERT INTO attendance ({', '.join(columns)}) VALUES ({placeholders})",
+                       [new[column] for column in columns])
+
+    cursor.execute("""
+        DELETE FROM attendance_daily
+        WHERE substr(date, 1, 7) NOT IN (SELECT month FROM attendance_archives)
+    """)
+    cursor.execute("""
+        INSERT OR REPLACE INTO attendance_daily
+            (user_id, date, first_in, last_out, mode, status, event_count)
+        SELECT user_id, date, time_in, time_out, mode, status, scan_count
+        FROM attendance
+    """)
+
+    cursor.execute("SELECT COUNT(*) FROM attendance_archives")
+    archived = cursor.fetchone()[0]
+    if archived:
+        logging.info(f"{archived} archived months keep UTC attendance times")
+
+
+MIGRATIONS = [
+    (1, "initial schema", _initial_schema),
+    (2, "attendance indexes", _attendance_indexes),
+    (3, "face encodings", _face_encodings),
+    (4, "daily attendance summary", _attendance_daily),
+    (5, "one attendance record per user per day", _one_attendance_per_day),
+    (6, "attendance archive catalog", _attendance_archives),
+    (7, "face gallery change log", _gallery_changes),
+    (8, "covering index for dashboard aggregates", _attendance_daily_covering_index),
+    (9, "site registry with geofences", _sites),
+    (10, "numeric coordinate columns", _numeric_coordinates),
+    (11, "attendance scan counts and local times", _local_attendance_times),
+]
+
+LATEST_VERSION = MIGRATIONS[-1][0]
+
+
+def get_version(conn):
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+
+def apply_migrations(db):
+    """Upgrade database in place to LATEST_VERSION, returns applied versions"""
+    current = get_version(db.conn)
+    if current > LATEST_VERSION:
+        raise RuntimeError(
+            f"Database schema version {current} is newer than this application ({LATEST_VERSION})"
+        )
+
+    applied = []
+    for version, description, upgrade in MIGRATIONS:
+        if version <= current:
+            continue
+
+        print(f"Applying migration {version}: {description}")
+        with db._transaction() as cursor:
+            upgrade(cursor)
+            cursor.execute(f"PRAGMA user_version = {version}")
+        logging.info(f"Database migrated to version {version} ({description})")
+        applied.append(version)
+
+    return applied
+
+
+if __name__ == "__main__":
+    from src.database import Database
+
+    db = Database()
+    print(f"Schema version: {get_version(db.conn)} (latest {LATEST_VERSION})")
@@ -0,0 +1,225 @@
+"""Per-method query timing and slow-query log for the Database layer
+
+Connections opened through TimedConnection time every statement,
+including fetching its rows, and attribute it to the public Database
+method that issued it. A statement is one sample however many fetch
+calls read it. Statements slower than the threshold are written
+to slow_queries.log together with their EXPLAIN QUERY PLAN.
+"""
+import bisect
+import logging
+import sqlite3
+import sys
+import threading
+import time
+
+# Statements slower than this are written to the slow-query log
+SLOW_QUERY_MS = 100.0
+
+# Upper bounds (ms) of the latency histogram buckets, last bucket is open
+HISTOGRAM_BOUNDS_MS = (0.5, 1, 2, 5, 10, 25, 50, 100, 250, 500, 1000)
+
+DATABASE_MODULE = 'src.database'
+
+# Only statements that can have a query plan are explained
+EXPLAINABLE = ('SELECT', 'INSERT', 'UPDATE', 'DELETE', 'REPLACE', 'WITH')
+
+slow_log = logging.getLogger('attendance.slow_queries')
+slow_log.propagate = False
+if not slow_log.handlers:
+    _handler = logging.FileHandler('slow_queries.log', delay=True)
+    _handler.setFormatter(logging.Formatter('%(asctime)s - %(message)s'))
+    slow_log.addHandler(_handler)
+    slow_log.setLevel(logging.INFO)
+
+def _calling_method():
+    """Name of the public Database method on the call stack"""
+    frame = sys._getframe(2)
+    while frame is not None:
+        if frame.f_globals.get('__name__') == DATABASE_MODULE:
+            name = frame.f_code.co_name
+            if not name.startswith(('_', '<')):
+                return name
+        frame = frame.f_back
+    return 'other'
+
+
+class MethodStats:
+    """Count, total, max and latency histogram of one method"""
+    def __init__(self):
+        self.count = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+        self.histogram = [0] * (len(HISTOGRAM_BOUNDS_MS) + 1)
+
+    def add(self, elapsed_ms):
+        self.count += 1
+        self.total_ms += elapsed_ms
+        self.max_ms = max(self.max_ms, elapsed_ms)
+        self.histogram[bisect.bisect_left(HISTOGRAM_BOUNDS_MS, elapsed_ms)] += 1
+
+    def percentile(self, fraction):
+        """Percentile interpolated within its histogram bucket, at most max_ms"""
+        if not self.count:
+            return 0.0
+        target = fraction * self.count
+        seen = 0
+        for i, bucket in enumerate(self.histogram):
+            if bucket and seen + bucket >= target:
+                lower = HISTOGRAM_BOUNDS_MS[i - 1] if i else 0.0
+                upper = HISTOGRAM_BOUNDS_MS[i] if i < len(HISTOGRAM_BOUNDS_MS) else self.max_ms
+                value = lower + (upper - lower) * (target - seen) / bucket
+                return round(min(value, self.max_ms), 2)
+            seen += bucket
+        return round(self.max_ms, 2)
+
+    def snapshot(self):
+        return {
+            'count': self.count,
+            'total_ms': round(self.total_ms, 2),
+            'avg_ms': round(self.total_ms / self.count, 3) if self.count else 0.0,
+            'p50_ms': self.percentile(0.50),
+            'p95_ms': self.percentile(0.95),
+            'max_ms': round(self.max_ms, 2),
+            'histogram': list(self.histogram)
+        }
+
+
+class QueryStats:
+    """Thread-safe per-method statement statistics"""
+    def __init__(self, slow_query_ms=SLOW_QUERY_MS):
+        self.slow_query_ms = slow_query_ms
+        self._methods = {}
+        self._lock = threading.Lock()
+
+    def record(self, method, elapsed_ms):
+        with self._lock:
+            stats = self._methods.get(method)
+            if stats is None:
+                stats = self._methods[method] = MethodStats()
+            stats.add(elapsed_ms)
+
+    def snapshot(self):
+        """Per-method stats, slowest total time first"""
+        with self._lock:
+            rows = [dict(method=method, **stats.snapshot()) for method, stats in self._methods.items()]
+        return sorted(rows, key=lambda row: row['total_ms'], reverse=True)
+
+    def reset(self):
+        with self._lock:
+            self._methods.clear()
+
+    def log_slow(self, conn, method, sql, params, elapsed_ms):
+        """Write a slow statement and its query plan to the slow-query log"""
+        plan = ""
+        if sql.lstrip().upper().startswith(EXPLAINABLE):
+            try:
+                rows = sqlite3.Cursor(conn).execute(f"EXPLAIN QUERY PLAN {sql}", params).fetchall()
+                plan = "\n".join(f"    {row[-1]}" for row in rows)
+            except sqlite3.Error as e:
+                plan = f"    (no plan: {e})"
+        statement = " ".join(sql.split())
+        message = f"{method} took {elapsed_ms:.1f}ms: {statement} {tuple(params)}"
+        slow_log.info(f"{message}\n{plan}" if plan else message)
+
+
+class TimedCursor(sqlite3.Cursor):
+    """Cursor that times execute and fetch calls
+
+    Execute and fetch time of a statement add up to one sample, recorded
+    when the rows run out, the next statement starts, or the cursor is
+    closed or freed. A statement is logged as slow once that time passes
+    the threshold. Rows read by iterating the cursor directly are not
+    timed, only the execute that produced the first one.
+    """
+    _method = 'other'
+    _sql = ""
+    _params = ()
+    _elapsed_ms = 0.0
+    _pending = False
+
+    def _timed(self, call, *args):
+        start = time.perf_counter()
+        try:
+            return call(self, *args)
+        finally:
+            elapsed_ms = (time.perf_counter() - start) * 1000
+            stats = self.connection.query_stats
+            previous = self._elapsed_ms
+            self._elapsed_ms = previous + elapsed_ms
+            if previous < stats.slow_query_ms <= self._elapsed_ms:
+                stats.log_slow(self.connection, self._method, self._sql, self._params, self._elapsed_ms)
+
+    def _finish(self):
+        """Record the current statement, once"""
+        if self._pending:
+            self._pending = False
+            self.connection.query_stats.record(self._method, self._elapsed_ms)
+
+    def _start(self, call, sql, params, args):
+        self._finish()
+        self._method = _calling_method()
+        self._sql, self._params, self._elapsed_ms = sql, params, 0.0
+        self._pending = True
+        try:
+            result = self._timed(call, sql, args)
+        except Exception:
+            self._finish()
+            raise
+        if self.description is None:
+            # Statements without rows are done after execute
+            self._finish()
+        return result
+
+    def execute(self, sql, params=()):
+        return self._start(sqlite3.Cursor.execute, sql, params, params)
+
+    def executemany(self, sql, seq_of_params):
+        return self._start(sqlite3.Cursor.executemany, sql, (), seq_of_params)
+
+    def fetchone(self):
+        row = self._timed(sqlite3.Cursor.fetchone)
+        if row is None:
+            self._finish()
+        return row
+
+    def fetchmany(self, size=None):
+        size = size or self.arraysize
+        rows = self._timed(sqlite3.Cursor.fetchmany, size)
+        if len(rows) < size:
+            self._finish()
+        return rows
+
+    def fetchall(self):
+        rows = self._timed(sqlite3.Cursor.fetchall)
+        self._finish()
+        return rows
+
+    def close(self):
+        self._finish()
+        super().close()
+
+    def __del__(self):
+        # Single-row lookups are usually dropped after one fetchone()
+        try:
+            self._finish()
+        except Exception:
+            pass
+
+
+class TimedConnection(sqlite3.Connection):
+    """Connection whose cursors record into `query_stats`"""
+    query_stats = None
+
+    def cursor(self, factory=TimedCursor):
+        return super().cursor(factory)
+
+    def execute(self, sql, params=()):
+        return self.cursor().execute(sql, params)
+
+    def executemany(self, sql, seq_of_params):
+        return self.cursor().executemany(sql, seq_of_params)
+
+    def execute_untimed(self, sql, params=()):
+        """Execute outside the statistics, for connection setup"""
+        return sqlite3.Cursor(self).execute(sql, params)
@@ -0,0 +1,611 @@
+"""Local recognition service for thin-client kiosks
+
+One machine runs face detection, encoding, gallery search and liveness
+for several kiosks that only have a camera and a browser. Kiosks POST
+JPEG or PNG frames over HTTP. Requests that arrive close together from
+different kiosks are collected by DynamicBatcher and handled as one
+batch. Detection and encoding still run image by image, face_recognition
+has no batched CPU path, but all faces of the batch are matched against
+the gallery with a single matrix product and the per-request thread
+hand-offs are shared. `loadtest --compare` measures what that gains on
+the machine at hand. Liveness evidence is kept per client, so each kiosk
+has its own session, and a frame only reports the identity of the face
+liveness follows.
+
+    python -m src.recognition_service serve [--port 8765] [--max-batch 16] [--max-wait-ms 10]
+    python -m src.recognition_service loadtest [--clients 8] [--requests 50] [--image face.jpg] [--compare]
+
+Endpoints:
+
+    POST /recognize?client=ID         full camera frame
+    POST /recognize?client=ID&crop=1  image that is already a face crop
+    POST /reset?client=ID             start a new liveness session
+    GET  /stats                       batching and latency counters
+
+The stdlib server only speaks HTTP, so clients poll one request per
+frame over a keep-alive connection.
+"""
+import argparse
+import http.client
+import json
+import logging
+import os
+import sys
+import threading
+import time
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import numpy as np
+
+from src.face_encoding import ENCODING_DIM, ENCODING_DTYPE, MAX_ENCODE_WIDTH
+from src.gallery import MATCH_TOLERANCE, FaceGallery
+
+DEFAULT_HOST = '127.0.0.1'
+DEFAULT_PORT = 8765
+
+# A batch is closed when it is full or its first request waited this long
+MAX_BATCH = 16
+MAX_WAIT_MS = 10.0
+
+# Requests beyond this many waiting are refused with 503
+MAX_QUEUE = 256
+
+# A request gives up if its batch has not finished after this many seconds
+REQUEST_TIMEOUT = 10.0
+
+MAX_BODY_BYTES = 5 * 1024 * 1024
+
+# Liveness sessions of clients that sent nothing for this long are dropped
+SESSION_IDLE_SECONDS = 60.0
+
+# Gallery changes are picked up between batches at most this often
+GALLERY_POLL_SECONDS = 5.0
+
+# Latencies kept for the percentiles in /stats
+LATENCY_WINDOW = 1000
+
+class QueueFull(Exception):
+    """Raised when the batcher already has MAX_QUEUE requests waiting"""
+
+
+class BatcherStopped(Exception):
+    """Raised for requests the batcher will no longer handle"""
+
+
+class _Pending:
+    """One submitted item waiting for its batch"""
+    def __init__(self, item):
+        self.item = item
+        self.enqueued = time.perf_counter()
+        self.started = None
+        self.result = None
+        self.error = None
+        self.done = threading.Event()
+
+
+class DynamicBatcher:
+    """Collect items from many threads and hand them to a handler in batches
+
+    The worker thread takes the oldest waiting item, then keeps collecting
+    until the batch has max_batch items or the first one waited
+    max_wait_ms. handler(items) returns one result per item. Under light
+    load a request waits at most max_wait_ms, under heavy load batches
+    fill up and the per-request cost drops.
+    """
+    def __init__(self, handler, max_batch=MAX_BATCH, max_wait_ms=MAX_WAIT_MS, max_queue=MAX_QUEUE,
+                 idle=None):
+        self.handler = handler
+        self.max_batch = max_batch
+        self.max_wait = max_wait_ms / 1000
+        self.max_queue = max_queue
+        self.idle = idle  # called between batches, e.g. to refresh the gallery
+
+        self._queue = deque()
+        self._ready = threading.Condition()
+        self._stop = False
+        self._thread = None
+
+        self.batches = 0
+        self.items = 0
+        self.batch_sizes = {}  # batch size -> number of batches
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="recognition-batcher", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self, timeout=5.0):
+        with self._ready:
+            self._stop = True
+            # Fail what is still waiting now instead of at its timeout
+            for pending in self._queue:
+                pending.error = BatcherStopped("Service is stopping")
+                pending.done.set()
+            self._queue.clear()
+            self._ready.notify_all()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def submit(self, item, timeout=REQUEST_TIMEOUT):
+        """Queue an item and wait for its result, returns (result, timing)
+
+        timing holds queue_ms (waiting for the batch) and batch_ms (the
+        handler call) plus the batch size. Raises QueueFull,
+        BatcherStopped, TimeoutError, or the handler's exception.
+        """
+        pending = _Pending(item)
+        with self._ready:
+            if self._stop:
+                raise BatcherStopped("Service is stopping")
+            if len(self._queue) >= self.max_queue:
+                raise QueueFull(f"{len(self._queue)} requests waiting")
+            self._queue.append(pending)
+            self._ready.notify()
+
+        if not pending.done.wait(timeout):
+            raise TimeoutError(f"No result within {timeout}s")
+        if pending.error is not None:
+            raise pending.error
+        return pending.result
+
+    def queue_depth(self):
+        with self._ready:
+            return len(self._queue)
+
+    def _next_batch(self):
+        with self._ready:
+            while not self._queue and not self._stop:
+                # Wake up now and then so idle work still runs
+                self._ready.wait(GALLERY_POLL_SECONDS)
+                if not self._queue and self.idle is not None:
+                    return []
+            if self._stop:
+                return None
+            deadline = self._queue[0].enqueued + self.max_wait
+            while len(self._queue) < self.max_batch and not self._stop:
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0:
+                    break
+                self._ready.wait(remaining)
+            return [self._queue.popleft() for _ in range(min(self.max_batch, len(self._queue)))]
+
+    def _run(self):
+        while True:
+            batch = self._next_batch()
+            if batch is None:
+                break
+            if self.idle is not None:
+                try:
+                    self.idle()
+                except Exception as e:
+                    logging.error(f"Batcher idle task failed: {str(e)}")
+            if not batch:
+                continue
+
+            started = time.perf_counter()
+            try:
+                results = self.handler([pending.item for pending in batch])
+                error = None
+            except Exception as e:
+                logging.error(f"Batch of {len(batch)} failed: {str(e)}")
+                results, error = [None] * len(batch), e
+            finished = time.perf_counter()
+
+            self.batches += 1
+            self.items += len(batch)
+            self.batch_sizes[len(batch)] = self.batch_sizes.get(len(batch), 0) + 1
+            for pending, result in zip(batch, results):
+                pending.result = (result, {
+                    'queue_ms': round((started - pending.enqueued) * 1000, 2),
+                    'batch_ms': round((finished - started) * 1000, 2),
+                    'batch_size': len(batch),
+                })
+                pending.error = error
+                pending.done.set()
+
+
+class RecognitionEngine:
+    """Detection, encoding, gallery search and per-client liveness
+
+    Only the batcher thread calls handle_batch() and refresh_gallery(),
+    so the gallery and the liveness sessions need no locks.
+    """
+    def __init__(self, db, tolerance=MATCH_TOLERANCE, session_idle=SESSION_IDLE_SECONDS):
+        self.db = db
+        self.tolerance = tolerance
+        self.session_idle = session_idle
+        self.gallery = FaceGallery()
+        self.sessions = {}  # client ID -> [AntiSpoofingDetector, last seen]
+        self._reset_requests = set()
+        self._reset_lock = threading.Lock()
+        self._gallery_checked = 0.0
+
+    def load(self):
+        self.gallery.load(self.db)
+        self._gallery_checked = time.monotonic()
+        print(f"Recognition service gallery: {len(self.gallery)} faces")
+
+    def refresh_gallery(self):
+        """Apply enrollments made elsewhere, called between batches"""
+        now = time.monotonic()
+        if now - self._gallery_checked >= GALLERY_POLL_SECONDS:
+            self._gallery_checked = now
+            self.gallery.refresh(self.db)
+            # Forget kiosks that went away
+            for client in [c for c, (_, seen) in self.sessions.items() if now - seen > self.session_idle]:
+                del self.sessions[client]
+
+    def reset_session(self, client):
+        """Start a new liveness session, applied before the client's next frame"""
+        with self._reset_lock:
+            self._reset_requests.add(client)
+
+    def _detector(self, client, now):
+        from src.anti_spoofing import AntiSpoofingDetector
+
+        with self._reset_lock:
+            if client in self._reset_requests:
+                self._reset_requests.discard(client)
+                self.sessions.pop(client, None)
+        session = self.sessions.get(client)
+        if session is None:
+            session = self.sessions[client] = [AntiSpoofingDetector(), now]
+        session[1] = now
+        return session[0]
+
+    def handle_batch(self, requests):
+        """Recognize a batch of {'client', 'image', 'crop', 'received'} requests
+
+        Returns one result dict per request. Liveness follows the first
+        face of a frame, like the kiosk, so user_id and name are those of
+        that face: another recognized face in the frame can't borrow its
+        liveness.
+        """
+        import face_recognition
+
+        # Detect and encode per request, so one bad image only fails its own
+        # request. Every face of the batch is then searched in one go.
+        locations = []
+        encodings = []
+        owners = []
+        landmarks = []
+        errors = {}
+        for i, request in enumerate(requests):
+            image = request['image']
+            try:
+                if request['crop']:
+                    # A crop is one face filling the image
+                    found_locations = [(0, image.shape[1], image.shape[0], 0)]
+                else:
+                    found_locations = face_recognition.face_locations(image)
+                faces = face_recognition.face_encodings(image, found_locations) if found_locations else []
+                # Liveness follows the first face, like the kiosk
+                found = face_recognition.face_landmarks(image, found_locations[:1]) if found_locations else []
+            except Exception as e:
+                logging.error(f"Recognition error for {request['client']}: {str(e)}")
+                errors[i] = str(e)
+                found_locations, faces, found = [], [], []
+            locations.append(found_locations)
+            encodings.extend(faces)
+            owners.extend([i] * len(faces))
+            landmarks.append(found[0] if found else None)
+        matrix = np.asarray(encodings, dtype=ENCODING_DTYPE).reshape(-1, ENCODING_DIM)
+        matches = self.gallery.match_many(matrix, self.tolerance)
+
+        results = [{'faces': []} for _ in requests]
+        face_numbers = [0] * len(requests)
+        for owner, match in zip(owners, matches):
+            top, right, bottom, left = locations[owner][face_numbers[owner]]
+            face_numbers[owner] += 1
+            results[owner]['faces'].append({
+                'box': [top, right, bottom, left],
+                'user_id': match[0] if match else None,
+                'name': match[1] if match else None,
+                'distance': round(match[2], 4) if match else None,
+            })
+
+        for i, (request, result, found) in enumerate(zip(requests, results, landmarks)):
+            if i in errors:
+                results[i] = {'error': f"Recognition failed: {errors[i]}"}
+                continue
+            detector = self._detector(request['client'], request['received'])
+            try:
+                live, message = detector.evaluate(request['image'], found, now=request['received'])
+            except Exception as e:
+                logging.error(f"Liveness error for {request['client']}: {str(e)}")
+                live, message = False, "Error"
+            result['live'] = bool(live)
+            result['liveness'] = message
+            # Identity is only reported for the live face
+            tracked = result['faces'][0] if live and result['faces'] else {}
+            result['user_id'] = tracked.get('user_id')
+            result['name'] = tracked.get('name')
+        return results
+
+
+def decode_image(data):
+    """RGB array from JPEG or PNG bytes, downscaled like enrollment photos"""
+    import cv2
+
+    image = cv2.imdecode(np.frombuffer(data, dtype=np.uint8), cv2.IMREAD_COLOR)
+    if image is None:
+        raise ValueError("Body is not a JPEG or PNG image")
+    if image.shape[1] > MAX_ENCODE_WIDTH:
+        scale = MAX_ENCODE_WIDTH / image.shape[1]
+        image = cv2.resize(image, (MAX_ENCODE_WIDTH, int(image.shape[0] * scale)))
+    return cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
+
+
+class RecognitionService:
+    """HTTP front end: decodes frames on the request threads and batches the rest"""
+    def __init__(self, engine, host=DEFAULT_HOST, port=DEFAULT_PORT, max_batch=MAX_BATCH,
+                 max_wait_ms=MAX_WAIT_MS, max_queue=MAX_QUEUE):
+        self.engine = engine
+        self.batcher = DynamicBatcher(engine.handle_batch, max_batch, max_wait_ms, max_queue,
+                                      idle=engine.refresh_gallery)
+        self.latencies = deque(maxlen=LATENCY_WINDOW)
+        self.errors = 0
+        self.server = ThreadingHTTPServer((host, port), self._handler_class())
+        self.server.daemon_threads = True
+
+    @property
+    def address(self):
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def serve_forever(self):
+        self.batcher.start()
+        print(f"Recognition service listening on {self.address}")
+        try:
+            self.server.serve_forever()
+        finally:
+            self.close()
+
+    def start(self):
+        """Serve on a background thread, for load tests"""
+        self.batcher.start()
+        threading.Thread(target=self.server.serve_forever, name="recognition-http", daemon=True).start()
+        return self
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+        self.batcher.stop()
+
+    def stats(self):
+        latencies = np.array(self.latencies) if self.latencies else np.zeros(1)
+        return {
+            'gallery_faces': len(self.engine.gallery),
+            'sessions': len(self.engine.sessions),
+            'queue_depth': self.batcher.queue_depth(),
+            'batches': self.batcher.batches,
+            'requests': self.batcher.items,
+            'errors': self.errors,
+            'mean_batch_size': round(self.batcher.items / self.batcher.batches, 2) if self.batcher.batches else 0,
+            'batch_sizes': {str(size): count for size, count in sorted(self.batcher.batch_sizes.items())},
+            'latency_ms': {
+                'p50': round(float(np.percentile(latencies, 50)), 2),
+                'p95': round(float(np.percentile(latencies, 95)), 2),
+                'p99': round(float(np.percentile(latencies, 99)), 2),
+            },
+        }
+
+    def recognize(self, client, data, crop=False):
+        """Recognize one encoded image, returns the response dict"""
+        start = time.perf_counter()
+        received = time.monotonic()
+        image = decode_image(data)
+        decoded = time.perf_counter()
+        result, timing = self.batcher.submit({'client': client, 'image': image, 'crop': crop, 'received': received})
+        total = (time.perf_counter() - start) * 1000
+        self.latencies.append(total)
+        result['latency_ms'] = {
+            'decode': round((decoded - start) * 1000, 2),
+            'queue': timing['queue_ms'],
+            'batch': timing['batch_ms'],
+            'total': round(total, 2),
+        }
+        result['batch_size'] = timing['batch_size']
+        return result
+
+    def _handler_class(self):
+        service = self
+
+        class Handler(BaseHTTPRequestHandler):
+            # Keep-alive, a kiosk reuses its connection for every frame
+            protocol_version = 'HTTP/1.1'
+
+            def log_message(self, format, *args):
+                logging.debug(f"{self.address_string()} {format % args}")
+
+            def _reply(self, status, payload):
+                body = json.dumps(payload).encode('utf-8')
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def _query(self):
+                url = urlparse(self.path)
+                return url.path, {key: values[-1] for key, values in parse_qs(url.query).items()}
+
+            def do_GET(self):
+                path, _ = self._query()
+                if path == '/stats':
+                    self._reply(200, service.stats())
+                else:
+                    self._reply(404, {'error': 'Not found'})
+
+            def do_POST(self):
+                path, query = self._query()
+                length = int(self.headers.get('Content-Length') or 0)
+                if length > MAX_BODY_BYTES:
+                    self.close_connection = True
+                    self._reply(413, {'error': f"Image larger than {MAX_BODY_BYTES} bytes"})
+                    return
+                data = self.rfile.read(length)
+                client = query.get('client') or self.client_address[0]
+
+                if path == '/reset':
+                    service.engine.reset_session(client)
+                    self._reply(200, {'client': client, 'reset': True})
+                    return
+                if path != '/recognize':
+                    self._reply(404, {'error': 'Not found'})
+                    return
+                try:
+                    result = service.recognize(client, data, crop=query.get('crop') in ('1', 'true'))
+                    if 'error' in result:
+                        service.errors += 1
+                        self._reply(422, result)
+                    else:
+                        self._reply(200, result)
+                except ValueError as e:
+                    self._reply(400, {'error': str(e)})
+                except (QueueFull, BatcherStopped, TimeoutError) as e:
+                    service.errors += 1
+                    self._reply(503, {'error': str(e)})
+                except Exception as e:
+                    service.errors += 1
+                    logging.error(f"Recognition failed for {client}: {str(e)}")
+                    self._reply(500, {'error': 'Recognition failed'})
+
+        return Handler
+
+
+def _default_image():
+    """First enrolled photo, so a load test needs no arguments"""
+    from src.user_photos import USER_FACES_DIR
+
+    if os.path.isdir(USER_FACES_DIR):
+        for name in sorted(os.listdir(USER_FACES_DIR)):
+            if name.lower().endswith(('.jpg', '.jpeg', '.png')):
+                return os.path.join(USER_FACES_DIR, name)
+    return None
+
+
+def run_load_test(url, data, clients=8, requests=50, crop=False):
+    """Send `requests` images from each of `clients` threads, returns a summary"""
+    target = urlparse(url)
+    latencies = []
+    statuses = {}
+    lock = threading.Lock()
+
+    def client(number):
+        conn = http.client.HTTPConnection(target.hostname, target.port, timeout=REQUEST_TIMEOUT + 5)
+        path = f"/recognize?client=loadtest-{number}" + ("&crop=1" if crop else "")
+        try:
+            for _ in range(requests):
+                start = time.perf_counter()
+                conn.request('POST', path, body=data, headers={'Content-Type': 'application/octet-stream'})
+                response = conn.getresponse()
+                response.read()
+                elapsed = (time.perf_counter() - start) * 1000
+                with lock:
+                    latencies.append(elapsed)
+                    statuses[response.status] = statuses.get(response.status, 0) + 1
+        finally:
+            conn.close()
+
+    start = time.perf_counter()
+    threads = [threading.Thread(target=client, args=(i,)) for i in range(clients)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+
+    conn = http.client.HTTPConnection(target.hostname, target.port, timeout=5)
+    conn.request('GET', '/stats')
+    server_stats = json.loads(conn.getresponse().read())
+    conn.close()
+
+    latencies = np.array(latencies) if latencies else np.zeros(1)
+    return {
+        'requests': int(sum(statuses.values())),
+        'statuses': {str(status): count for status, count in sorted(statuses.items())},
+        'seconds': round(elapsed, 2),
+        'throughput': round(sum(statuses.values()) / elapsed, 1) if elapsed else 0.0,
+        'latency_ms': {
+            'p50': round(float(np.percentile(latencies, 50)), 1),
+            'p95': round(float(np.percentile(latencies, 95)), 1),
+            'p99': round(float(np.percentile(latencies, 99)), 1),
+            'max': round(float(latencies.max()), 1),
+        },
+        'mean_batch_size': server_stats.get('mean_batch_size'),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Local face recognition service")
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    for name in ('serve', 'loadtest'):
+        p = sub.add_parser(name)
+        p.add_argument('--host', default=DEFAULT_HOST)
+        p.add_argument('--port', type=int, default=DEFAULT_PORT)
+        p.add_argument('--max-batch', type=int, default=MAX_BATCH)
+        p.add_argument('--max-wait-ms', type=float, default=MAX_WAIT_MS)
+    load = sub.choices['loadtest']
+    load.add_argument('--url', help="Test a running service instead of starting one")
+    load.add_argument('--clients', type=int, default=8, help="Concurrent simulated kiosks")
+    load.add_argument('--requests', type=int, default=50, help="Requests per client")
+    load.add_argument('--image', help="Image to send (default: first enrolled photo)")
+    load.add_argument('--crop', action='store_true', help="Send the image as a face crop")
+    load.add_argument('--compare', action='store_true',
+                      help="Run once with batching off first, to show what batching gains")
+    args = parser.parse_args(argv)
+    if args.command == 'loadtest' and args.compare and args.url:
+        parser.error("--compare starts its own service, it can't be used with --url")
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+    if args.command == 'loadtest':
+        image = args.image or _default_image()
+        if image is None:
+            parser.error("No enrolled photos found, pass --image")
+        with open(image, 'rb') as f:
+            data = f.read()
+
+    if args.command == 'loadtest' and args.url:
+        print(f"Load test against {args.url}: {args.clients} clients x {args.requests} requests")
+        print(json.dumps(run_load_test(args.url, data, args.clients, args.requests, args.crop), indent=2))
+        return 0
+
+    from src.database import Database
+
+    engine = RecognitionEngine(Database())
+    engine.load()
+    if args.command == 'serve':
+        RecognitionService(engine, args.host, args.port, args.max_batch, args.max_wait_ms).serve_forever()
+        return 0
+
+    runs = [('batched', args.max_batch, args.max_wait_ms)]
+    if args.compare:
+        runs.insert(0, ('unbatched', 1, 0.0))
+    summaries = {}
+    for label, max_batch, max_wait_ms in runs:
+        engine.sessions.clear()
+        service = RecognitionService(engine, args.host, args.port, max_batch, max_wait_ms).start()
+        try:
+            print(f"Load test against {service.address} ({label}, max batch {max_batch}): "
+                  f"{args.clients} clients x {args.requests} requests")
+            summaries[label] = run_load_test(service.address, data, args.clients, args.requests, args.crop)
+            print(json.dumps(summaries[label], indent=2))
+        finally:
+            service.close()
+
+    if args.compare and summaries['unbatched']['throughput']:
+        gain = summaries['batched']['throughput'] / summaries['unbatched']['throughput']
+        print(f"Batching: {gain:.2f}x throughput, p95 {summaries['unbatched']['latency_ms']['p95']}ms -> "
+              f"{summaries['batched']['latency_ms']['p95']}ms")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,113 @@
+"""In-memory name index for the admin user list
+
+Every user is kept in a list sorted by name, plus two lookup structures:
+a sorted list of name words for prefix search with bisect, and a trigram
+table for substring search. A search touches only the candidate users,
+so it stays instant with thousands of users. Users are added, updated and
+removed one at a time after edits, the index is never rebuilt for them.
+"""
+import bisect
+from collections import defaultdict
+
+# Queries shorter than this use word prefix search, longer ones trigrams
+TRIGRAM_MIN = 3
+
+def _normalize(text):
+    return ' '.join(str(text or '').lower().split())
+
+
+def _trigrams(text):
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+class UserIndex:
+    def __init__(self):
+        self.users = {}      # user ID -> user row
+        self._order = []     # (name key, user ID), sorted
+        self._words = []     # (name word, user ID), sorted, for prefix search
+        self._trigrams = defaultdict(set)
+
+    def __len__(self):
+        return len(self.users)
+
+    def load(self, users):
+        """Replace the index contents with the given user rows"""
+        self.users = {}
+        self._order = []
+        self._words = []
+        self._trigrams = defaultdict(set)
+        for user in users:
+            key = _normalize(user['name'])
+            self.users[user['id']] = user
+            self._order.append((key, user['id']))
+            self._words.extend((word, user['id']) for word in key.split())
+            for trigram in _trigrams(key):
+                self._trigrams[trigram].add(user['id'])
+        self._order.sort()
+        self._words.sort()
+        return len(self.users)
+
+    def upsert(self, user):
+        """Add a user or replace their entry, returns their position in name order"""
+        self.remove(user['id'])
+        key = _normalize(user['name'])
+        self.users[user['id']] = user
+        position = bisect.bisect_left(self._order, (key, user['id']))
+        self._order.insert(position, (key, user['id']))
+        for word in key.split():
+            bisect.insort(self._words, (word, user['id']))
+        for trigram in _trigrams(key):
+            self._trigrams[trigram].add(user['id'])
+        return position
+
+    def remove(self, user_id):
+        """Drop a user if present"""
+        user = self.users.pop(user_id, None)
+        if user is None:
+            return False
+        key = _normalize(user['name'])
+        self._order.pop(bisect.bisect_left(self._order, (key, user_id)))
+        for word in key.split():
+            self._words.pop(bisect.bisect_left(self._words, (word, user_id)))
+        for trigram in _trigrams(key):
+            ids = self._trigrams[trigram]
+            ids.discard(user_id)
+            if not ids:
+                del self._trigrams[trigram]
+        return True
+
+    def sort_key(self, user_id):
+        return (_normalize(self.users[user_id]['name']), user_id)
+
+    def matches(self, user_id, query):
+        """Whether a user is part of the results for query"""
+        query = _normalize(query)
+        key = _normalize(self.users[user_id]['name'])
+        if len(query) < TRIGRAM_MIN:
+            return any(word.startswith(query) for word in key.split())
+        return query in key
+
+    def search(self, query):
+        """User IDs matching query, in name order
+
+        An empty query returns everyone. Short queries match the start of
+        any word of the name, longer ones any part of it.
+        """
+        query = _normalize(query)
+        if not query:
+            return [user_id for _, user_id in self._order]
+
+        if len(query) < TRIGRAM_MIN:
+            found = set()
+            start = bisect.bisect_left(self._words, (query,))
+            for word, user_id in self._words[start:]:
+                if not word.startswith(query):
+                    break
+                found.add(user_id)
+        else:
+            # Candidates share every trigram, confirm with a substring check
+            sets = sorted((self._trigrams.get(t, set()) for t in _trigrams(query)), key=len)
+            found = set(sets[0]).intersection(*sets[1:])
+            found = {user_id for user_id in found if query in _normalize(self.users[user_id]['name'])}
+
+        return sorted(found, key=self.sort_key)
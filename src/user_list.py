@@ -0,0 +1,219 @@
+"""Lazily filled user list for the admin panel
+
+All users are held in a UserIndex, but only the rows the admin scrolls to
+are inserted into the Treeview, a chunk at a time. Thumbnails are loaded
+only for rows on screen and kept in a small LRU cache, rows whose image
+is evicted lose it until they are scrolled into view again. Adding,
+editing or deleting a user changes just that row.
+"""
+import bisect
+import os
+from collections import OrderedDict
+
+from src.user_index import UserIndex
+from src.user_photos import USER_FACES_DIR, thumbnail_path
+
+# Rows inserted per chunk while scrolling
+USER_CHUNK = 200
+
+# Insert the next chunk once the scrollbar passes this fraction
+PREFETCH_AT = 0.9
+
+# Thumbnail size in the list and number of thumbnails kept in memory
+THUMB_DISPLAY = 32
+THUMB_CACHE_SIZE = 256
+
+ROW_HEIGHT = THUMB_DISPLAY + 6
+
+class ThumbnailCache:
+    """LRU cache of Tk thumbnail images keyed by photo filename"""
+    def __init__(self, size=THUMB_CACHE_SIZE, on_evict=None):
+        self.size = size
+        self.on_evict = on_evict
+        self._images = OrderedDict()
+
+    def get(self, photo_name):
+        """Thumbnail image for a stored photo, None if it cannot be loaded"""
+        if photo_name in self._images:
+            self._images.move_to_end(photo_name)
+            return self._images[photo_name]
+
+        image = self._load(photo_name)
+        self._images[photo_name] = image
+        while len(self._images) > self.size:
+            evicted = next(iter(self._images))
+            # Let rows stop using the image before Tk frees it
+            if self.on_evict:
+                self.on_evict(evicted)
+            del self._images[evicted]
+        return image
+
+    def discard(self, photo_name):
+        self._images.pop(photo_name, None)
+
+    def _load(self, photo_name):
+        from PIL import Image, ImageTk
+
+        # Photos stored before thumbnails existed are scaled from the original
+        for path in (thumbnail_path(photo_name), os.path.join(USER_FACES_DIR, photo_name)):
+            if not os.path.isfile(path):
+                continue
+            try:
+                with Image.open(path) as img:
+                    img.draft('RGB', (THUMB_DISPLAY, THUMB_DISPLAY))
+                    img = img.convert('RGB')
+                    img.thumbnail((THUMB_DISPLAY, THUMB_DISPLAY))
+                    return ImageTk.PhotoImage(img)
+            except Exception as e:
+                print(f"Error loading thumbnail {photo_name}: {str(e)}")
+        return None
+
+
+class UserListView:
+    """Users in a Treeview, filled while scrolling and searchable by name"""
+    def __init__(self, db, tree, scrollbar, status_label=None, chunk_size=USER_CHUNK):
+        self.db = db
+        self.tree = tree
+        self.scrollbar = scrollbar
+        self.status_label = status_label
+        self.chunk_size = chunk_size
+
+        self.index = UserIndex()
+        self.thumbnails = ThumbnailCache(on_evict=self._drop_thumbnail)
+        self.query = ''
+        self.results = []   # matching user IDs in name order
+        self.loaded = 0     # how many of them are in the tree
+        self._shown = {}    # photo filename -> rows showing its thumbnail
+        self._thumbs_pending = False
+        self._more_pending = False
+
+        self.tree.configure(yscrollcommand=self.on_scroll)
+
+    def reload(self):
+        """Read all users from the database and show the first chunk"""
+        self.index.load(self.db.get_users())
+        self.search(self.query)
+
+    def search(self, query):
+        """Show the users matching query"""
+        self.query = query.strip()
+        self.results = self.index.search(self.query)
+        self.tree.delete(*self.tree.get_children())
+        self.tree.yview_moveto(0)
+        self.loaded = 0
+        self._shown = {}
+        self.load_more()
+
+    def load_more(self):
+        """Insert the next chunk of results"""
+        self._more_pending = False
+        end = min(self.loaded + self.chunk_size, len(self.results))
+        for user_id in self.results[self.loaded:end]:
+            self.tree.insert('', 'end', iid=str(user_id), values=self._values(user_id))
+        self.loaded = end
+        self.update_status()
+        self.schedule_thumbnails()
+
+    def refresh_user(self, user_id):
+        """Re-read one user after it was added or edited"""
+        user = self.db.get_user_by_id(user_id)
+        if user is None:
+            self.remove_user(user_id)
+            return
+        old = self.index.users.get(user_id)
+        if old is not None and old['photo_path'] != user['photo_path']:
+            self._drop_thumbnail(old['photo_path'])
+            self.thumbnails.discard(old['photo_path'])
+        self.index.upsert(user)
+        self._place(user_id)
+
+    def remove_user(self, user_id):
+        """Drop a deleted user from the list"""
+        user = self.index.users.get(user_id)
+        if user is not None:
+            self._drop_thumbnail(user['photo_path'])
+            self.thumbnails.discard(user['photo_path'])
+        self.index.remove(user_id)
+        self._take_out(user_id)
+        self.update_status()
+
+    def _take_out(self, user_id):
+        """Remove a user from the results and the tree"""
+        if user_id in self.results:
+            position = self.results.index(user_id)
+            self.results.pop(position)
+            if position < self.loaded:
+                self.tree.delete(str(user_id))
+                self.loaded -= 1
+
+    def _place(self, user_id):
+        """Put a changed user at its sorted position if it matches the search"""
+        iid = str(user_id)
+        self._take_out(user_id)
+
+        if self.index.matches(user_id, self.query):
+            keys = [self.index.sort_key(other) for other in self.results]
+            position = bisect.bisect_left(keys, self.index.sort_key(user_id))
+            self.results.insert(position, user_id)
+            # Rows past the loaded part are inserted when scrolled to
+            if position < self.loaded or self.loaded == len(self.results) - 1:
+                self.tree.insert('', position, iid=iid, values=self._values(user_id))
+                self.loaded += 1
+                self.tree.see(iid)
+                self.tree.selection_set(iid)
+        self.update_status()
+        self.schedule_thumbnails()
+
+    def _values(self, user_id):
+        user = self.index.users[user_id]
+        return (user['id'], user['name'], user['photo_path'], user['created_at'])
+
+    def on_scroll(self, first, last):
+        """Scrollbar callback, inserts more rows near the bottom"""
+        self.scrollbar.set(first, last)
+        if float(last) >= PREFETCH_AT and self.loaded < len(self.results) and not self._more_pending:
+            # Defer so the insert does not run inside the scroll callback
+            self._more_pending = True
+            self.tree.after_idle(self.load_more)
+        self.schedule_thumbnails()
+
+    def schedule_thumbnails(self):
+        if not self._thumbs_pending:
+            self._thumbs_pending = True
+            self.tree.after_idle(self.show_thumbnails)
+
+    def show_thumbnails(self):
+        """Load thumbnails for the rows currently on screen"""
+        self._thumbs_pending = False
+        if not self.tree.winfo_exists():
+            return
+        height = self.tree.winfo_height()
+        seen = set()
+        for y in range(0, max(height, ROW_HEIGHT), ROW_HEIGHT // 2):
+            iid = self.tree.identify_row(y)
+            if not iid or iid in seen:
+                continue
+            seen.add(iid)
+            user = self.index.users.get(int(iid))
+            if user is None or self.tree.item(iid, 'image'):
+                continue
+            image = self.thumbnails.get(user['photo_path'])
+            if image is not None:
+                self.tree.item(iid, image=image)
+                self._shown.setdefault(user['photo_path'], set()).add(iid)
+
+    def _drop_thumbnail(self, photo_name):
+        """Clear rows showing a thumbnail that is about to be freed"""
+        for iid in self._shown.pop(photo_name, ()):
+            if self.tree.exists(iid):
+                self.tree.item(iid, image='')
+
+    def update_status(self):
+        if self.status_label is not None:
+            total = len(self.index)
+            if self.query:
+                text = f"{len(self.results)} dari {total} user cocok"
+            else:
+                text = f"{total} user"
+            self.status_label.config(text=text)
+
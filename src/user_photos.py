@@ -0,0 +1,119 @@
+import os
+
+USER_FACES_DIR = os.path.join("data", "user_faces")
+THUMBS_DIR = os.path.join(USER_FACES_DIR, "thumbs")
+
+# Stored photos are square, eye-aligned face crops of at most this size
+FACE_CROP_SIZE = 400
+THUMB_SIZE = 96
+JPEG_QUALITY = 90
+
+# Margin around the detected face box, as a fraction of its size
+FACE_MARGIN = 0.5
+
+# Photos are downscaled to this width for face detection
+DETECT_WIDTH = 800
+
+class PhotoRejected(ValueError):
+    """Photo cannot be used for enrollment, message is shown to the admin"""
+
+
+def unique_photo_name(name, photo_ext, taken=()):
+    """Photo filename derived from user name, with counter for duplicates
+
+    Names in `taken` count as used even if no file exists yet.
+    """
+    base_name = name.lower().replace(' ', '_')
+    photo_name = f"{base_name}{photo_ext}"
+    counter = 1
+    while photo_name in taken or os.path.exists(os.path.join(USER_FACES_DIR, photo_name)):
+        photo_name = f"{base_name}_{counter}{photo_ext}"
+        counter += 1
+    return photo_name
+
+
+def normalize_face_photo(source_path):
+    """Detect the single face in a photo, returns an aligned RGB crop
+
+    The photo is rotated so the eyes are level, cropped to a square around
+    the face and capped at FACE_CROP_SIZE. Raises PhotoRejected when the
+    photo has no face or more than one.
+    """
+    # Heavy imports, only needed when enrolling
+    import cv2
+    import numpy as np
+    import face_recognition
+
+    try:
+        image = face_recognition.load_image_file(source_path)
+    except Exception:
+        raise PhotoRejected("Foto tidak dapat dibaca")
+
+    # Detect on a downscaled copy, map results back to full size
+    scale = min(1.0, DETECT_WIDTH / image.shape[1])
+    small = cv2.resize(image, None, fx=scale, fy=scale) if scale < 1.0 else image
+    locations = face_recognition.face_locations(small)
+    if not locations:
+        raise PhotoRejected("Tidak ada wajah terdeteksi di foto")
+    if len(locations) > 1:
+        raise PhotoRejected(f"Terdeteksi {len(locations)} wajah, foto harus berisi satu wajah")
+
+    top, right, bottom, left = (value / scale for value in locations[0])
+    face_size = max(right - left, bottom - top)
+    center = ((left + right) / 2, (top + bottom) / 2)
+
+    # Level the eyes when landmarks are found
+    angle = 0.0
+    landmarks = face_recognition.face_landmarks(small, locations)
+    if landmarks and 'left_eye' in landmarks[0] and 'right_eye' in landmarks[0]:
+        left_eye = np.mean(landmarks[0]['left_eye'], axis=0) / scale
+        right_eye = np.mean(landmarks[0]['right_eye'], axis=0) / scale
+        dx, dy = right_eye - left_eye
+        angle = float(np.degrees(np.arctan2(dy, dx)))
+        # Center slightly below the eyes, perpendicular to the eye line
+        down = np.array([-dy, dx]) / max(np.hypot(dx, dy), 1e-6)
+        center = tuple((left_eye + right_eye) / 2 + down * face_size * 0.15)
+
+    # Rotate about the face and cut out the square in one affine warp
+    crop_size = int(face_size * (1 + 2 * FACE_MARGIN))
+    output_size = min(crop_size, FACE_CROP_SIZE)
+    matrix = cv2.getRotationMatrix2D(center, angle, output_size / crop_size)
+    matrix[0, 2] += output_size / 2 - center[0]
+    matrix[1, 2] += output_size / 2 - center[1]
+    return cv2.warpAffine(
+        image, matrix, (output_size, output_size),
+        flags=cv2.INTER_LINEAR, borderMode=cv2.BORDER_REPLICATE
+    )
+
+
+def save_user_photo(face_image, name, photo_name=None):
+    """Save a normalized RGB face crop and its thumbnail, returns filename
+
+    The filename is derived from `name` unless `photo_name` is given.
+    """
+    import cv2
+
+    os.makedirs(THUMBS_DIR, exist_ok=True)
+    photo_name = photo_name or unique_photo_name(name, ".jpg")
+    bgr = cv2.cvtColor(face_image, cv2.COLOR_RGB2BGR)
+    params = [cv2.IMWRITE_JPEG_QUALITY, JPEG_QUALITY]
+    cv2.imwrite(os.path.join(USER_FACES_DIR, photo_name), bgr, params)
+    thumb = cv2.resize(bgr, (THUMB_SIZE, THUMB_SIZE), interpolation=cv2.INTER_AREA)
+    cv2.imwrite(thumbnail_path(photo_name), thumb, params)
+    return photo_name
+
+
+def store_user_photo(source_path, name):
+    """Normalize a photo into the user faces folder, returns stored filename"""
+    return save_user_photo(normalize_face_photo(source_path), name)
+
+
+def thumbnail_path(photo_name):
+    return os.path.join(THUMBS_DIR, photo_name)
+
+
+def remove_user_photo(photo_name):
+    """Delete a stored photo and its thumbnail if they exist"""
+    for path in (os.path.join(USER_FACES_DIR, photo_name), thumbnail_path(photo_name)):
+        if os.path.exists(path):
+            os.remove(path)
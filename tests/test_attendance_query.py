@@ -0,0 +1,66 @@
+import os
+import tempfile
+import unittest
+
+from src.database import ATTENDANCE_SORT_KEYS, Database
+
+class KeysetPaginationTest(unittest.TestCase):
+    def setUp(self):
+        self._cwd = os.getcwd()
+        self._tmp = tempfile.TemporaryDirectory()
+        os.chdir(self._tmp.name)
+        self.db = Database(os.path.join(self._tmp.name, 'attendance.db'))
+        users = [self.db.add_user(name, f'{name}.jpg', '-5.1486,119.4319', '-5.1355,119.4238')
+                 for name in ('Ani', 'Budi', 'Citra')]
+        today = self.db._local_now().strftime('%Y-%m-%d')
+        dates = [f'2020-01-{day}' for day in range(10, 14)] + [f'2020-02-{day}' for day in range(10, 13)] + [today]
+        # Repeated names, modes and times make ties the id has to break
+        with self.db._transaction() as cursor:
+            for i, (date, user_id) in enumerate((date, user_id) for date in dates for user_id in users):
+                cursor.execute("""
+                    INSERT INTO attendance (user_id, date, time_in, mode, status)
+                    VALUES (?, ?, ?, ?, ?)
+                """, (user_id, date, f"0{7 + i % 2}:00:00", ('WFO', 'WFH')[i % 2], ('Present', 'Late')[i % 5 == 0]))
+        # Pages have to cross the hot database and two archives
+        self.assertEqual(self.db.archive_closed_months(keep_months=1), ['2020-01', '2020-02'])
+        self.total = len(dates) * len(users)
+
+    def tearDown(self):
+        self.db.close()
+        os.chdir(self._cwd)
+        self._tmp.cleanup()
+
+    def pages(self, **kwargs):
+        ids, after, calls = [], None, 0
+        while True:
+            records, after = self.db.query_attendance(after=after, limit=2, **kwargs)
+            ids.extend(record['id'] for record in records)
+            calls += 1
+            self.assertLess(calls, 50)
+            if after is None:
+                return ids
+
+    def test_pages_follow_one_full_query(self):
+        for sort in ATTENDANCE_SORT_KEYS:
+            for descending in (True, False):
+                with self.subTest(sort=sort, descending=descending):
+                    full, next_key = self.db.query_attendance(limit=1000, sort=sort, descending=descending)
+                    self.assertIsNone(next_key)
+                    self.assertEqual(len(full), self.total)
+                    self.assertEqual(self.pages(sort=sort, descending=descending), [r['id'] for r in full])
+
+    def test_full_query_is_sorted(self):
+        for sort, columns in ATTENDANCE_SORT_KEYS.items():
+            records, _ = self.db.query_attendance(limit=1000, sort=sort)
+            keys = [tuple(r[key] for _, key in columns) + (r['id'],) for r in records]
+            self.assertEqual(keys, sorted(keys, reverse=True))
+
+    def test_pages_with_filters(self):
+        full, _ = self.db.query_attendance(limit=1000, mode='WFH', sort='name', descending=False)
+        self.assertTrue(full)
+        self.assertTrue(all(r['mode'] == 'WFH' for r in full))
+        self.assertEqual(self.pages(mode='WFH', sort='name', descending=False), [r['id'] for r in full])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,50 @@
+import os
+import tempfile
+import unittest
+from datetime import datetime
+from unittest import mock
+
+from src.database import Database
+
+class DailySummaryTest(unittest.TestCase):
+    def setUp(self):
+        self._cwd = os.getcwd()
+        self._tmp = tempfile.TemporaryDirectory()
+        os.chdir(self._tmp.name)
+        self.db = Database(os.path.join(self._tmp.name, 'attendance.db'))
+        self.users = [
+            self.db.add_user(name, f'{name}.jpg', '-5.1486,119.4319', '-5.1355,119.4238')
+            for name in ('Ani', 'Budi')
+        ]
+
+    def tearDown(self):
+        self.db.close()
+        os.chdir(self._cwd)
+        self._tmp.cleanup()
+
+    def scan(self, user_id, when):
+        self.db._attendees_today.clear()
+        with mock.patch.object(self.db, '_local_now', return_value=when):
+            return self.db.record_attendance(user_id, 'WFO', 'Present', '-5.1355,119.4238')
+
+    def summary(self):
+        return [tuple(row) for row in self.db.conn.execute(
+            "SELECT * FROM attendance_daily ORDER BY user_id, date")]
+
+    def test_incremental_summary_matches_rebuild(self):
+        ani, budi = self.users
+        self.assertEqual(self.scan(ani, datetime(2024, 5, 6, 7, 55)), 'check_in')
+        self.assertEqual(self.scan(ani, datetime(2024, 5, 6, 12, 0)), 'check_out')
+        self.assertEqual(self.scan(ani, datetime(2024, 5, 6, 17, 5)), 'check_out')
+        self.scan(budi, datetime(2024, 5, 6, 8, 10))
+        self.scan(ani, datetime(2024, 5, 7, 8, 0))
+
+        incremental = self.summary()
+        self.assertEqual([row[-1] for row in incremental], [3, 1, 1])
+
+        self.db.rebuild_daily_summary()
+        self.assertEqual(self.summary(), incremental)
+
+
+if __name__ == "__main__":
+    unittest.main()
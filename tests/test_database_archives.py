@@ -0,0 +1,53 @@
+import os
+import tempfile
+import unittest
+
+from src.database import Database
+
+# More archived months than SQLite can attach to one connection at once
+ARCHIVED_MONTHS = 12
+
+class ArchivedAttendanceTest(unittest.TestCase):
+    def setUp(self):
+        self._cwd = os.getcwd()
+        self._tmp = tempfile.TemporaryDirectory()
+        # Database writes data/ and database.log relative to the working directory
+        os.chdir(self._tmp.name)
+        self.db = Database(os.path.join(self._tmp.name, 'attendance.db'))
+        user_id = self.db.add_user('Ani', 'ani.jpg', '-5.1486,119.4319', '-5.1355,119.4238')
+        with self.db._transaction() as cursor:
+            for month in range(1, ARCHIVED_MONTHS + 1):
+                cursor.execute("""
+                    INSERT INTO attendance (user_id, date, time_in, mode, status, location)
+                    VALUES (?, ?, '08:00:00', 'WFO', 'Present', '-5.1355,119.4238')
+                """, (user_id, f"2020-{month:02d}-15"))
+        self.assertEqual(len(self.db.archive_closed_months(keep_months=1)), ARCHIVED_MONTHS)
+
+    def tearDown(self):
+        self.db.close()
+        os.chdir(self._cwd)
+        self._tmp.cleanup()
+
+    def test_reads_every_archived_month(self):
+        self.assertEqual(self.db.count_attendance(), ARCHIVED_MONTHS)
+        self.assertEqual(len(self.db.get_attendance()), ARCHIVED_MONTHS)
+        self.assertEqual(self.db.attendance_export_stats()['count'], ARCHIVED_MONTHS)
+
+        records, _ = self.db.query_attendance(limit=100)
+        self.assertEqual([r['date'] for r in records],
+                         [f"2020-{month:02d}-15" for month in range(ARCHIVED_MONTHS, 0, -1)])
+        records, _ = self.db.query_attendance(limit=100, sort='name')
+        self.assertEqual(len(records), ARCHIVED_MONTHS)
+
+    def test_rebuilds_summary_from_every_archive(self):
+        self.assertEqual(self.db.rebuild_daily_summary(), ARCHIVED_MONTHS)
+        self.assertEqual(len(self.db.get_daily_summary()), ARCHIVED_MONTHS)
+
+    def test_archives_are_detached_after_use(self):
+        list(self.db.iter_attendance())
+        attached = self.db._reader().execute("PRAGMA database_list").fetchall()
+        self.assertEqual([row['name'] for row in attached], ['main'])
+
+
+if __name__ == "__main__":
+    unittest.main()
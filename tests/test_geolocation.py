@@ -0,0 +1,53 @@
+import unittest
+
+import numpy as np
+
+from src.geolocation import SiteIndex, haversine
+
+class SiteIndexTest(unittest.TestCase):
+    def setUp(self):
+        rng = np.random.default_rng(7)
+        # A dense cluster around Makassar plus sites spread over Indonesia
+        self.lats = np.concatenate([rng.normal(-5.15, 0.05, 300), rng.uniform(-10, 5, 60)])
+        self.lons = np.concatenate([rng.normal(119.43, 0.05, 300), rng.uniform(95, 140, 60)])
+        self.names = [f"site{i}" for i in range(len(self.lats))]
+        self.index = SiteIndex(self.names, self.lats, self.lons)
+        self.points = np.column_stack([rng.uniform(-11, 6, 40), rng.uniform(94, 141, 40)])
+        self.points[:20] = np.column_stack([rng.normal(-5.15, 0.08, 20), rng.normal(119.43, 0.08, 20)])
+
+    def brute_force(self, lat, lon):
+        distances = haversine(lat, lon, self.lats, self.lons)
+        return [(self.names[i], distances[i]) for i in np.argsort(distances)]
+
+    def test_nearest_matches_brute_force(self):
+        for lat, lon in self.points:
+            for k in (1, 5):
+                expected = self.brute_force(lat, lon)[:k]
+                found = self.index.nearest(lat, lon, k)
+                self.assertEqual([name for name, _ in found], [name for name, _ in expected])
+                np.testing.assert_allclose([m for _, m in found], [m for _, m in expected])
+
+    def test_within_matches_brute_force(self):
+        for lat, lon in self.points:
+            for radius_m in (1000.0, 30000.0):
+                expected = [(name, m) for name, m in self.brute_force(lat, lon) if m <= radius_m]
+                found = self.index.within(lat, lon, radius_m)
+                self.assertEqual([name for name, _ in found], [name for name, _ in expected])
+
+    def test_nearest_many_matches_nearest(self):
+        names, meters = self.index.nearest_many(self.points[:, 0], self.points[:, 1], chunk_size=7)
+        for (lat, lon), name, distance in zip(self.points, names, meters):
+            self.assertEqual(name, self.index.nearest(lat, lon)[0][0])
+            self.assertAlmostEqual(distance, self.brute_force(lat, lon)[0][1])
+
+    def test_invalid_sites_and_points(self):
+        index = SiteIndex(['a', 'bad', 'b'], [-5.1, np.nan, -5.2], [119.4, 119.4, 119.5])
+        self.assertEqual(len(index), 2)
+        names, meters = index.nearest_many([np.nan, -5.1], [119.4, 119.4])
+        self.assertEqual(names, [None, 'a'])
+        self.assertTrue(np.isnan(meters[0]))
+        self.assertEqual(SiteIndex([], [], []).nearest(-5.1, 119.4), [])
+
+
+if __name__ == "__main__":
+    unittest.main()
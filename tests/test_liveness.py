@@ -0,0 +1,141 @@
+import time
+import unittest
+
+import numpy as np
+
+from src.anti_spoofing import MAX_SKIPPED_FRAMES, AntiSpoofingDetector, LivenessScheduler
+from src.liveness_cues import BlinkCue, LivenessCue, MovementCue, TextureCue
+from src.liveness_replay import replay
+
+class SleepCue(LivenessCue):
+    """Cue that takes a fixed time per update and counts its runs"""
+    def __init__(self, name, cost, seconds):
+        super().__init__()
+        self.name = self.label = name
+        self.cost = cost
+        self.seconds = seconds
+        self.runs = 0
+
+    def update(self, frame, landmarks, now):
+        self.runs += 1
+        time.sleep(self.seconds)
+        return self.score
+
+
+class LivenessSchedulerTest(unittest.TestCase):
+    def run_frames(self, scheduler, frames):
+        for i in range(frames):
+            scheduler.run(None, {}, float(i), time.perf_counter(), live_threshold=1.0)
+
+    def test_slow_cue_skips_then_runs_again(self):
+        slow = SleepCue('slow', 'expensive', 0.03)
+        scheduler = LivenessScheduler([slow], frame_budget_ms=20.0)
+
+        # The first run measures 30ms, over the budget
+        self.run_frames(scheduler, 1)
+        self.assertEqual(slow.runs, 1)
+
+        self.run_frames(scheduler, 1)
+        self.assertEqual(slow.runs, 1)
+        self.assertEqual(scheduler.skipped['slow'], 1)
+
+        self.run_frames(scheduler, MAX_SKIPPED_FRAMES)
+        self.assertEqual(slow.runs, 2)
+
+    def test_cue_that_fits_runs_every_frame(self):
+        cheap = SleepCue('cheap', 'cheap', 0.0)
+        texture = SleepCue('texture', 'expensive', 0.002)
+        scheduler = LivenessScheduler([cheap, texture], frame_budget_ms=40.0)
+        self.run_frames(scheduler, 10)
+        self.assertEqual(cheap.runs, 10)
+        self.assertEqual(texture.runs, 10)
+
+    def test_landmark_detection_is_not_charged_to_the_budget(self):
+        texture = SleepCue('texture', 'expensive', 0.002)
+        detector = AntiSpoofingDetector(cues=[texture], frame_budget_ms=40.0)
+        detector.check_interval = 0.0
+
+        def slow_detection(frame):
+            time.sleep(0.045)  # HOG detection alone can exceed the budget
+            return {'nose_bridge': [(0, 0)]}
+        detector.detect_landmarks = slow_detection
+
+        frame = np.zeros((8, 8, 3), dtype=np.uint8)
+        for _ in range(4):
+            detector.check_liveness(frame)
+        self.assertEqual(texture.runs, 4)
+
+
+class LivenessDecisionTest(unittest.TestCase):
+    def decide(self, movement=False, blink=False, texture_score=0.0):
+        detector = AntiSpoofingDetector()
+        cues = {cue.name: cue for cue in detector.cues}
+        cues['movement'].score = 1.0 if movement else 0.0
+        cues['movement'].passed = movement
+        cues['blink'].score = 1.0 if blink else 0.0
+        cues['blink'].passed = blink
+        cues['texture'].score = texture_score
+        scheduler = detector.scheduler
+        return scheduler.combined_score() >= detector.live_threshold and scheduler.required_passed()
+
+    def test_movement_alone_is_not_enough(self):
+        self.assertFalse(self.decide(movement=True))
+
+    def test_movement_and_blink_pass(self):
+        self.assertTrue(self.decide(movement=True, blink=True))
+
+    def test_movement_and_passing_texture_pass(self):
+        self.assertTrue(self.decide(movement=True, texture_score=TextureCue().pass_threshold))
+
+    def test_blink_and_texture_need_movement(self):
+        self.assertFalse(self.decide(blink=True, texture_score=1.0))
+
+
+class CueTest(unittest.TestCase):
+    @staticmethod
+    def face(nose_x=50.0, eye_open=True):
+        height = 4.0 if eye_open else 0.5
+        eye = [(0, 0), (3, -height), (7, -height), (10, 0), (7, height), (3, height)]
+        return {
+            'nose_bridge': [(nose_x, 50.0), (nose_x, 60.0)],
+            'left_eye': [(x + 20, y + 40) for x, y in eye],
+            'right_eye': [(x + 70, y + 40) for x, y in eye],
+        }
+
+    def test_movement_needs_two_moves_within_window(self):
+        cue = MovementCue(movement_threshold=0.15, required_movements=2, window_seconds=3.0)
+        for t, x in [(0.0, 50), (0.3, 70), (0.6, 90)]:
+            cue.update(None, self.face(x), t)
+        self.assertTrue(cue.passed)
+
+        cue = MovementCue(movement_threshold=0.15, required_movements=2, window_seconds=3.0)
+        for t in (0.0, 0.3, 0.6, 0.9):
+            cue.update(None, self.face(), t)
+        self.assertFalse(cue.passed)
+
+    def test_blink_counts_closed_then_open(self):
+        cue = BlinkCue()
+        for t, is_open in [(0.0, True), (0.1, False), (0.2, True)]:
+            cue.update(None, self.face(eye_open=is_open), t)
+        self.assertTrue(cue.passed)
+
+        cue = BlinkCue(max_closed_seconds=1.0)
+        for t, is_open in [(0.0, True), (0.1, False), (2.0, True)]:
+            cue.update(None, self.face(eye_open=is_open), t)
+        self.assertFalse(cue.passed)
+
+
+class ReplayTest(unittest.TestCase):
+    def test_replay_drops_frames_inside_check_interval(self):
+        frames = [{'t': i * 0.05, 'landmarks': None, 'landmark_ms': 30.0} for i in range(10)]
+        recording = {'path': 'clip', 'label': 'spoof', 'frames': frames, 'clip': None}
+        result = replay(recording)
+
+        # The kiosk checks every 100ms, so only every other 50ms frame runs
+        self.assertEqual(len(result['frame_ms']), 5)
+        self.assertTrue(all(ms >= 30.0 for ms in result['frame_ms']))
+        self.assertFalse(result['passed'])
+
+
+if __name__ == "__main__":
+    unittest.main()
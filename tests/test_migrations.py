@@ -0,0 +1,126 @@
+import os
+import sqlite3
+import tempfile
+import time
+import unittest
+
+from src.database import Database
+from src.geofence import site_location
+from src.migrations import LATEST_VERSION, MIGRATIONS, SEED_CITIES, SEED_OFFICES, apply_migrations, get_version
+
+def build_database(path, version):
+    """Database at an older schema version, as an old install left it"""
+    conn = sqlite3.connect(path)
+    cursor = conn.cursor()
+    for number, _, upgrade in MIGRATIONS:
+        if number > version:
+            break
+        upgrade(cursor)
+    cursor.execute(f"PRAGMA user_version = {version}")
+    conn.commit()
+    return conn
+
+
+class MigrationTest(unittest.TestCase):
+    def setUp(self):
+        self._cwd = os.getcwd()
+        self._tz = os.environ.get('TZ')
+        self._tmp = tempfile.TemporaryDirectory()
+        os.chdir(self._tmp.name)
+        # Kiosks run at UTC+8
+        os.environ['TZ'] = 'Asia/Makassar'
+        time.tzset()
+        self.path = os.path.join(self._tmp.name, 'attendance.db')
+
+    def tearDown(self):
+        if self._tz is None:
+            os.environ.pop('TZ', None)
+        else:
+            os.environ['TZ'] = self._tz
+        time.tzset()
+        os.chdir(self._cwd)
+        self._tmp.cleanup()
+
+
+class BaselineUpgradeTest(MigrationTest):
+    def test_baseline_database_upgrades_to_latest(self):
+        # Schema and data as written before migrations existed, version 0
+        conn = build_database(self.path, 1)
+        conn.execute("PRAGMA user_version = 0")
+        home = site_location(*SEED_CITIES['Makassar'])
+        office = site_location(*SEED_OFFICES['Kantor Walikota Makassar'])
+        conn.execute("INSERT INTO users (name, photo_path, home_location, office_location) VALUES ('Ani', 'ani.jpg', ?, ?)",
+                     (home, office))
+        # One row per scan, UTC clock
+        conn.executemany("""
+            INSERT INTO attendance (user_id, date, time_in, mode, status, location)
+            VALUES (1, '2024-05-06', ?, 'WFO', 'Present', ?)
+        """, [('00:30:00', office), ('04:00:00', office), ('09:00:00', office)])
+        conn.commit()
+        conn.close()
+
+        db = Database(self.path)
+        try:
+            self.assertEqual(get_version(db.conn), LATEST_VERSION)
+            self.assertEqual(apply_migrations(db), [])
+
+            indexes = {row['name'] for row in db.conn.execute("SELECT name FROM sqlite_master WHERE type = 'index'")}
+            self.assertTrue({'idx_attendance_user_day', 'idx_attendance_date_time',
+                             'idx_attendance_daily_date_mode', 'idx_attendance_lat_lon'} <= indexes)
+
+            row = db.conn.execute("SELECT * FROM attendance").fetchall()
+            self.assertEqual(len(row), 1)
+            self.assertEqual((row[0]['date'], row[0]['time_in'], row[0]['time_out'], row[0]['scan_count']),
+                             ('2024-05-06', '08:30:00', '17:00:00', 3))
+            self.assertEqual((row[0]['lat'], row[0]['lon']), SEED_OFFICES['Kantor Walikota Makassar'])
+
+            daily = db.conn.execute("SELECT first_in, last_out, event_count FROM attendance_daily").fetchall()
+            self.assertEqual([tuple(r) for r in daily], [('08:30:00', '17:00:00', 3)])
+
+            user = db.get_user_by_id(1)
+            self.assertIsNotNone(user['home_site_id'])
+            self.assertIsNotNone(user['office_site_id'])
+            self.assertEqual((user['home_lat'], user['home_lon']), SEED_CITIES['Makassar'])
+        finally:
+            db.close()
+
+    def test_newer_database_is_refused(self):
+        build_database(self.path, LATEST_VERSION + 1).close()
+        with self.assertRaises(RuntimeError):
+            Database(self.path)
+
+
+class LocalTimesMigrationTest(MigrationTest):
+    def test_utc_rows_move_to_local_days(self):
+        conn = build_database(self.path, 10)
+        conn.execute("INSERT INTO users (name, photo_path) VALUES ('Ani', 'ani.jpg')")
+        # 23:30 UTC is 07:30 local the next day, 01:00 UTC that day is 09:00
+        conn.executemany("""
+            INSERT INTO attendance (user_id, date, time_in, time_out, mode, status)
+            VALUES (1, ?, ?, ?, 'WFO', 'Present')
+        """, [('2024-05-05', '02:00:00', '23:30:00'), ('2024-05-06', '01:00:00', None)])
+        conn.executemany("""
+            INSERT INTO attendance_daily (user_id, date, first_in, last_out, mode, status, event_count)
+            VALUES (1, ?, ?, ?, 'WFO', 'Present', ?)
+        """, [('2024-05-05', '02:00:00', '23:30:00', 3), ('2024-05-06', '01:00:00', None, 1)])
+        conn.commit()
+        conn.close()
+
+        db = Database(self.path)
+        try:
+            self.assertEqual(get_version(db.conn), LATEST_VERSION)
+            rows = [tuple(row) for row in db.conn.execute(
+                "SELECT date, time_in, time_out, scan_count FROM attendance ORDER BY date")]
+            self.assertEqual(rows, [
+                ('2024-05-05', '10:00:00', None, 1),
+                ('2024-05-06', '07:30:00', '09:00:00', 3),
+            ])
+            summary = [tuple(row) for row in db.conn.execute(
+                "SELECT date, first_in, last_out, event_count FROM attendance_daily ORDER BY date")]
+            self.assertEqual(summary, rows)
+        finally:
+            db.close()
+
+
+if __name__ == "__main__":
+    unittest.main()
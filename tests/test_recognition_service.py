@@ -0,0 +1,135 @@
+import sys
+import threading
+import types
+import unittest
+from unittest import mock
+
+import numpy as np
+
+from src.face_encoding import ENCODING_DIM
+from src.recognition_service import BatcherStopped, DynamicBatcher, RecognitionEngine
+
+class DynamicBatcherTest(unittest.TestCase):
+    def test_concurrent_requests_share_batches(self):
+        sizes = []
+
+        def handler(items):
+            sizes.append(len(items))
+            return [item * 2 for item in items]
+
+        batcher = DynamicBatcher(handler, max_batch=4, max_wait_ms=200).start()
+        results = {}
+
+        def submit(item):
+            results[item] = batcher.submit(item)
+
+        threads = [threading.Thread(target=submit, args=(i,)) for i in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        batcher.stop()
+
+        self.assertEqual({item: result for item, (result, _) in results.items()}, {i: i * 2 for i in range(8)})
+        self.assertEqual(sum(sizes), 8)
+        self.assertLessEqual(max(sizes), 4)
+        self.assertLess(len(sizes), 8)
+        self.assertEqual(batcher.items, 8)
+
+    def test_handler_error_reaches_every_request(self):
+        def handler(items):
+            raise RuntimeError("boom")
+
+        batcher = DynamicBatcher(handler, max_batch=1).start()
+        try:
+            with self.assertRaises(RuntimeError):
+                batcher.submit('x')
+        finally:
+            batcher.stop()
+
+    def test_stop_fails_waiting_requests(self):
+        entered = threading.Event()
+        release = threading.Event()
+
+        def handler(items):
+            entered.set()
+            release.wait(5)
+            return items
+
+        batcher = DynamicBatcher(handler, max_batch=1).start()
+        outcomes = {}
+
+        def submit(item):
+            try:
+                outcomes[item] = batcher.submit(item, timeout=5)[0]
+            except BatcherStopped as e:
+                outcomes[item] = e
+
+        first = threading.Thread(target=submit, args=('first',))
+        first.start()
+        self.assertTrue(entered.wait(5))
+        waiting = threading.Thread(target=submit, args=('waiting',))
+        waiting.start()
+        while batcher.queue_depth() == 0:
+            pass
+
+        stopper = threading.Thread(target=batcher.stop)
+        stopper.start()
+        waiting.join(1)
+        self.assertFalse(waiting.is_alive())
+        self.assertIsInstance(outcomes['waiting'], BatcherStopped)
+
+        release.set()
+        for thread in (first, stopper):
+            thread.join(5)
+        self.assertEqual(outcomes['first'], 'first')
+        with self.assertRaises(BatcherStopped):
+            batcher.submit('late')
+
+
+class RecognitionEngineTest(unittest.TestCase):
+    """handle_batch with face_recognition replaced by fixed answers"""
+    KNOWN = np.full(ENCODING_DIM, 0.1, dtype=np.float32)
+    STRANGER = np.full(ENCODING_DIM, -0.1, dtype=np.float32)
+
+    def setUp(self):
+        self.engine = RecognitionEngine(db=None)
+        self.engine.gallery.upsert([7], ['Ani'], [self.KNOWN])
+
+    def run_batch(self, requests, encodings):
+        def face_locations(image):
+            if image is None:
+                raise ValueError("bad image")
+            return [(10, 60, 60, 10), (10, 160, 60, 110)][:len(encodings)]
+
+        fake = types.SimpleNamespace(
+            face_locations=face_locations,
+            face_encodings=lambda image, locations: encodings[:len(locations)],
+            face_landmarks=lambda image, locations: [{'nose_bridge': [(30, 30)]}],
+        )
+        with mock.patch.dict(sys.modules, {'face_recognition': fake}), \
+                mock.patch('src.anti_spoofing.AntiSpoofingDetector.evaluate', return_value=(True, "Live")):
+            return self.engine.handle_batch(requests)
+
+    @staticmethod
+    def request(client='kiosk', image=np.zeros((80, 200, 3), dtype=np.uint8)):
+        return {'client': client, 'image': image, 'crop': False, 'received': 0.0}
+
+    def test_identity_is_the_live_face(self):
+        result, = self.run_batch([self.request()], [self.KNOWN, self.STRANGER])
+        self.assertEqual(result['user_id'], 7)
+        self.assertEqual(result['name'], 'Ani')
+
+    def test_other_face_does_not_borrow_liveness(self):
+        result, = self.run_batch([self.request()], [self.STRANGER, self.KNOWN])
+        self.assertEqual(result['faces'][1]['user_id'], 7)
+        self.assertIsNone(result['user_id'])
+
+    def test_bad_request_fails_alone(self):
+        good, bad = self.run_batch([self.request('a'), self.request('b', image=None)], [self.KNOWN])
+        self.assertEqual(good['user_id'], 7)
+        self.assertIn('error', bad)
+
+
+if __name__ == "__main__":
+    unittest.main()
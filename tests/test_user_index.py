@@ -0,0 +1,60 @@
+import random
+import unittest
+
+from src.user_index import UserIndex
+
+FIRST = ['Ani', 'Andi', 'Budi', 'Citra', 'Dewi', 'Eka', 'Fajar', 'Gita', 'Hasan', 'Indah']
+LAST = ['Saputra', 'Wijaya', 'Santoso', 'Putri', 'Halim', 'Susanto', 'Nugroho']
+
+class UserIndexTest(unittest.TestCase):
+    def setUp(self):
+        rng = random.Random(3)
+        self.users = {
+            i: {'id': i, 'name': f"{rng.choice(FIRST)} {rng.choice(LAST)}"}
+            for i in range(1, 200)
+        }
+        self.index = UserIndex()
+        self.index.load(self.users.values())
+        self.queries = ['', 'a', 'an', 'AN', 'sa', 'ani', 'putra', 'i s', 'tos', 'wij', 'zz', 'Dewi  Putri']
+
+    def brute_force(self, query):
+        query = ' '.join(query.lower().split())
+        found = []
+        for user in self.users.values():
+            name = ' '.join(user['name'].lower().split())
+            if not query or (query in name if len(query) >= 3 else
+                             any(word.startswith(query) for word in name.split())):
+                found.append((name, user['id']))
+        return [user_id for _, user_id in sorted(found)]
+
+    def check(self):
+        self.assertEqual(len(self.index), len(self.users))
+        for query in self.queries:
+            with self.subTest(query=query):
+                found = self.index.search(query)
+                self.assertEqual(found, self.brute_force(query))
+                for user_id in found:
+                    self.assertTrue(self.index.matches(user_id, query))
+
+    def test_search_matches_brute_force(self):
+        self.check()
+
+    def test_edits_keep_search_in_step(self):
+        position = self.index.upsert({'id': 500, 'name': 'Aaron Abadi'})
+        self.users[500] = {'id': 500, 'name': 'Aaron Abadi'}
+        self.assertEqual(position, 0)
+
+        self.users[5] = {'id': 5, 'name': 'Zainal Zulkarnain'}
+        self.index.upsert(self.users[5])
+        for user_id in (7, 8, 9):
+            self.assertTrue(self.index.remove(user_id))
+            del self.users[user_id]
+        self.assertFalse(self.index.remove(7))
+
+        self.queries += ['aar', 'zul', 'z']
+        self.check()
+        self.assertEqual(self.index.search('')[-1], 5)
+
+
+if __name__ == "__main__":
+    unittest.main()